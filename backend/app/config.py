@@ -14,10 +14,16 @@ class Settings:
     FIREBASE_CREDENTIALS_PATH: str = os.path.join(BASE_DIR, "firebase-credentials.json")
     FIREBASE_PROJECT_ID: str = "linkedincopy-3423b"
     FIREBASE_STORAGE_BUCKET: str = "linkedincopy-3423b.firebasestorage.app"
+    FIREBASE_TOKEN_CACHE_SIZE: int = int(os.getenv("FIREBASE_TOKEN_CACHE_SIZE", "1024"))
 
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-here")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24  # 1 day
+    PRINCIPAL_CACHE_TTL_SECONDS: float = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+
+    # Password hashing pool; requests beyond workers + queue get a 503
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+    PASSWORD_HASH_MAX_QUEUE: int = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "32"))
 
     MAIL_USERNAME: str = os.getenv("MAIL_USERNAME", "")
     MAIL_PASSWORD: str = os.getenv("MAIL_PASSWORD", "")
@@ -25,10 +31,64 @@ class Settings:
     MAIL_PORT: int = int(os.getenv("MAIL_PORT", "587"))
     MAIL_SERVER: str = os.getenv("MAIL_SERVER", "")
     MAIL_FROM_NAME: str = os.getenv("MAIL_FROM_NAME", "LinkedOut")
+    MAIL_USE_TLS: bool = os.getenv("MAIL_USE_TLS", "true").lower() == "true"
+    # Outbound mail queue; each worker keeps one SMTP session open
+    MAIL_WORKERS: int = int(os.getenv("MAIL_WORKERS", "1"))
+    MAIL_BATCH_SIZE: int = int(os.getenv("MAIL_BATCH_SIZE", "20"))
+    MAIL_MAX_RETRIES: int = int(os.getenv("MAIL_MAX_RETRIES", "5"))
+    MAIL_RETRY_BACKOFF_SECONDS: float = float(os.getenv("MAIL_RETRY_BACKOFF_SECONDS", "2"))
+    MAIL_IDLE_TIMEOUT_SECONDS: float = float(os.getenv("MAIL_IDLE_TIMEOUT_SECONDS", "60"))
 
     UPLOADS_DIR: str = os.path.join(BASE_DIR, "uploads")
     MEDIA_URL: str = "/media/"
 
+    # Uploads are streamed to disk in chunks and rejected past these sizes
+    UPLOAD_CHUNK_SIZE: int = int(os.getenv("UPLOAD_CHUNK_SIZE", str(64 * 1024)))
+    MAX_UPLOAD_BYTES: int = int(os.getenv("MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+    MAX_IMAGE_UPLOAD_BYTES: int = int(os.getenv("MAX_IMAGE_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+
+    # Image variants generated after upload, as name:WIDTHxHEIGHT boxes
+    IMAGE_VARIANTS: str = os.getenv("IMAGE_VARIANTS", "thumbnail:160x160,feed:680x680,full:1600x1600")
+    IMAGE_VARIANT_WORKERS: int = int(os.getenv("IMAGE_VARIANT_WORKERS", "2"))
+    IMAGE_QUALITY: int = int(os.getenv("IMAGE_QUALITY", "85"))
+
+    # Feed timelines
+    FEED_TIMELINE_MAX_LENGTH: int = int(os.getenv("FEED_TIMELINE_MAX_LENGTH", "800"))
+    FEED_CELEBRITY_THRESHOLD: int = int(os.getenv("FEED_CELEBRITY_THRESHOLD", "5000"))
+    FEED_TIMELINE_TRIM_SLACK: int = int(os.getenv("FEED_TIMELINE_TRIM_SLACK", "50"))
+    FEED_BACKFILL_POSTS: int = int(os.getenv("FEED_BACKFILL_POSTS", "20"))  # Copied on connection accept
+
+    # Background tasks
+    TASK_QUEUE_BACKEND: str = os.getenv("TASK_QUEUE_BACKEND", "inprocess")  # "inprocess" or "celery"
+    REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    TASK_QUEUE_WORKERS: int = int(os.getenv("TASK_QUEUE_WORKERS", "2"))
+    TASK_MAX_RETRIES: int = int(os.getenv("TASK_MAX_RETRIES", "5"))
+    TASK_RETRY_BACKOFF_SECONDS: float = float(os.getenv("TASK_RETRY_BACKOFF_SECONDS", "2"))
+
+    # Real-time push
+    REALTIME_BACKEND: str = os.getenv("REALTIME_BACKEND", "memory")  # "memory" or "redis"
+
+    # Connection suggestions
+    CONNECTION_GRAPH_REFRESH_SECONDS: float = float(os.getenv("CONNECTION_GRAPH_REFRESH_SECONDS", "600"))
+
+    # Bulk writes
+    BULK_WRITER_MAX_IN_FLIGHT: int = int(os.getenv("BULK_WRITER_MAX_IN_FLIGHT", "4"))
+    BULK_WRITER_MAX_RETRIES: int = int(os.getenv("BULK_WRITER_MAX_RETRIES", "5"))
+    BULK_WRITER_RETRY_BACKOFF_SECONDS: float = float(os.getenv("BULK_WRITER_RETRY_BACKOFF_SECONDS", "0.5"))
+    NOTIFICATION_BULK_SYNC_LIMIT: int = int(os.getenv("NOTIFICATION_BULK_SYNC_LIMIT", "2000"))
+
+    # Notification coalescing
+    NOTIFICATION_COALESCE_WINDOW_SECONDS: float = float(os.getenv("NOTIFICATION_COALESCE_WINDOW_SECONDS", "86400"))
+    NOTIFICATION_ACTOR_SAMPLE_SIZE: int = int(os.getenv("NOTIFICATION_ACTOR_SAMPLE_SIZE", "3"))
+
+    # Cached aggregation counts
+    COUNT_CACHE_TTL_SECONDS: float = float(os.getenv("COUNT_CACHE_TTL_SECONDS", "30"))
+
+    # Full-text search
+    SEARCH_INDEX_DIR: str = os.getenv("SEARCH_INDEX_DIR", os.path.join(BASE_DIR, "search_index"))
+    SEARCH_INDEX_FLUSH_THRESHOLD: int = int(os.getenv("SEARCH_INDEX_FLUSH_THRESHOLD", "1000"))
+    SEARCH_INDEX_FLUSH_INTERVAL_SECONDS: float = float(os.getenv("SEARCH_INDEX_FLUSH_INTERVAL_SECONDS", "300"))
+
     # Updated CORS settings with more permissive defaults for development
     CORS_ORIGINS: list = [
         "http://localhost:3000",  # React default port
@@ -1,9 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
+from firebase_admin import firestore_async
 import logging
 
-from app.database import get_db
+from app.database import get_async_db, get_db
 from app.service import auth as auth_service
 from app.schema.user import (
     UserCreate, UserResponse, Token, UserLogin, FirebaseLogin,
@@ -22,8 +23,10 @@ def register(user_data: UserCreate, db: Session = Depends(get_db)):
     return auth_service.register_user(db, user_data)
 
 
+# Awaits the hashing pool rather than holding a threadpool thread for the bcrypt call
 @router.post("/login", response_model=Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(),
+                db: firestore_async.AsyncClient = Depends(get_async_db)):
     """Login and get access token."""
     logger.debug(f"Login attempt received for: {form_data.username}")
 
@@ -36,7 +39,7 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
     logger.debug(f"Created UserLogin instance for: {user_login.email}")
 
     # Pass the UserLogin instance to the service
-    result = auth_service.login_user(db, user_login)
+    result = await auth_service.login_user_async(db, user_login)
 
     return {
         "access_token": result["access_token"],
@@ -70,7 +73,8 @@ def request_password_reset(reset_data: PasswordReset, db: Session = Depends(get_
 
 
 @router.post("/password-reset/confirm", status_code=status.HTTP_200_OK)
-def confirm_password_reset(reset_data: PasswordResetConfirm, db: Session = Depends(get_db)):
+async def confirm_password_reset(reset_data: PasswordResetConfirm,
+                                 db: firestore_async.AsyncClient = Depends(get_async_db)):
     """Reset password with token."""
-    auth_service.reset_password(db, reset_data)
+    await auth_service.reset_password_async(db, reset_data)
     return {"message": "Password reset successfully"}
\ No newline at end of file
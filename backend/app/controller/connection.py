@@ -1,9 +1,11 @@
-from typing import List, Dict
+import asyncio
+from typing import List, Dict, Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
+from firebase_admin import firestore_async
 
-from app.database import get_db
-from app.utils.security import get_current_active_user
+from app.database import get_async_db, get_db
+from app.utils.security import get_current_active_user, get_current_active_user_async
 from app.service import connection as connection_service
 from app.model.user import User
 from app.schema.connection import (
@@ -15,6 +17,9 @@ from app.utils.helpers import paginate_response
 
 router = APIRouter()
 
+# Upper bound for one batch of mutual connection counts
+MAX_MUTUAL_COUNT_USERS = 100
+
 
 # Connection endpoints
 @router.post("/request", response_model=ConnectionInDB, status_code=status.HTTP_201_CREATED)
@@ -29,7 +34,7 @@ def create_connection_request(
 
 @router.put("/{connection_id}", response_model=ConnectionInDB)
 def update_connection_status(
-        connection_id: int,
+        connection_id: str,
         connection_data: ConnectionUpdate,
         current_user: User = Depends(get_current_active_user),
         db: Session = Depends(get_db)
@@ -40,7 +45,7 @@ def update_connection_status(
 
 @router.delete("/{connection_id}", status_code=status.HTTP_200_OK)
 def delete_connection(
-        connection_id: int,
+        connection_id: str,
         current_user: User = Depends(get_current_active_user),
         db: Session = Depends(get_db)
 ):
@@ -50,48 +55,57 @@ def delete_connection(
 
 
 @router.get("/", response_model=Dict)
-def get_my_connections(
+async def get_my_connections(
         page: int = Query(1, ge=1),
         limit: int = Query(20, ge=1, le=100),
-        current_user: User = Depends(get_current_active_user),
-        db: Session = Depends(get_db)
+        cursor: Optional[str] = Query(None),
+        current_user: User = Depends(get_current_active_user_async),
+        db: firestore_async.AsyncClient = Depends(get_async_db)
 ):
     """Get all connections for current user."""
     skip = (page - 1) * limit
-    connections = connection_service.get_user_connections(db, current_user.id, skip, limit)
-    total = connection_service.count_user_connections(db, current_user.id)
+    connections, total = await asyncio.gather(
+        connection_service.get_user_connections_async(db, current_user.id, skip, limit, cursor),
+        connection_service.count_user_connections_async(db, current_user.id)
+    )
 
-    return paginate_response(connections, page, limit, total)
+    return paginate_response(connections, page, limit, total, cursor_field="connection_id")
 
 
 @router.get("/requests", response_model=Dict)
-def get_connection_requests(
+async def get_connection_requests(
         page: int = Query(1, ge=1),
         limit: int = Query(20, ge=1, le=100),
-        current_user: User = Depends(get_current_active_user),
-        db: Session = Depends(get_db)
+        cursor: Optional[str] = Query(None),
+        current_user: User = Depends(get_current_active_user_async),
+        db: firestore_async.AsyncClient = Depends(get_async_db)
 ):
     """Get all pending connection requests received by current user."""
     skip = (page - 1) * limit
-    requests = connection_service.get_connection_requests(db, current_user.id, skip, limit)
-    total = connection_service.count_connection_requests(db, current_user.id)
+    requests, total = await asyncio.gather(
+        connection_service.get_connection_requests_async(db, current_user.id, skip, limit, cursor),
+        connection_service.count_connection_requests_async(db, current_user.id)
+    )
 
-    return paginate_response(requests, page, limit, total)
+    return paginate_response(requests, page, limit, total, cursor_field="connection_id")
 
 
 @router.get("/sent-requests", response_model=Dict)
-def get_sent_connection_requests(
+async def get_sent_connection_requests(
         page: int = Query(1, ge=1),
         limit: int = Query(20, ge=1, le=100),
-        current_user: User = Depends(get_current_active_user),
-        db: Session = Depends(get_db)
+        cursor: Optional[str] = Query(None),
+        current_user: User = Depends(get_current_active_user_async),
+        db: firestore_async.AsyncClient = Depends(get_async_db)
 ):
     """Get all pending connection requests sent by current user."""
     skip = (page - 1) * limit
-    requests = connection_service.get_sent_connection_requests(db, current_user.id, skip, limit)
-    total = connection_service.count_sent_connection_requests(db, current_user.id)
+    requests, total = await asyncio.gather(
+        connection_service.get_sent_connection_requests_async(db, current_user.id, skip, limit, cursor),
+        connection_service.count_sent_connection_requests_async(db, current_user.id)
+    )
 
-    return paginate_response(requests, page, limit, total)
+    return paginate_response(requests, page, limit, total, cursor_field="connection_id")
 
 
 @router.get("/suggestions", response_model=Dict)
@@ -103,15 +117,15 @@ def get_connection_suggestions(
 ):
     """Get connection suggestions for current user."""
     skip = (page - 1) * limit
-    suggestions = connection_service.get_connection_suggestions(db, current_user.id, skip, limit)
-    total = connection_service.count_connection_suggestions(db, current_user.id)
+    # The page and the exact total come from the same graph traversal
+    suggestions, total = connection_service.get_connection_suggestions(db, current_user.id, skip, limit)
 
     return paginate_response(suggestions, page, limit, total)
 
 
 @router.get("/status/{user_id}", response_model=Dict)
 def check_connection_status(
-        user_id: int,
+        user_id: str,
         current_user: User = Depends(get_current_active_user),
         db: Session = Depends(get_db)
 ):
@@ -119,9 +133,23 @@ def check_connection_status(
     return connection_service.check_connection_status(db, current_user.id, user_id)
 
 
+@router.get("/mutual-counts", response_model=Dict)
+def get_mutual_connection_counts(
+        user_ids: List[str] = Query(...),
+        current_user: User = Depends(get_current_active_user),
+        db: Session = Depends(get_db)
+):
+    """Get mutual connection counts between current user and a list of users."""
+    if len(user_ids) > MAX_MUTUAL_COUNT_USERS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_MUTUAL_COUNT_USERS} users can be requested at once")
+
+    counts = connection_service.get_mutual_connection_counts(db, current_user.id, user_ids)
+    return {"counts": counts}
+
+
 @router.get("/mutual/{user_id}", response_model=Dict)
 def get_mutual_connections(
-        user_id: int,
+        user_id: str,
         page: int = Query(1, ge=1),
         limit: int = Query(20, ge=1, le=100),
         current_user: User = Depends(get_current_active_user),
@@ -129,8 +157,7 @@ def get_mutual_connections(
 ):
     """Get mutual connections between current user and another user."""
     skip = (page - 1) * limit
-    mutual = connection_service.get_mutual_connections(db, current_user.id, user_id, skip, limit)
-    total = connection_service.count_mutual_connections(db, current_user.id, user_id)
+    mutual, total = connection_service.get_mutual_connections(db, current_user.id, user_id, skip, limit)
 
     return paginate_response(mutual, page, limit, total)
 
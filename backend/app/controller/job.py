@@ -1,17 +1,20 @@
+import asyncio
 from typing import List, Dict, Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
+from firebase_admin import firestore_async
 
-from app.database import get_db
-from app.utils.security import get_current_active_user
+from app.database import get_async_db, get_db
+from app.utils.security import get_current_active_user, get_current_active_user_async
 from app.service import job as job_service
 from app.model.user import User
+from app.model.job import Job, JobSummary
 from app.schema.job import (
     JobInDB, JobCreate, JobUpdate, JobWithUser,
     JobApplicationInDB, JobApplicationCreate, JobApplicationUpdate, JobApplicationWithUser,
     SavedJobInDB, SavedJobCreate
 )
-from app.utils.helpers import paginate_response
+from app.utils.helpers import paginate_response, parse_fields
 
 router = APIRouter()
 
@@ -24,7 +27,8 @@ def create_job(
         db: Session = Depends(get_db)
 ):
     """Create a new job posting."""
-    return job_service.create_job(db, current_user.id, job_data)
+    job = Job(poster_id=current_user.id, **job_data.dict())
+    return job_service.create_job(db, job)
 
 
 @router.put("/{job_id}", response_model=JobInDB)
@@ -49,95 +53,94 @@ def delete_job(
     return {"message": "Job deleted successfully"}
 
 
-@router.get("/{job_id}", response_model=JobWithUser)
-def get_job(
-        job_id: str,
-        current_user: User = Depends(get_current_active_user),
-        db: Session = Depends(get_db)
-):
-    """Get a job posting by ID."""
-    job = job_service.get_job(db, job_id)
-
-    # Add applications count
-    job.applications_count = job_service.count_job_applications(db, job_id,
-                                                                current_user.id) if job.poster_id == current_user.id else 0
-
-    # Check if current user has saved this job
-    job.is_saved = job_service.is_job_saved(db, current_user.id, job_id)
-
-    # Check if current user has applied to this job
-    job.is_applied = job_service.is_job_applied(db, current_user.id, job_id)
-
-    return job
+async def _add_job_flags(db: firestore_async.AsyncClient, user_id: str, jobs: List[JobSummary]) -> None:
+    saved_ids, applied_ids = await job_service.get_job_flags_async(db, user_id, [job.job_id for job in jobs])
+    for job in jobs:
+        job.is_saved = job.job_id in saved_ids
+        job.is_applied = job.job_id in applied_ids
 
 
 @router.get("/", response_model=Dict)
-def get_jobs(
+async def get_jobs(
         page: int = Query(1, ge=1),
         limit: int = Query(20, ge=1, le=100),
-        current_user: User = Depends(get_current_active_user),
-        db: Session = Depends(get_db)
+        cursor: Optional[str] = Query(None),
+        fields: Optional[str] = Query(None, description="Comma-separated job fields to return"),
+        current_user: User = Depends(get_current_active_user_async),
+        db: firestore_async.AsyncClient = Depends(get_async_db)
 ):
     """Get all active job postings."""
     skip = (page - 1) * limit
-    jobs = job_service.get_jobs(db, skip, limit)
-    total = job_service.count_jobs(db)
+    fields = parse_fields(fields, JobSummary.FIELDS)
+    # The page and the total are independent reads
+    jobs, total = await asyncio.gather(
+        job_service.get_jobs_async(db, skip, limit, cursor=cursor, fields=fields),
+        job_service.count_jobs_async(db)
+    )
 
-    # Add is_saved and is_applied flags
-    for job in jobs:
-        job.is_saved = job_service.is_job_saved(db, current_user.id, job.job_id)
-        job.is_applied = job_service.is_job_applied(db, current_user.id, job.job_id)
+    # Add is_saved and is_applied flags, unless the client picked its own fields
+    if not fields:
+        await _add_job_flags(db, current_user.id, jobs)
 
-    return paginate_response(jobs, page, limit, total)
+    return paginate_response(jobs, page, limit, total, cursor_field="job_id")
 
 
 @router.get("/my-postings", response_model=Dict)
-def get_my_job_postings(
+async def get_my_job_postings(
         page: int = Query(1, ge=1),
         limit: int = Query(20, ge=1, le=100),
-        current_user: User = Depends(get_current_active_user),
-        db: Session = Depends(get_db)
+        cursor: Optional[str] = Query(None),
+        fields: Optional[str] = Query(None, description="Comma-separated job fields to return"),
+        current_user: User = Depends(get_current_active_user_async),
+        db: firestore_async.AsyncClient = Depends(get_async_db)
 ):
     """Get all job postings created by current user."""
     skip = (page - 1) * limit
-    jobs = job_service.get_user_jobs(db, current_user.id, skip, limit)
-    total = job_service.count_user_jobs(db, current_user.id)
+    fields = parse_fields(fields, JobSummary.FIELDS)
+    jobs, total = await asyncio.gather(
+        job_service.get_user_jobs_async(db, current_user.id, skip, limit, cursor, fields),
+        job_service.count_user_jobs_async(db, current_user.id)
+    )
 
-    # Add applications count
-    for job in jobs:
-        job.applications_count = job_service.count_job_applications(db, job.job_id, current_user.id)
+    # Add applications count, unless the client picked its own fields; these are the user's own jobs
+    if not fields:
+        counts = await asyncio.gather(*(job_service.count_applications_async(db, job.job_id) for job in jobs))
+        for job, count in zip(jobs, counts):
+            job.applications_count = count
 
-    return paginate_response(jobs, page, limit, total)
+    return paginate_response(jobs, page, limit, total, cursor_field="job_id")
 
 
 @router.get("/search", response_model=Dict)
-def search_jobs(
+async def search_jobs(
         query: Optional[str] = None,
         location: Optional[str] = None,
         job_type: Optional[str] = None,
         is_remote: Optional[bool] = None,
         min_salary: Optional[float] = None,
         max_salary: Optional[float] = None,
+        salary_range: Optional[str] = None,
+        sort: Optional[str] = Query(None, pattern="^(relevance|recency)$"),
         page: int = Query(1, ge=1),
         limit: int = Query(20, ge=1, le=100),
-        current_user: User = Depends(get_current_active_user),
-        db: Session = Depends(get_db)
+        fields: Optional[str] = Query(None, description="Comma-separated job fields to return"),
+        current_user: User = Depends(get_current_active_user_async),
+        db: firestore_async.AsyncClient = Depends(get_async_db)
 ):
     """Search for jobs with various filters."""
     skip = (page - 1) * limit
-    jobs = job_service.search_jobs(
-        db, query, location, job_type, is_remote, min_salary, max_salary, skip, limit
-    )
-    total = job_service.count_search_jobs(
-        db, query, location, job_type, is_remote, min_salary, max_salary
+    fields = parse_fields(fields, JobSummary.FIELDS)
+    # Page, total and facet counts come from the same index pass
+    jobs, total, facets = await job_service.search_jobs_async(
+        db, query, location, job_type, is_remote, min_salary, max_salary,
+        salary_range, sort, skip, limit, fields
     )
 
-    # Add is_saved and is_applied flags
-    for job in jobs:
-        job.is_saved = job_service.is_job_saved(db, current_user.id, job.job_id)
-        job.is_applied = job_service.is_job_applied(db, current_user.id, job.job_id)
+    # Add is_saved and is_applied flags, unless the client picked its own fields
+    if not fields:
+        await _add_job_flags(db, current_user.id, jobs)
 
-    return paginate_response(jobs, page, limit, total)
+    return paginate_response(jobs, page, limit, total, {"facets": facets})
 
 
 # Job application endpoints
@@ -167,30 +170,32 @@ def get_job_applications(
         job_id: str,
         page: int = Query(1, ge=1),
         limit: int = Query(20, ge=1, le=100),
+        cursor: Optional[str] = Query(None),
         current_user: User = Depends(get_current_active_user),
         db: Session = Depends(get_db)
 ):
     """Get all applications for a job."""
     skip = (page - 1) * limit
-    applications = job_service.get_job_applications(db, job_id, current_user.id, skip, limit)
+    applications = job_service.get_job_applications(db, job_id, current_user.id, skip, limit, cursor)
     total = job_service.count_job_applications(db, job_id, current_user.id)
 
-    return paginate_response(applications, page, limit, total)
+    return paginate_response(applications, page, limit, total, cursor_field="application_id")
 
 
 @router.get("/my-applications", response_model=Dict)
 def get_my_applications(
         page: int = Query(1, ge=1),
         limit: int = Query(20, ge=1, le=100),
+        cursor: Optional[str] = Query(None),
         current_user: User = Depends(get_current_active_user),
         db: Session = Depends(get_db)
 ):
     """Get all job applications by current user."""
     skip = (page - 1) * limit
-    applications = job_service.get_user_applications(db, current_user.id, skip, limit)
+    applications = job_service.get_user_applications(db, current_user.id, skip, limit, cursor)
     total = job_service.count_user_applications(db, current_user.id)
 
-    return paginate_response(applications, page, limit, total)
+    return paginate_response(applications, page, limit, total, cursor_field="application_id")
 
 
 # Saved job endpoints
@@ -219,15 +224,43 @@ def remove_saved_job(
 def get_saved_jobs(
         page: int = Query(1, ge=1),
         limit: int = Query(20, ge=1, le=100),
+        cursor: Optional[str] = Query(None),
         current_user: User = Depends(get_current_active_user),
         db: Session = Depends(get_db)
 ):
     """Get all saved jobs for current user."""
     skip = (page - 1) * limit
-    saved_jobs = job_service.get_saved_jobs(db, current_user.id, skip, limit)
+    saved_jobs, next_cursor = job_service.get_saved_jobs(db, current_user.id, skip, limit, cursor)
     total = job_service.count_saved_jobs(db, current_user.id)
 
-    return paginate_response(saved_jobs, page, limit, total)
+    return paginate_response(saved_jobs, page, limit, total, next_cursor=next_cursor)
+
+
+# Declared after the static GETs so "/search", "/saved" and the "/my-..." paths are not taken for an ID
+@router.get("/{job_id}", response_model=JobWithUser)
+async def get_job(
+        job_id: str,
+        current_user: User = Depends(get_current_active_user_async),
+        db: firestore_async.AsyncClient = Depends(get_async_db)
+):
+    """Get a job posting by ID."""
+    job = await job_service.get_job_async(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    # Applications count for the poster, and whether current user has saved or applied to this job
+    if job.poster_id == current_user.id:
+        job.applications_count, (saved_ids, applied_ids) = await asyncio.gather(
+            job_service.count_applications_async(db, job_id),
+            job_service.get_job_flags_async(db, current_user.id, [job_id])
+        )
+    else:
+        job.applications_count = 0
+        saved_ids, applied_ids = await job_service.get_job_flags_async(db, current_user.id, [job_id])
+    job.is_saved = job_id in saved_ids
+    job.is_applied = job_id in applied_ids
+
+    return job
 
 
 @router.get("/{job_id}/is-saved")
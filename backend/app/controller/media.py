@@ -0,0 +1,170 @@
+import mimetypes
+import os
+from email.utils import formatdate
+from typing import Optional, Tuple
+
+import anyio
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response
+
+from app.config import settings
+from app.core.media_store import media_store
+
+router = APIRouter()
+
+# Content-addressed files never change; anything else may be replaced in place
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+LEGACY_CACHE_CONTROL = "public, max-age=86400"
+
+
+class MediaFileResponse(Response):
+    """Send a byte range of a file, zero-copy when the server supports it.
+
+    Servers advertising the ASGI zerocopysend extension get the open file
+    and call sendfile(2) themselves; otherwise the range is streamed in
+    chunks off the event loop.
+    """
+
+    chunk_size = 64 * 1024
+
+    def __init__(self, path: str, start: int, length: int, status_code: int, headers: dict,
+                 media_type: Optional[str], send_body: bool = True):
+        self.path = path
+        self.start = start
+        self.length = length
+        self.send_body = send_body
+        super().__init__(status_code=status_code, headers={**headers, "Content-Length": str(length)},
+                         media_type=media_type)
+
+    async def __call__(self, scope, receive, send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+
+        if not self.send_body or self.length == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        if "http.response.zerocopysend" in scope.get("extensions", {}):
+            with open(self.path, "rb") as f:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": f,
+                    "offset": self.start,
+                    "count": self.length,
+                    "more_body": False
+                })
+            return
+
+        async with await anyio.open_file(self.path, "rb") as f:
+            await f.seek(self.start)
+            remaining = self.length
+            while remaining > 0:
+                chunk = await f.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def _resolve(file_path: str) -> str:
+    """Map a URL path to a file under UPLOADS_DIR, refusing traversal and hidden entries."""
+    if any(part.startswith(".") for part in file_path.split("/")):
+        raise HTTPException(status_code=404, detail="File not found")
+
+    root = os.path.realpath(settings.UPLOADS_DIR)
+    full_path = os.path.realpath(os.path.join(root, file_path))
+    if not full_path.startswith(root + os.sep) or not os.path.isfile(full_path):
+        raise HTTPException(status_code=404, detail="File not found")
+    return full_path
+
+
+def _webp_alternative(full_path: str) -> Optional[str]:
+    """Path of a pre-encoded WebP copy of the file, if one exists."""
+    stem, ext = os.path.splitext(full_path)
+    if ext.lower() == ".webp":
+        return None
+    webp_path = f"{stem}.webp"
+    return webp_path if os.path.isfile(webp_path) else None
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def _parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single-range Range header into (start, end) inclusive.
+
+    Returns None to serve the whole file (no header or several ranges) and
+    raises 416 for a range that cannot be satisfied.
+    """
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+
+    unsatisfiable = HTTPException(status_code=416, detail="Requested range not satisfiable",
+                                  headers={"Content-Range": f"bytes */{size}"})
+    try:
+        start_text, end_text = range_header[len("bytes="):].strip().split("-", 1)
+        if start_text:
+            start = int(start_text)
+            end = min(int(end_text), size - 1) if end_text else size - 1
+        else:
+            # Suffix range: the last N bytes
+            suffix = int(end_text)
+            if suffix <= 0:
+                raise unsatisfiable
+            start, end = max(size - suffix, 0), size - 1
+    except ValueError:
+        return None
+
+    if start >= size or start > end:
+        raise unsatisfiable
+    return start, end
+
+
+@router.api_route("/{file_path:path}", methods=["GET", "HEAD"])
+def serve_media(file_path: str, request: Request):
+    """Serve an uploaded file with caching validators, byte ranges and WebP negotiation."""
+    full_path = _resolve(file_path)
+
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL if media_store.is_managed(file_path) else LEGACY_CACHE_CONTROL
+    }
+
+    # Variants have a WebP twin; hand it to clients that accept it
+    webp_path = _webp_alternative(full_path)
+    if webp_path:
+        headers["Vary"] = "Accept"
+        if "image/webp" in request.headers.get("accept", ""):
+            full_path = webp_path
+
+    stat = os.stat(full_path)
+    if media_store.is_managed(file_path):
+        # The file name is derived from the content hash
+        etag = f'"{os.path.basename(full_path)}"'
+    else:
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    headers["ETag"] = etag
+    headers["Last-Modified"] = formatdate(stat.st_mtime, usegmt=True)
+
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    media_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+    send_body = request.method != "HEAD"
+
+    # A Range only applies if the representation still matches If-Range
+    if_range = request.headers.get("if-range")
+    byte_range = _parse_range(request.headers.get("range"), stat.st_size) if not if_range or if_range == etag else None
+    if byte_range is None:
+        return MediaFileResponse(full_path, 0, stat.st_size, 200, headers, media_type, send_body)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+    return MediaFileResponse(full_path, start, end - start + 1, 206, headers, media_type, send_body)
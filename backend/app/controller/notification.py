@@ -1,65 +1,105 @@
-from typing import List, Dict
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+import asyncio
+from typing import List, Dict, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from sqlalchemy.orm import Session
+from firebase_admin import firestore_async
 
-from app.database import get_db
-from app.utils.security import get_current_active_user
+from app.config import settings
+from app.database import get_async_db, get_db
+from app.utils.security import get_current_active_user, get_current_active_user_async
 from app.service import notification as notification_service
+from app.model.notification import Notification
 from app.model.user import User
 from app.schema.notification import NotificationInDB, NotificationUpdate, NotificationWithUser
-from app.utils.helpers import paginate_response
+from app.utils.helpers import paginate_response, parse_fields
 
 router = APIRouter()
 
 
 @router.get("/", response_model=Dict)
-def get_notifications(
+async def get_notifications(
         page: int = Query(1, ge=1),
         limit: int = Query(20, ge=1, le=100),
-        current_user: User = Depends(get_current_active_user),
-        db: Session = Depends(get_db)
+        cursor: Optional[str] = Query(None),
+        fields: Optional[str] = Query(None, description="Comma-separated notification fields to return"),
+        current_user: User = Depends(get_current_active_user_async),
+        db: firestore_async.AsyncClient = Depends(get_async_db)
 ):
     """Get all notifications for current user."""
     skip = (page - 1) * limit
-    notifications = notification_service.get_user_notifications(db, current_user.id, skip, limit)
-    total = notification_service.count_user_notifications(db, current_user.id)
+    fields = parse_fields(fields, Notification.FIELDS)
+    # The page and the total are independent reads
+    notifications, total = await asyncio.gather(
+        notification_service.get_user_notifications_async(db, current_user.id, skip, limit, cursor, fields),
+        notification_service.count_user_notifications_async(db, current_user.id)
+    )
 
-    return paginate_response(notifications, page, limit, total)
+    return paginate_response(notifications, page, limit, total, cursor_field="notification_id")
 
 
 @router.get("/unread-count")
-def get_unread_count(
-        current_user: User = Depends(get_current_active_user),
-        db: Session = Depends(get_db)
+async def get_unread_count(
+        request: Request,
+        response: Response,
+        current_user: User = Depends(get_current_active_user_async),
+        db: firestore_async.AsyncClient = Depends(get_async_db)
 ):
-    """Get the count of unread notifications for current user."""
-    count = notification_service.count_unread_notifications(db, current_user.id)
+    """Get the count of unread notifications for current user.
+
+    The ETag is derived from the count, so polling clients that send it back
+    in If-None-Match get an empty 304 while the badge is unchanged.
+    """
+    count = await notification_service.count_unread_notifications_async(db, current_user.id)
+
+    etag = f'"unread-{count}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    response.headers.update(headers)
     return {"unread_count": count}
 
 
-@router.put("/{notification_id}", response_model=NotificationInDB)
-def mark_notification_as_read(
-        notification_id: int,
+@router.get("/jobs/{job_id}")
+def get_bulk_job(
+        job_id: str,
         current_user: User = Depends(get_current_active_user),
         db: Session = Depends(get_db)
 ):
-    """Mark a notification as read."""
-    return notification_service.mark_notification_as_read(db, notification_id, current_user.id)
+    """Get the progress of a mass mark-as-read or delete running in the background."""
+    return notification_service.get_bulk_job(db, job_id, current_user.id)
 
 
+# Declared before "/{notification_id}" so the path is not taken for an ID
 @router.put("/mark-all-as-read", status_code=status.HTTP_200_OK)
 def mark_all_notifications_as_read(
+        response: Response,
         current_user: User = Depends(get_current_active_user),
         db: Session = Depends(get_db)
 ):
-    """Mark all notifications for current user as read."""
+    """Mark all notifications for current user as read; large inboxes are handled in the background."""
+    if notification_service.count_unread_notifications(db, current_user.id) > settings.NOTIFICATION_BULK_SYNC_LIMIT:
+        job_id = notification_service.start_bulk_job(db, current_user.id, "mark_all_as_read")
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {"message": "Marking notifications as read", "job_id": job_id}
+
     count = notification_service.mark_all_notifications_as_read(db, current_user.id)
     return {"message": f"{count} notifications marked as read"}
 
 
+@router.put("/{notification_id}", response_model=NotificationInDB)
+def mark_notification_as_read(
+        notification_id: str,
+        current_user: User = Depends(get_current_active_user),
+        db: Session = Depends(get_db)
+):
+    """Mark a notification as read."""
+    return notification_service.mark_notification_as_read(db, notification_id, current_user.id)
+
+
 @router.delete("/{notification_id}", status_code=status.HTTP_200_OK)
 def delete_notification(
-        notification_id: int,
+        notification_id: str,
         current_user: User = Depends(get_current_active_user),
         db: Session = Depends(get_db)
 ):
@@ -70,9 +110,15 @@ def delete_notification(
 
 @router.delete("/", status_code=status.HTTP_200_OK)
 def delete_all_notifications(
+        response: Response,
         current_user: User = Depends(get_current_active_user),
         db: Session = Depends(get_db)
 ):
-    """Delete all notifications for current user."""
+    """Delete all notifications for current user; large inboxes are handled in the background."""
+    if notification_service.count_user_notifications(db, current_user.id) > settings.NOTIFICATION_BULK_SYNC_LIMIT:
+        job_id = notification_service.start_bulk_job(db, current_user.id, "delete_all")
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {"message": "Deleting notifications", "job_id": job_id}
+
     count = notification_service.delete_all_notifications(db, current_user.id)
     return {"message": f"{count} notifications deleted"}
\ No newline at end of file
@@ -1,24 +1,27 @@
+import asyncio
 from typing import List, Dict, Optional
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query
 from sqlalchemy.orm import Session
+from firebase_admin import firestore_async
 
-from app.database import get_db
-from app.utils.security import get_current_active_user
+from app.database import get_async_db, get_db
+from app.utils.security import get_current_active_user, get_current_active_user_async
 from app.service import post as post_service
 from app.model.user import User
+from app.model.post import Post, PostSummary, Comment
 from app.schema.post import (
     PostInDB, PostCreate, PostUpdate, PostWithUser,
     CommentInDB, CommentCreate, CommentUpdate, CommentWithUser,
     LikeInDB, LikeCreate, CommentLikeCreate
 )
-from app.utils.helpers import paginate_response
+from app.utils.helpers import paginate_response, parse_fields, save_image_upload
 
 router = APIRouter()
 
 
 # Post endpoints
 @router.post("/", response_model=PostInDB, status_code=status.HTTP_201_CREATED)
-async def create_post(
+def create_post(
         content: str = Form(...),
         image: Optional[UploadFile] = File(None),
         current_user: User = Depends(get_current_active_user),
@@ -26,12 +29,19 @@ async def create_post(
 ):
     """Create a new post."""
     post_data = PostCreate(content=content)
-    return post_service.create_post(db, current_user.id, post_data, image)
+
+    # Store the image as uploaded; resized variants are generated in the background
+    image_url = None
+    if image:
+        image_url = save_image_upload(image)
+
+    post = Post(author_id=current_user.id, content=post_data.content, image_url=image_url)
+    return post_service.create_post(db, post)
 
 
 @router.put("/{post_id}", response_model=PostInDB)
 def update_post(
-        post_id: int,
+        post_id: str,
         post_data: PostUpdate,
         current_user: User = Depends(get_current_active_user),
         db: Session = Depends(get_db)
@@ -42,7 +52,7 @@ def update_post(
 
 @router.delete("/{post_id}", status_code=status.HTTP_200_OK)
 def delete_post(
-        post_id: int,
+        post_id: str,
         current_user: User = Depends(get_current_active_user),
         db: Session = Depends(get_db)
 ):
@@ -51,61 +61,46 @@ def delete_post(
     return {"message": "Post deleted successfully"}
 
 
-@router.get("/{post_id}", response_model=PostWithUser)
-def get_post(
-        post_id: int,
-        current_user: User = Depends(get_current_active_user),
-        db: Session = Depends(get_db)
-):
-    """Get a post by ID."""
-    post = post_service.get_post(db, post_id)
-
-    # Add comments and likes count
-    post.comments_count = post_service.count_post_comments(db, post_id)
-    post.likes_count = post_service.count_post_likes(db, post_id)
-
-    return post
-
-
 @router.get("/", response_model=Dict)
-def get_feed_posts(
+async def get_feed_posts(
         page: int = Query(1, ge=1),
         limit: int = Query(20, ge=1, le=100),
-        current_user: User = Depends(get_current_active_user),
-        db: Session = Depends(get_db)
+        cursor: Optional[str] = Query(None),
+        fields: Optional[str] = Query(None, description="Comma-separated post fields to return"),
+        current_user: User = Depends(get_current_active_user_async),
+        db: firestore_async.AsyncClient = Depends(get_async_db)
 ):
     """Get posts for user's feed."""
     skip = (page - 1) * limit
-    posts = post_service.get_feed_posts(db, current_user.id, skip, limit)
-    total = post_service.count_feed_posts(db, current_user.id)
+    fields = parse_fields(fields, PostSummary.FIELDS)
+    # The page and the total are independent reads
+    (posts, next_cursor), total = await asyncio.gather(
+        post_service.get_feed_posts_async(db, current_user.id, skip, limit, cursor, fields),
+        post_service.count_feed_posts_async(db, current_user.id)
+    )
 
-    # Add comments and likes count to each post
-    for post in posts:
-        post.comments_count = post_service.count_post_comments(db, post.id)
-        post.likes_count = post_service.count_post_likes(db, post.id)
-
-    return paginate_response(posts, page, limit, total)
+    return paginate_response(posts, page, limit, total, next_cursor=next_cursor)
 
 
 @router.get("/user/{user_id}", response_model=Dict)
-def get_user_posts(
-        user_id: int,
+async def get_user_posts(
+        user_id: str,
         page: int = Query(1, ge=1),
         limit: int = Query(20, ge=1, le=100),
-        current_user: User = Depends(get_current_active_user),
-        db: Session = Depends(get_db)
+        cursor: Optional[str] = Query(None),
+        fields: Optional[str] = Query(None, description="Comma-separated post fields to return"),
+        current_user: User = Depends(get_current_active_user_async),
+        db: firestore_async.AsyncClient = Depends(get_async_db)
 ):
     """Get all posts by a specific user."""
     skip = (page - 1) * limit
-    posts = post_service.get_user_posts(db, user_id, skip, limit)
-    total = post_service.count_user_posts(db, user_id)
+    fields = parse_fields(fields, PostSummary.FIELDS)
+    posts, total = await asyncio.gather(
+        post_service.get_user_posts_async(db, user_id, skip, limit, cursor, fields),
+        post_service.count_user_posts_async(db, user_id)
+    )
 
-    # Add comments and likes count to each post
-    for post in posts:
-        post.comments_count = post_service.count_post_comments(db, post.id)
-        post.likes_count = post_service.count_post_likes(db, post.id)
-
-    return paginate_response(posts, page, limit, total)
+    return paginate_response(posts, page, limit, total, cursor_field="post_id")
 
 
 @router.get("/search", response_model=Dict)
@@ -118,32 +113,47 @@ def search_posts(
 ):
     """Search for posts by content."""
     skip = (page - 1) * limit
-    posts = post_service.search_posts(db, query, current_user.id, skip, limit)
-    total = post_service.count_search_posts(db, query, current_user.id)
-
-    # Add comments and likes count to each post
-    for post in posts:
-        post.comments_count = post_service.count_post_comments(db, post.id)
-        post.likes_count = post_service.count_post_likes(db, post.id)
+    # Hits and total come from the same index pass; counters are stored on the posts
+    posts, total = post_service.search_posts(db, query, current_user.id, skip, limit)
 
     return paginate_response(posts, page, limit, total)
 
 
+# Declared after the static GETs so "/search" is not taken for an ID
+@router.get("/{post_id}", response_model=PostWithUser)
+async def get_post(
+        post_id: str,
+        current_user: User = Depends(get_current_active_user_async),
+        db: firestore_async.AsyncClient = Depends(get_async_db)
+):
+    """Get a post by ID."""
+    post = await post_service.get_post_async(db, post_id)
+    if not post:
+        raise HTTPException(status_code=404, detail="Post not found")
+
+    # Comments and likes count are stored on the post document
+    return post
+
+
 # Comment endpoints
 @router.post("/{post_id}/comments", response_model=CommentInDB, status_code=status.HTTP_201_CREATED)
 def create_comment(
-        post_id: int,
+        post_id: str,
         comment_data: CommentCreate,
         current_user: User = Depends(get_current_active_user),
         db: Session = Depends(get_db)
 ):
     """Create a new comment on a post."""
-    return post_service.create_comment(db, current_user.id, comment_data)
+    comment = Comment(post_id=post_id, author_id=current_user.id, content=comment_data.content)
+    db_comment = post_service.create_comment(db, comment)
+    if not db_comment:
+        raise HTTPException(status_code=404, detail="Post not found")
+    return db_comment
 
 
 @router.put("/comments/{comment_id}", response_model=CommentInDB)
 def update_comment(
-        comment_id: int,
+        comment_id: str,
         comment_data: CommentUpdate,
         current_user: User = Depends(get_current_active_user),
         db: Session = Depends(get_db)
@@ -154,50 +164,54 @@ def update_comment(
 
 @router.delete("/comments/{comment_id}", status_code=status.HTTP_200_OK)
 def delete_comment(
-        comment_id: int,
+        comment_id: str,
         current_user: User = Depends(get_current_active_user),
         db: Session = Depends(get_db)
 ):
     """Delete a comment."""
-    post_service.delete_comment(db, comment_id, current_user.id)
+    if not post_service.delete_comment(db, comment_id, current_user.id):
+        raise HTTPException(status_code=404, detail="Comment not found")
     return {"message": "Comment deleted successfully"}
 
 
 @router.get("/{post_id}/comments", response_model=Dict)
 def get_post_comments(
-        post_id: int,
+        post_id: str,
         page: int = Query(1, ge=1),
         limit: int = Query(50, ge=1, le=100),
+        cursor: Optional[str] = Query(None),
         current_user: User = Depends(get_current_active_user),
         db: Session = Depends(get_db)
 ):
     """Get all comments for a post."""
     skip = (page - 1) * limit
-    comments = post_service.get_post_comments(db, post_id, skip, limit)
+    comments = post_service.get_post_comments(db, post_id, skip, limit, cursor)
     total = post_service.count_post_comments(db, post_id)
 
     # Add likes count to each comment
     for comment in comments:
         comment.likes_count = post_service.count_comment_likes(db, comment.id)
 
-    return paginate_response(comments, page, limit, total)
+    return paginate_response(comments, page, limit, total, cursor_field="comment_id")
 
 
 # Like endpoints
 @router.post("/{post_id}/like", response_model=LikeInDB, status_code=status.HTTP_201_CREATED)
 def like_post(
-        post_id: int,
+        post_id: str,
         current_user: User = Depends(get_current_active_user),
         db: Session = Depends(get_db)
 ):
     """Like a post."""
-    like_data = LikeCreate(post_id=post_id)
-    return post_service.like_post(db, current_user.id, like_data)
+    like = post_service.like_post(db, current_user.id, post_id)
+    if not like:
+        raise HTTPException(status_code=404, detail="Post not found")
+    return like
 
 
 @router.delete("/{post_id}/like", status_code=status.HTTP_200_OK)
 def unlike_post(
-        post_id: int,
+        post_id: str,
         current_user: User = Depends(get_current_active_user),
         db: Session = Depends(get_db)
 ):
@@ -208,7 +222,7 @@ def unlike_post(
 
 @router.post("/comments/{comment_id}/like", status_code=status.HTTP_201_CREATED)
 def like_comment(
-        comment_id: int,
+        comment_id: str,
         current_user: User = Depends(get_current_active_user),
         db: Session = Depends(get_db)
 ):
@@ -220,7 +234,7 @@ def like_comment(
 
 @router.delete("/comments/{comment_id}/like", status_code=status.HTTP_200_OK)
 def unlike_comment(
-        comment_id: int,
+        comment_id: str,
         current_user: User = Depends(get_current_active_user),
         db: Session = Depends(get_db)
 ):
@@ -231,23 +245,24 @@ def unlike_comment(
 
 @router.get("/{post_id}/likes", response_model=Dict)
 def get_post_likes(
-        post_id: int,
+        post_id: str,
         page: int = Query(1, ge=1),
         limit: int = Query(50, ge=1, le=100),
+        cursor: Optional[str] = Query(None),
         current_user: User = Depends(get_current_active_user),
         db: Session = Depends(get_db)
 ):
     """Get all likes for a post."""
     skip = (page - 1) * limit
-    likes = post_service.get_post_likes(db, post_id, skip, limit)
+    likes = post_service.get_post_likes(db, post_id, skip, limit, cursor)
     total = post_service.count_post_likes(db, post_id)
 
-    return paginate_response(likes, page, limit, total)
+    return paginate_response(likes, page, limit, total, cursor_field="like_id")
 
 
 @router.get("/comments/{comment_id}/likes", response_model=Dict)
 def get_comment_likes(
-        comment_id: int,
+        comment_id: str,
         page: int = Query(1, ge=1),
         limit: int = Query(50, ge=1, le=100),
         current_user: User = Depends(get_current_active_user),
@@ -263,7 +278,7 @@ def get_comment_likes(
 
 @router.get("/{post_id}/is-liked")
 def is_post_liked(
-        post_id: int,
+        post_id: str,
         current_user: User = Depends(get_current_active_user),
         db: Session = Depends(get_db)
 ):
@@ -1,9 +1,10 @@
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
 from sqlalchemy.orm import Session
+from firebase_admin import firestore_async
 
-from app.database import get_db
-from app.utils.security import get_current_active_user
+from app.database import get_async_db, get_db
+from app.utils.security import get_current_active_user, get_current_active_user_async
 from app.service import profile as profile_service
 from app.model.user import User
 from app.schema.profile import (
@@ -18,12 +19,12 @@ router = APIRouter()
 
 # Profile endpoints
 @router.get("/me", response_model=ProfileInDB)
-def get_current_user_profile(
-        current_user: User = Depends(get_current_active_user),
-        db: Session = Depends(get_db)
+async def get_current_user_profile(
+        current_user: User = Depends(get_current_active_user_async),
+        db: firestore_async.AsyncClient = Depends(get_async_db)
 ):
     """Get current user's profile."""
-    profile = profile_service.get_profile_by_user_id(db, current_user.id)
+    profile = await profile_service.get_profile_async(db, current_user.id)
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
     return profile
@@ -70,13 +71,13 @@ def upload_cover_image(
 
 
 @router.get("/users/{user_id}", response_model=ProfileInDB)
-def get_user_profile(
-        user_id: int,
-        current_user: User = Depends(get_current_active_user),
-        db: Session = Depends(get_db)
+async def get_user_profile(
+        user_id: str,
+        current_user: User = Depends(get_current_active_user_async),
+        db: firestore_async.AsyncClient = Depends(get_async_db)
 ):
     """Get a user's profile by user ID."""
-    profile = profile_service.get_profile_by_user_id(db, user_id)
+    profile = await profile_service.get_profile_async(db, user_id)
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
     return profile
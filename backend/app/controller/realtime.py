@@ -0,0 +1,33 @@
+from typing import Optional
+from urllib.parse import parse_qs
+
+from socketio.exceptions import ConnectionRefusedError
+
+from app.core.realtime import sio, user_room
+from app.database import get_async_db
+from app.utils.security import resolve_principal_async
+
+
+def _token_from(environ: dict, auth: Optional[dict]) -> Optional[str]:
+    """Read the access token from the socket.io auth payload, or the query string for older clients."""
+    if auth and auth.get("token"):
+        return auth["token"]
+    query = parse_qs(environ.get("QUERY_STRING", ""))
+    return query.get("token", [None])[0]
+
+
+@sio.event
+async def connect(sid, environ, auth=None):
+    """Authenticate a socket with the same JWT as the HTTP API and join its user room."""
+    token = _token_from(environ, auth)
+    if not token:
+        raise ConnectionRefusedError("Authentication required")
+
+    user = await resolve_principal_async(await get_async_db(), token)
+    if user is None:
+        raise ConnectionRefusedError("Could not validate credentials")
+    if not user.is_active:
+        raise ConnectionRefusedError("Inactive user")
+
+    await sio.save_session(sid, {"user_id": user.id})
+    await sio.enter_room(sid, user_room(user.id))
@@ -1,19 +1,28 @@
 import firebase_admin
-from firebase_admin import credentials, auth
+from firebase_admin import credentials
 from pathlib import Path
 
+from app.config import settings
+from app.core.token_verifier import FirebaseTokenVerifier
+
 # Initialize Firebase Admin SDK
 cred = credentials.Certificate(
     str(Path(__file__).parent.parent.parent / "firebase-credentials.json")
 )
 firebase_admin.initialize_app(cred)
 
+# Verifies ID tokens locally against cached Google signing keys
+token_verifier = FirebaseTokenVerifier(
+    settings.FIREBASE_PROJECT_ID,
+    cache_size=settings.FIREBASE_TOKEN_CACHE_SIZE
+)
+
 def verify_firebase_token(token: str) -> dict:
     """
     Verify the Firebase ID token and return the decoded token
     """
     try:
-        decoded_token = auth.verify_id_token(token)
+        decoded_token = token_verifier.verify(token)
         return decoded_token
     except Exception as e:
-        raise Exception(f"Invalid token: {str(e)}") 
\ No newline at end of file
+        raise Exception(f"Invalid token: {str(e)}")
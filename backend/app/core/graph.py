@@ -0,0 +1,230 @@
+"""
+In-memory connection graph used for friends-of-friends queries.
+
+User IDs are interned to dense integers and every user's accepted
+connections are kept as a sorted array('I') of those integers, which keeps
+the adjacency lists compact and lets neighbour sets be intersected by
+merging. Connections that exist but are not accepted (pending or rejected)
+are tracked separately so they can be excluded from suggestions.
+
+Mutual-connection intersections are cached per pair of users and tagged
+with both users' adjacency versions, so a connection change invalidates
+exactly the pairs that involve the users whose neighbours changed.
+"""
+
+import heapq
+import threading
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from app.core.cache import TTLCache
+
+
+def _insert(values: array, value: int) -> bool:
+    index = bisect_left(values, value)
+    if index < len(values) and values[index] == value:
+        return False
+    values.insert(index, value)
+    return True
+
+
+def _intersect(left: array, right: array) -> List[int]:
+    """Intersect two sorted arrays.
+
+    Uses a linear merge for similarly sized inputs and binary search of the
+    larger array when one side is much smaller.
+    """
+    if len(left) > len(right):
+        left, right = right, left
+    if not left:
+        return []
+
+    if len(left) * 8 < len(right):
+        common = []
+        start = 0
+        for value in left:
+            start = bisect_left(right, value, start)
+            if start == len(right):
+                break
+            if right[start] == value:
+                common.append(value)
+        return common
+
+    common = []
+    i = j = 0
+    while i < len(left) and j < len(right):
+        if left[i] == right[j]:
+            common.append(left[i])
+            i += 1
+            j += 1
+        elif left[i] < right[j]:
+            i += 1
+        else:
+            j += 1
+    return common
+
+
+def _discard(values: array, value: int) -> bool:
+    index = bisect_left(values, value)
+    if index < len(values) and values[index] == value:
+        del values[index]
+        return True
+    return False
+
+
+class ConnectionGraph:
+    """Undirected graph of accepted connections with compact int-id adjacency arrays."""
+
+    def __init__(self, mutual_cache_size: int = 10000):
+        self._lock = threading.RLock()
+        self._ids: List[str] = []
+        self._ordinals: Dict[str, int] = {}
+        self._adjacency: Dict[int, array] = {}
+        self._blocked: Dict[int, Set[int]] = defaultdict(set)
+        self.version = 0
+        # Bumped whenever a user's accepted connections change; cached
+        # intersections remember the versions they were computed at
+        self._user_versions: Dict[int, int] = defaultdict(int)
+        self._mutual_cache = TTLCache(ttl=float("inf"), max_size=mutual_cache_size)
+
+    def _intern(self, user_id: str) -> int:
+        ordinal = self._ordinals.get(user_id)
+        if ordinal is None:
+            ordinal = len(self._ids)
+            self._ids.append(user_id)
+            self._ordinals[user_id] = ordinal
+        return ordinal
+
+    def _neighbours(self, ordinal: Optional[int]) -> array:
+        if ordinal is None:
+            return array('I')
+        return self._adjacency.get(ordinal, array('I'))
+
+    # Writes
+    def build(self, accepted: Iterable[Tuple[str, str]], other: Iterable[Tuple[str, str]] = ()) -> None:
+        """Replace the graph with the given accepted and non-accepted user pairs."""
+        with self._lock:
+            self._ids = []
+            self._ordinals = {}
+            adjacency = defaultdict(set)
+            for user_id, other_user_id in accepted:
+                a, b = self._intern(user_id), self._intern(other_user_id)
+                adjacency[a].add(b)
+                adjacency[b].add(a)
+            self._adjacency = {ordinal: array('I', sorted(ids)) for ordinal, ids in adjacency.items()}
+
+            self._blocked = defaultdict(set)
+            for user_id, other_user_id in other:
+                a, b = self._intern(user_id), self._intern(other_user_id)
+                self._blocked[a].add(b)
+                self._blocked[b].add(a)
+            self._user_versions = defaultdict(int)
+            self._mutual_cache.clear()
+            self.version += 1
+
+    def add_edge(self, user_id: str, other_user_id: str) -> None:
+        """Record an accepted connection."""
+        with self._lock:
+            a, b = self._intern(user_id), self._intern(other_user_id)
+            self._blocked[a].discard(b)
+            self._blocked[b].discard(a)
+            if _insert(self._adjacency.setdefault(a, array('I')), b):
+                _insert(self._adjacency.setdefault(b, array('I')), a)
+                self._user_versions[a] += 1
+                self._user_versions[b] += 1
+            self.version += 1
+
+    def block(self, user_id: str, other_user_id: str) -> None:
+        """Record a connection that exists but is not accepted."""
+        with self._lock:
+            a, b = self._intern(user_id), self._intern(other_user_id)
+            self._blocked[a].add(b)
+            self._blocked[b].add(a)
+            self.version += 1
+
+    def remove(self, user_id: str, other_user_id: str) -> None:
+        """Forget any connection between two users."""
+        with self._lock:
+            a, b = self._ordinals.get(user_id), self._ordinals.get(other_user_id)
+            if a is None or b is None:
+                return
+            if _discard(self._neighbours(a), b):
+                _discard(self._neighbours(b), a)
+                self._user_versions[a] += 1
+                self._user_versions[b] += 1
+            self._blocked[a].discard(b)
+            self._blocked[b].discard(a)
+            self.version += 1
+
+    # Reads
+    def neighbours(self, user_id: str) -> List[str]:
+        with self._lock:
+            return [self._ids[ordinal] for ordinal in self._neighbours(self._ordinals.get(user_id))]
+
+    def degree(self, user_id: str) -> int:
+        with self._lock:
+            return len(self._neighbours(self._ordinals.get(user_id)))
+
+    def suggestions(self, user_id: str, skip: int = 0, limit: int = 20) -> Tuple[List[Tuple[str, int]], int]:
+        """Rank friends-of-friends by the number of mutual connections.
+
+        Users already connected to user_id in any state are excluded. Returns
+        a page of (user_id, mutual_count) pairs, best first, and the exact
+        number of candidates from the same traversal. Only the best
+        skip + limit candidates are kept on the heap.
+        """
+        with self._lock:
+            ordinal = self._ordinals.get(user_id)
+            if ordinal is None:
+                return [], 0
+
+            neighbours = self._neighbours(ordinal)
+            excluded = set(neighbours)
+            excluded.update(self._blocked.get(ordinal, ()))
+            excluded.add(ordinal)
+
+            mutual_counts: Dict[int, int] = defaultdict(int)
+            for neighbour in neighbours:
+                for candidate in self._adjacency.get(neighbour, ()):
+                    if candidate not in excluded:
+                        mutual_counts[candidate] += 1
+
+            total = len(mutual_counts)
+            if limit <= 0:
+                return [], total
+
+            # Ties go to the lower ordinal, i.e. the user the graph saw first
+            ranked = heapq.nsmallest(skip + limit, mutual_counts.items(), key=lambda item: (-item[1], item[0]))
+            return [(self._ids[candidate], count) for candidate, count in ranked[skip:]], total
+
+    def _mutual_ordinals(self, a: int, b: int) -> List[int]:
+        key = (a, b) if a < b else (b, a)
+        versions = (self._user_versions[key[0]], self._user_versions[key[1]])
+
+        cached = self._mutual_cache.get(key)
+        if cached is not None and cached[0] == versions:
+            return cached[1]
+
+        common = _intersect(self._neighbours(a), self._neighbours(b))
+        self._mutual_cache.set(key, (versions, common))
+        return common
+
+    def mutual(self, user_id: str, other_user_id: str) -> List[str]:
+        """Get the users connected to both user_id and other_user_id."""
+        with self._lock:
+            a, b = self._ordinals.get(user_id), self._ordinals.get(other_user_id)
+            if a is None or b is None:
+                return []
+            return [self._ids[ordinal] for ordinal in self._mutual_ordinals(a, b)]
+
+    def mutual_counts(self, user_id: str, other_user_ids: Iterable[str]) -> Dict[str, int]:
+        """Count mutual connections between user_id and each of other_user_ids."""
+        with self._lock:
+            a = self._ordinals.get(user_id)
+            counts = {}
+            for other_user_id in other_user_ids:
+                b = self._ordinals.get(other_user_id)
+                counts[other_user_id] = 0 if a is None or b is None else len(self._mutual_ordinals(a, b))
+            return counts
@@ -0,0 +1,106 @@
+"""
+Image variant generation.
+
+Uploads are stored as received and acknowledged straight away; resized
+variants are produced afterwards on a process pool so decoding and
+resampling never run on a request thread. Every variant is written in the
+source format and as WebP.
+
+Variants are derived from one decode, largest first, each one resampled from
+the previous. JPEG sources are decoded in draft mode for the largest target,
+which lets libjpeg scale by 1/2, 1/4 or 1/8 while decoding and avoids
+materializing the full-resolution bitmap for big downscales.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+from PIL import Image
+
+from app.config import settings
+
+WEBP_EXTENSION = ".webp"
+
+
+def parse_variants(spec: str) -> Dict[str, Tuple[int, int]]:
+    """Parse "name:WIDTHxHEIGHT,..." into {name: (width, height)}."""
+    variants = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        name, size = item.strip().split(":")
+        width, height = size.lower().split("x")
+        variants[name] = (int(width), int(height))
+    return variants
+
+
+IMAGE_VARIANTS = parse_variants(settings.IMAGE_VARIANTS)
+
+
+def variant_paths(source_path: str, name: str, save_format: str) -> Tuple[str, str]:
+    """Relative paths of a variant in the source format and as WebP."""
+    stem, _ = os.path.splitext(source_path)
+    ext = ".png" if save_format == "PNG" else ".jpg"
+    return f"{stem}_{name}{ext}", f"{stem}_{name}{WEBP_EXTENSION}"
+
+
+def generate_variants(
+        source_path: str,
+        uploads_dir: str,
+        variants: Dict[str, Tuple[int, int]],
+        quality: int = 85
+) -> Dict[str, Dict[str, Any]]:
+    """Write resized copies of an uploaded image next to it.
+
+    Runs in a worker process. Returns {name: {"path", "webp", "width",
+    "height"}} with paths relative to uploads_dir. Animated images are left
+    alone and yield no variants.
+    """
+    if not variants:
+        return {}
+
+    # Largest target first so each variant can be resampled from the last
+    ordered = sorted(variants.items(), key=lambda item: item[1][0] * item[1][1], reverse=True)
+
+    with Image.open(os.path.join(uploads_dir, source_path)) as source:
+        if getattr(source, "is_animated", False):
+            return {}
+
+        save_format = "PNG" if source.format == "PNG" else "JPEG"
+        if source.format == "JPEG":
+            source.draft("RGB", ordered[0][1])
+
+        img = source.convert("RGBA" if save_format == "PNG" else "RGB")
+
+    results = {}
+    for name, size in ordered:
+        # thumbnail() only ever shrinks and keeps the aspect ratio
+        img.thumbnail(size, Image.LANCZOS)
+
+        path, webp_path = variant_paths(source_path, name, save_format)
+        img.save(os.path.join(uploads_dir, path), format=save_format, quality=quality, optimize=True)
+        img.save(os.path.join(uploads_dir, webp_path), format="WEBP", quality=quality, method=4)
+
+        results[name] = {"path": path, "webp": webp_path, "width": img.width, "height": img.height}
+
+    return results
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_image_pool() -> ProcessPoolExecutor:
+    """Get the process pool image work runs on, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawn rather than fork: the API process holds gRPC channels and threads
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.IMAGE_VARIANT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
@@ -0,0 +1,172 @@
+"""
+Outbound mail queue delivered over persistent SMTP connections.
+
+Kept free of application imports so it can be exercised against a local
+SMTP server without the rest of the app.
+"""
+
+import logging
+import queue
+import smtplib
+import threading
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# SMTP errors that will not go away by retrying the same message
+PERMANENT_SMTP_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPNotSupportedError)
+
+
+def _is_permanent(error: Exception) -> bool:
+    if isinstance(error, PERMANENT_SMTP_ERRORS):
+        return True
+    # A reply to the message itself: 5xx is final, 4xx is worth retrying
+    return isinstance(error, smtplib.SMTPDataError) and error.smtp_code >= 500
+
+
+class MailQueue:
+    """Outbound mail queue delivered over persistent SMTP connections.
+
+    Each worker thread keeps one SMTP session open and sends every message
+    waiting in the queue, up to batch_size, before waiting again; the
+    session is closed after idle_timeout seconds without mail and reopened
+    on demand or after a connection failure. Transient failures are retried
+    with exponential backoff. enqueue() never blocks on the network.
+    """
+
+    def __init__(
+            self,
+            host: str,
+            port: int,
+            username: str = "",
+            password: str = "",
+            use_tls: bool = True,
+            workers: int = 1,
+            batch_size: int = 20,
+            max_retries: int = 5,
+            retry_backoff: float = 2.0,
+            idle_timeout: float = 60.0,
+            timeout: float = 30.0
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._queue: "queue.Queue" = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pending = 0
+        self._stats = {"sent": 0, "failed": 0, "retried": 0, "connections": 0, "refused_recipients": 0}
+
+    def _ensure_workers(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"mail-worker-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def enqueue(self, from_addr: str, recipients: List[str], message: str) -> None:
+        """Queue a rendered message for delivery."""
+        with self._lock:
+            self._pending += 1
+        self._ensure_workers()
+        self._queue.put((from_addr, recipients, message, 0))
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued message was sent or given up on."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def _connect(self) -> smtplib.SMTP:
+        connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            connection.starttls()
+        if self.username and self.password:
+            connection.login(self.username, self.password)
+        with self._lock:
+            self._stats["connections"] += 1
+        return connection
+
+    @staticmethod
+    def _close(connection: Optional[smtplib.SMTP]) -> None:
+        if connection is None:
+            return
+        try:
+            connection.quit()
+        except Exception:
+            connection.close()
+
+    def _work(self) -> None:
+        connection = None
+        while True:
+            try:
+                item = self._queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                self._close(connection)
+                connection = None
+                continue
+
+            # Send whatever else is waiting over the same session
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            for from_addr, recipients, message, attempt in batch:
+                try:
+                    if connection is None:
+                        connection = self._connect()
+                    refused = connection.sendmail(from_addr, recipients, message)
+                except (smtplib.SMTPException, OSError) as e:
+                    if _is_permanent(e):
+                        logger.error(f"Mail to {recipients} rejected: {str(e)}")
+                        self._finish("failed")
+                        continue
+
+                    # The session may be unusable; start a fresh one next time
+                    self._close(connection)
+                    connection = None
+                    self._retry(from_addr, recipients, message, attempt, e)
+                else:
+                    # Only raised when every recipient is refused; partial refusals come back as a dict
+                    if refused:
+                        logger.error(f"Mail rejected for {sorted(refused)} of {recipients}: {refused}")
+                        with self._lock:
+                            self._stats["refused_recipients"] += len(refused)
+                    self._finish("sent")
+
+    def _retry(self, from_addr: str, recipients: List[str], message: str, attempt: int, error: Exception) -> None:
+        if attempt >= self.max_retries:
+            logger.error(f"Mail to {recipients} failed after {attempt + 1} attempts: {str(error)}")
+            self._finish("failed")
+            return
+
+        delay = self.retry_backoff * (2 ** attempt)
+        logger.warning(f"Mail to {recipients} failed, retrying in {delay:.1f}s: {str(error)}")
+        with self._lock:
+            self._stats["retried"] += 1
+        timer = threading.Timer(delay, self._queue.put, args=((from_addr, recipients, message, attempt + 1),))
+        timer.daemon = True
+        timer.start()
+
+    def _finish(self, outcome: str) -> None:
+        with self._idle:
+            self._pending -= 1
+            self._stats[outcome] += 1
+            self._idle.notify_all()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {"depth": self._pending, **self._stats}
@@ -0,0 +1,192 @@
+"""
+Content-addressed media store.
+
+Uploaded files are stored once per distinct content under the SHA-256 of
+their bytes, fanned out over two levels of shard directories:
+
+    objects/ab/cd/abcd...ef.jpg
+
+so identical uploads share one file and no directory grows past a few
+hundred entries. A media_objects document per digest counts the references
+held by posts and profiles; the file and its generated variants are removed
+when the last reference is released.
+
+Reference counts change in transactions but the files move outside them, so
+a release marks the document pending-delete and moves the files aside first.
+The document and the files are only deleted once a second transaction sees
+the mark still in place; if an add took the content over meanwhile, the
+files are moved back instead.
+"""
+
+import hashlib
+import logging
+import os
+import uuid
+from typing import Any, Dict, Optional
+
+from firebase_admin import firestore
+from google.api_core.exceptions import NotFound
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+OBJECTS_DIR = "objects"
+MEDIA_OBJECTS_COLLECTION = "media_objects"
+
+
+def hash_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class MediaStore:
+    """Deduplicating, reference-counted file store under an uploads directory."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def object_path(self, digest: str, ext: str = "") -> str:
+        """Path of an object relative to the uploads directory."""
+        return f"{OBJECTS_DIR}/{digest[:2]}/{digest[2:4]}/{digest}{ext}"
+
+    def is_managed(self, path: Optional[str]) -> bool:
+        return bool(path) and path.startswith(f"{OBJECTS_DIR}/")
+
+    def digest_of(self, path: str) -> str:
+        return os.path.splitext(os.path.basename(path))[0]
+
+    def _ref(self, client: firestore.Client, digest: str):
+        return client.collection(MEDIA_OBJECTS_COLLECTION).document(digest)
+
+    def add(self, client: firestore.Client, source_path: str, digest: str, ext: str = "",
+            metadata: Optional[Dict[str, Any]] = None) -> str:
+        """Take a reference to content, moving source_path into the store.
+
+        source_path is consumed either way: moved into place for new content
+        or deleted when the content is already stored.
+        """
+        path = self.object_path(digest, ext)
+        full_path = os.path.join(self.root, path)
+        object_ref = self._ref(client, digest)
+
+        @firestore.transactional
+        def _increment(transaction) -> int:
+            object_doc = object_ref.get(transaction=transaction)
+            if object_doc.exists:
+                # Taking a reference to content pending delete cancels the delete
+                refs = object_doc.get('refs') + 1
+                transaction.update(object_ref, {'refs': refs, 'deleting': None})
+            else:
+                refs = 1
+                transaction.set(object_ref, {**(metadata or {}), 'path': path, 'refs': refs, 'variants': None})
+            return refs
+
+        refs = _increment(client.transaction())
+
+        # A release that lost the race to this add may have moved the file aside
+        if refs == 1 or not os.path.exists(full_path):
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            os.replace(source_path, full_path)
+        else:
+            os.remove(source_path)
+
+        return path
+
+    def release(self, client: firestore.Client, path: str) -> bool:
+        """Drop a reference; delete the file and its variants if it was the last one."""
+        object_ref = self._ref(client, self.digest_of(path))
+        token = uuid.uuid4().hex
+
+        @firestore.transactional
+        def _decrement(transaction) -> Optional[Dict[str, Any]]:
+            object_doc = object_ref.get(transaction=transaction)
+            # Nothing counts references to unknown paths; just remove the file
+            if not object_doc.exists:
+                return {}
+
+            object_data = object_doc.to_dict()
+            # Another release is already deleting this content
+            if object_data['refs'] < 1:
+                return None
+            if object_data['refs'] > 1:
+                transaction.update(object_ref, {'refs': object_data['refs'] - 1})
+                return None
+
+            transaction.update(object_ref, {'refs': 0, 'deleting': token})
+            return object_data
+
+        @firestore.transactional
+        def _confirm(transaction) -> bool:
+            object_doc = object_ref.get(transaction=transaction)
+            if not object_doc.exists or object_doc.get('deleting') != token:
+                return False
+
+            transaction.delete(object_ref)
+            return True
+
+        removed = _decrement(client.transaction())
+        if removed is None:
+            return False
+
+        paths = [path]
+        for variant in (removed.get('variants') or {}).values():
+            paths.extend([variant['path'], variant['webp']])
+
+        if not removed:
+            for relative_path in paths:
+                full_path = os.path.join(self.root, relative_path)
+                if os.path.exists(full_path):
+                    os.remove(full_path)
+            return True
+
+        moved = self._move_aside(paths, token)
+        if not _confirm(client.transaction()):
+            self._move_back(moved)
+            logger.info("Release of %s was overtaken by a new reference", path)
+            return False
+
+        for aside_path, _ in moved:
+            os.remove(aside_path)
+        return True
+
+    def _move_aside(self, paths, token: str):
+        """Rename the files that exist out of the way, returning (aside, original) full paths."""
+        moved = []
+        for relative_path in paths:
+            full_path = os.path.join(self.root, relative_path)
+            aside_path = f"{full_path}.{token}.deleting"
+            try:
+                os.replace(full_path, aside_path)
+            except FileNotFoundError:
+                continue
+            moved.append((aside_path, full_path))
+        return moved
+
+    def _move_back(self, moved) -> None:
+        """Restore moved-aside files an add has not already put back; content is identical either way."""
+        for aside_path, full_path in moved:
+            if os.path.exists(full_path):
+                os.remove(aside_path)
+            else:
+                os.replace(aside_path, full_path)
+
+    def get_variants(self, client: firestore.Client, path: str) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Variants already generated for an object, if any."""
+        object_doc = self._ref(client, self.digest_of(path)).get()
+        return object_doc.get('variants') if object_doc.exists else None
+
+    def set_variants(self, client: firestore.Client, path: str, variants: Dict[str, Dict[str, Any]]) -> bool:
+        """Remember an object's variants; False if the object has been released meanwhile."""
+        try:
+            self._ref(client, self.digest_of(path)).update({'variants': variants})
+            return True
+        except NotFound:
+            return False
+
+
+media_store = MediaStore(settings.UPLOADS_DIR)
@@ -0,0 +1,88 @@
+"""
+Real-time event push over socket.io.
+
+Every authenticated socket joins a room named after its user, and services
+publish events to those rooms instead of clients polling for them. Where
+events travel between processes is pluggable with REALTIME_BACKEND:
+
+- "memory": a single API process. Events published from request or task
+  threads are handed to the server's event loop.
+- "redis": several API workers or hosts. The socket.io server shares rooms
+  over Redis pub/sub, and any process, Celery workers included, publishes
+  through a write-only Redis manager.
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+import socketio
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def user_room(user_id: str) -> str:
+    return f"user:{user_id}"
+
+
+class Publisher:
+    """Deliver an event to every socket in a room."""
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Called at application startup with the loop the socket.io server runs on."""
+
+    def publish(self, room: str, event: str, data: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+
+class InMemoryPublisher(Publisher):
+    """Emit through the socket.io server running in this process."""
+
+    def __init__(self, server: socketio.AsyncServer):
+        self.server = server
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+
+    def publish(self, room: str, event: str, data: Dict[str, Any]) -> None:
+        if self._loop is None or self._loop.is_closed():
+            # No server in this process (a script or worker); nobody to deliver to
+            logger.debug(f"Dropping {event} for {room}: no socket.io server in this process")
+            return
+        asyncio.run_coroutine_threadsafe(self.server.emit(event, data, room=room), self._loop)
+
+
+class RedisPublisher(Publisher):
+    """Publish onto the Redis channel every socket.io server listens on."""
+
+    def __init__(self, url: str):
+        self._manager = socketio.RedisManager(url, write_only=True)
+
+    def publish(self, room: str, event: str, data: Dict[str, Any]) -> None:
+        self._manager.emit(event, data, room=room)
+
+
+def _create_server() -> socketio.AsyncServer:
+    client_manager = None
+    if settings.REALTIME_BACKEND == "redis":
+        client_manager = socketio.AsyncRedisManager(settings.REDIS_URL)
+    return socketio.AsyncServer(
+        async_mode="asgi",
+        client_manager=client_manager,
+        cors_allowed_origins="*"  # Same as the HTTP API in development
+    )
+
+
+sio = _create_server()
+publisher = RedisPublisher(settings.REDIS_URL) if settings.REALTIME_BACKEND == "redis" else InMemoryPublisher(sio)
+
+
+def publish_to_user(user_id: str, event: str, data: Dict[str, Any]) -> None:
+    """Push an event to all of a user's connected sockets; never raises."""
+    try:
+        publisher.publish(user_room(user_id), event, data)
+    except Exception as e:
+        logger.warning(f"Failed to publish {event} to user {user_id}: {str(e)}")
@@ -0,0 +1,610 @@
+"""
+In-process inverted index with BM25 ranking.
+
+Documents are tokenized per field and lowercased. Flushed data lives in an
+immutable segment file that is memory-mapped, so only the term dictionary
+and the document table are held on the heap; postings are decoded from the
+mapping on demand. Writes since the last flush go to an in-memory delta
+(additions plus tombstones for superseded segment documents) and are merged
+into a new segment once enough of them have accumulated.
+
+Worker processes share one segment file with a single writer: the process
+holding the segment's lock file. When it flushes, it first switches to any
+newer segment on disk (e.g. from a rebuild), then replays every document
+its source reports modified since the segment's watermark, so other
+processes' writes are included, and writes the result through a private
+temporary file. Other processes keep their writes in their delta and switch
+to each new segment as it appears. Loading replays documents modified since
+the watermark too, so a delta lost with a restarted process comes back from
+the source instead of waiting for a rebuild.
+"""
+
+import bisect
+import heapq
+import json
+import logging
+import math
+import mmap
+import os
+import re
+import struct
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, so every process writes the segment
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+MAGIC = b"LOIX"
+VERSION = 2
+# magic, version, doc count, term count, docs offset, terms offset, postings offset, watermark
+_HEADER = struct.Struct("<4sIIIQQQd")
+# doc ordinal, term frequency
+_POSTING = struct.Struct("<IH")
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+_TERM_INFO = struct.Struct("<QI")
+
+MAX_TERM_FREQUENCY = 0xFFFF
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Split text into lowercased word tokens."""
+    if not text:
+        return []
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def timestamp(value: Optional[datetime]) -> float:
+    """Convert a datetime to a UNIX timestamp, treating naive values as UTC."""
+    if value is None:
+        return 0.0
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class SearchResults(NamedTuple):
+    """A page of (doc_id, score) hits with the total match count and facet counts."""
+    hits: List[Tuple[str, float]]
+    total: int
+    facets: Dict[str, Dict[Any, int]]
+
+
+# (doc_id, fields, meta)
+Document = Tuple[str, Dict[str, Optional[str]], Dict[str, Any]]
+
+
+def _term(field: str, token: str) -> str:
+    return f"{field}:{token}"
+
+
+class InvertedIndex:
+    """Inverted index over multi-field documents with BM25 scoring.
+
+    source(since) yields the documents modified at or after a UNIX timestamp,
+    or every document for None; it is what rebuilds and catch-ups read from.
+    Document metadata should carry a "modified_at" timestamp so that other
+    processes can drop delta entries once the writer's segment holds them.
+    """
+
+    # Catch-ups start this many seconds before the watermark to allow for
+    # clock differences between the hosts that stamp the documents
+    CLOCK_SKEW = 60.0
+
+    def __init__(
+            self,
+            path: Optional[str] = None,
+            field_weights: Optional[Dict[str, float]] = None,
+            k1: float = 1.2,
+            b: float = 0.75,
+            flush_threshold: int = 1000,
+            source: Optional[Callable[[Optional[float]], Iterable[Document]]] = None,
+            flush_interval: float = 300.0
+    ):
+        self.path = path
+        self.field_weights = field_weights or {"text": 1.0}
+        self.k1 = k1
+        self.b = b
+        self.flush_threshold = flush_threshold
+        self.source = source
+        self.flush_interval = flush_interval
+        self._lock = threading.RLock()
+        self._writer_lock_file = None
+        self._flushed_at = time.monotonic()
+        self._reset_segment()
+        self._reset_delta()
+
+    # State management
+    def _reset_segment(self) -> None:
+        self._file = None
+        self._mmap = None
+        self._seg_ids: List[str] = []
+        self._seg_ordinals: Dict[str, int] = {}
+        self._seg_lengths: List[int] = []
+        self._seg_meta: List[Dict[str, Any]] = []
+        self._seg_terms: List[str] = []
+        self._seg_term_info: List[Tuple[int, int]] = []
+        self._seg_total_length = 0
+        # Every document modified before this UNIX time is in the segment
+        self.watermark = 0.0
+
+    def _reset_delta(self) -> None:
+        self._delta_postings: Dict[str, Dict[str, int]] = {}
+        self._delta_docs: Dict[str, Tuple[int, Dict[str, Any], List[str]]] = {}
+        self._delta_terms_sorted: Optional[List[str]] = None
+        self._deleted: Set[str] = set()
+        self._deleted_length = 0
+        self._delta_length = 0
+        self._pending = 0
+
+    def _close_segment(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+        if self._file is not None:
+            self._file.close()
+        self._reset_segment()
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_segment()
+            if self._writer_lock_file is not None:
+                self._writer_lock_file.close()
+                self._writer_lock_file = None
+
+    # Segment I/O
+    def load(self) -> bool:
+        """Open the segment file if it exists and catch up on documents modified since it was written.
+
+        Returns False if there is no usable segment.
+        """
+        with self._lock:
+            self._close_segment()
+            self._reset_delta()
+            if not self.path or not os.path.exists(self.path):
+                return False
+
+            try:
+                self._open_segment()
+            except (OSError, ValueError, struct.error) as e:
+                logger.warning(f"Discarding unreadable search segment {self.path}: {str(e)}")
+                self._close_segment()
+                return False
+
+            count = self._catch_up()
+            if count:
+                logger.info(f"Replayed {count} documents modified since {self.path} was written")
+            return True
+
+    def _open_segment(self) -> None:
+        self._file = open(self.path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = self._mmap
+
+        magic, version = struct.unpack_from("<4sI", buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not a search segment")
+        _, _, n_docs, n_terms, docs_offset, terms_offset, _, watermark = _HEADER.unpack_from(buf, 0)
+        self.watermark = watermark
+
+        offset = docs_offset
+        for ordinal in range(n_docs):
+            (id_length,) = _U16.unpack_from(buf, offset)
+            offset += _U16.size
+            doc_id = buf[offset:offset + id_length].decode()
+            offset += id_length
+            (doc_length,) = _U32.unpack_from(buf, offset)
+            offset += _U32.size
+            (meta_length,) = _U32.unpack_from(buf, offset)
+            offset += _U32.size
+            meta = json.loads(buf[offset:offset + meta_length]) if meta_length else {}
+            offset += meta_length
+
+            self._seg_ids.append(doc_id)
+            self._seg_ordinals[doc_id] = ordinal
+            self._seg_lengths.append(doc_length)
+            self._seg_meta.append(meta)
+            self._seg_total_length += doc_length
+
+        offset = terms_offset
+        for _ in range(n_terms):
+            (term_length,) = _U16.unpack_from(buf, offset)
+            offset += _U16.size
+            self._seg_terms.append(buf[offset:offset + term_length].decode())
+            offset += term_length
+            self._seg_term_info.append(_TERM_INFO.unpack_from(buf, offset))
+            offset += _TERM_INFO.size
+
+    def _segment_postings(self, term: str) -> Dict[str, int]:
+        index = bisect.bisect_left(self._seg_terms, term)
+        if index == len(self._seg_terms) or self._seg_terms[index] != term:
+            return {}
+
+        postings_offset, df = self._seg_term_info[index]
+        postings = {}
+        view = memoryview(self._mmap)[postings_offset:postings_offset + df * _POSTING.size]
+        try:
+            for ordinal, tf in _POSTING.iter_unpack(view):
+                doc_id = self._seg_ids[ordinal]
+                if doc_id not in self._deleted:
+                    postings[doc_id] = tf
+        finally:
+            view.release()
+        return postings
+
+    def _segment_changed(self) -> bool:
+        """Whether the segment file on disk is not the one this process has open."""
+        try:
+            on_disk = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        if self._file is None:
+            return True
+        current = os.fstat(self._file.fileno())
+        return (on_disk.st_ino, on_disk.st_mtime_ns) != (current.st_ino, current.st_mtime_ns)
+
+    def _adopt_segment(self) -> None:
+        """Switch to a segment another process wrote, keeping this process's delta on top of it."""
+        superseded = self._deleted | set(self._delta_docs)
+        self._close_segment()
+        try:
+            self._open_segment()
+        except (OSError, ValueError, struct.error) as e:
+            logger.warning(f"Ignoring unreadable search segment {self.path}: {str(e)}")
+            self._close_segment()
+
+        # Delta documents the new segment already holds are dropped from the delta
+        cutoff = self.watermark - self.CLOCK_SKEW
+        for doc_id, (_, meta, _) in list(self._delta_docs.items()):
+            if doc_id in self._seg_ordinals and meta.get("modified_at", float("inf")) <= cutoff:
+                self._drop_delta_doc(doc_id)
+                superseded.discard(doc_id)
+
+        self._deleted, self._deleted_length = set(), 0
+        for doc_id in superseded:
+            ordinal = self._seg_ordinals.get(doc_id)
+            if ordinal is not None:
+                self._deleted.add(doc_id)
+                self._deleted_length += self._seg_lengths[ordinal]
+
+    def _owns_segment(self) -> bool:
+        """Whether this process is the segment's writer, trying to become it if nobody is."""
+        if fcntl is None or self._writer_lock_file is not None:
+            return True
+
+        lock_file = open(f"{self.path}.lock", "a")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        # Held until the process exits, when the OS releases it for another worker
+        self._writer_lock_file = lock_file
+        return True
+
+    def _catch_up(self) -> int:
+        """Add every document the source reports modified since the watermark to the delta."""
+        if self.source is None or not self.watermark:
+            return 0
+
+        count = 0
+        for doc_id, fields, meta in self.source(self.watermark - self.CLOCK_SKEW):
+            self._add_locked(doc_id, fields, meta)
+            count += 1
+        self._pending += count
+        return count
+
+    def flush(self) -> None:
+        """Merge the delta into a new segment file, or pick up the writer's segment in other processes."""
+        with self._lock:
+            if not self.path:
+                return
+
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            if self._segment_changed():
+                self._adopt_segment()
+            self._flushed_at = time.monotonic()
+            if not self._owns_segment():
+                self._pending = 0
+                return
+
+            started = time.time()
+            self._catch_up()
+            self._write_segment(started if self.source is not None else self.watermark)
+
+    def _write_segment(self, watermark: float) -> None:
+        # Collect every live document and its postings
+        doc_ids = [doc_id for doc_id in self._seg_ids if doc_id not in self._deleted]
+        doc_ids.extend(self._delta_docs)
+        ordinals = {doc_id: ordinal for ordinal, doc_id in enumerate(doc_ids)}
+
+        terms = sorted(set(self._seg_terms) | set(self._delta_postings))
+        postings_by_term = []
+        for term in terms:
+            postings = self._segment_postings(term)
+            postings.update(self._delta_postings.get(term, {}))
+            if postings:
+                postings_by_term.append((term, sorted((ordinals[d], tf) for d, tf in postings.items())))
+
+        docs_blob = bytearray()
+        for doc_id in doc_ids:
+            length, meta = self._doc_length_meta(doc_id)
+            encoded_id = doc_id.encode()
+            encoded_meta = json.dumps(meta, separators=(",", ":")).encode()
+            docs_blob += _U16.pack(len(encoded_id)) + encoded_id
+            docs_blob += _U32.pack(length) + _U32.pack(len(encoded_meta)) + encoded_meta
+
+        docs_offset = _HEADER.size
+        terms_offset = docs_offset + len(docs_blob)
+        terms_size = sum(_U16.size + len(term.encode()) + _TERM_INFO.size for term, _ in postings_by_term)
+        postings_offset = terms_offset + terms_size
+
+        terms_blob = bytearray()
+        postings_blob = bytearray()
+        for term, postings in postings_by_term:
+            encoded_term = term.encode()
+            terms_blob += _U16.pack(len(encoded_term)) + encoded_term
+            terms_blob += _TERM_INFO.pack(postings_offset + len(postings_blob), len(postings))
+            for ordinal, tf in postings:
+                postings_blob += _POSTING.pack(ordinal, tf)
+
+        header = _HEADER.pack(MAGIC, VERSION, len(doc_ids), len(postings_by_term),
+                              docs_offset, terms_offset, postings_offset, watermark)
+
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        # A private temporary file per write, so concurrent writers never share one
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f"{os.path.basename(self.path)}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(header)
+                f.write(docs_blob)
+                f.write(terms_blob)
+                f.write(postings_blob)
+                f.flush()
+                os.fsync(f.fileno())
+
+            self._close_segment()
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        self._reset_delta()
+        self._open_segment()
+
+    # Document access
+    def _doc_length_meta(self, doc_id: str) -> Tuple[int, Dict[str, Any]]:
+        if doc_id in self._delta_docs:
+            length, meta, _ = self._delta_docs[doc_id]
+            return length, meta
+        ordinal = self._seg_ordinals[doc_id]
+        return self._seg_lengths[ordinal], self._seg_meta[ordinal]
+
+    def _live_doc_ids(self) -> Iterable[str]:
+        for doc_id in self._seg_ids:
+            if doc_id not in self._deleted:
+                yield doc_id
+        yield from self._delta_docs
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._seg_ids) - len(self._deleted) + len(self._delta_docs)
+
+    def __contains__(self, doc_id: str) -> bool:
+        with self._lock:
+            return doc_id in self._delta_docs or (doc_id in self._seg_ordinals and doc_id not in self._deleted)
+
+    # Writes
+    def add(self, doc_id: str, fields: Dict[str, Optional[str]], meta: Optional[Dict[str, Any]] = None) -> None:
+        """Index a document, replacing any previous version of it."""
+        with self._lock:
+            self._add_locked(doc_id, fields, meta)
+            self._written()
+
+    def _add_locked(self, doc_id: str, fields: Dict[str, Optional[str]], meta: Optional[Dict[str, Any]]) -> None:
+        self._remove_locked(doc_id)
+
+        counts = Counter()
+        for field, text in fields.items():
+            for token in tokenize(text):
+                counts[_term(field, token)] += 1
+
+        length = sum(counts.values())
+        for term, tf in counts.items():
+            self._delta_postings.setdefault(term, {})[doc_id] = min(tf, MAX_TERM_FREQUENCY)
+        self._delta_docs[doc_id] = (length, meta or {}, list(counts))
+        self._delta_length += length
+        self._delta_terms_sorted = None
+
+    def remove(self, doc_id: str) -> None:
+        """Remove a document from the index."""
+        with self._lock:
+            self._remove_locked(doc_id)
+            self._written()
+
+    def _drop_delta_doc(self, doc_id: str) -> None:
+        length, _, terms = self._delta_docs.pop(doc_id)
+        self._delta_length -= length
+        for term in terms:
+            postings = self._delta_postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._delta_postings[term]
+        self._delta_terms_sorted = None
+
+    def _remove_locked(self, doc_id: str) -> None:
+        if doc_id in self._delta_docs:
+            self._drop_delta_doc(doc_id)
+
+        ordinal = self._seg_ordinals.get(doc_id)
+        if ordinal is not None and doc_id not in self._deleted:
+            self._deleted.add(doc_id)
+            self._deleted_length += self._seg_lengths[ordinal]
+
+    def _written(self) -> None:
+        self._pending += 1
+        if not self.path:
+            return
+        if self._pending >= self.flush_threshold or time.monotonic() - self._flushed_at > self.flush_interval:
+            self.flush()
+
+    def rebuild(self, documents: Optional[Iterable[Document]] = None) -> int:
+        """Replace the whole index with the given documents, or everything the source yields.
+
+        The new segment is written whichever process owns it; the writer
+        picks it up on its next flush.
+        """
+        with self._lock:
+            self._close_segment()
+            self._reset_delta()
+            started = time.time()
+            if documents is None:
+                documents = self.source(None)
+            for doc_id, fields, meta in documents:
+                self._add_locked(doc_id, fields, meta)
+            count = len(self._delta_docs)
+            if self.path:
+                self._write_segment(started)
+            self._flushed_at = time.monotonic()
+            return count
+
+    # Reads
+    def _delta_terms(self) -> List[str]:
+        if self._delta_terms_sorted is None:
+            self._delta_terms_sorted = sorted(self._delta_postings)
+        return self._delta_terms_sorted
+
+    def _expand(self, term: str, prefix: bool) -> Set[str]:
+        if not prefix:
+            return {term}
+
+        expanded = set()
+        for terms in (self._seg_terms, self._delta_terms()):
+            index = bisect.bisect_left(terms, term)
+            while index < len(terms) and terms[index].startswith(term):
+                expanded.add(terms[index])
+                index += 1
+        return expanded
+
+    def _postings(self, term: str) -> Dict[str, int]:
+        postings = self._segment_postings(term) if self._mmap is not None else {}
+        postings.update(self._delta_postings.get(term, {}))
+        return postings
+
+    def search(
+            self,
+            query: Optional[str],
+            fields: Optional[List[str]] = None,
+            prefix: bool = True,
+            field_queries: Optional[Dict[str, str]] = None,
+            filter: Optional[Callable[[Dict[str, Any]], bool]] = None,
+            facets: Optional[List[str]] = None,
+            sort_key: Optional[Callable[[Dict[str, Any]], Any]] = None,
+            skip: int = 0,
+            limit: int = 20
+    ) -> SearchResults:
+        """Find documents containing every query token.
+
+        The last token also matches as a prefix unless prefix is False, and
+        field_queries restricts matches further to documents whose given field
+        contains the given text. Hits are ranked by BM25 score (or by sort_key
+        over the document metadata, descending) and returned together with the
+        total number of matches and value counts for the requested facet
+        metadata keys, so a page and its counts come from a single pass. An
+        empty query matches every document that passes the filters.
+        """
+        with self._lock:
+            # Pick up segments written by the writer process; a stat per search
+            if self.path and time.monotonic() - self._flushed_at > self.flush_interval:
+                self.flush()
+            elif self.path and self._segment_changed():
+                self._adopt_segment()
+
+            tokens = tokenize(query)
+            fields = fields or list(self.field_weights)
+
+            if tokens:
+                scores = self._score(tokens, fields, prefix)
+            else:
+                scores = {doc_id: 0.0 for doc_id in self._live_doc_ids()}
+
+            for field, text in (field_queries or {}).items():
+                field_tokens = tokenize(text)
+                if field_tokens and scores:
+                    field_scores = self._score(field_tokens, [field], prefix)
+                    scores = {doc_id: score for doc_id, score in scores.items() if doc_id in field_scores}
+
+            matches = []
+            facet_counts = {facet: Counter() for facet in facets or []}
+            for doc_id, score in scores.items():
+                meta = self._doc_length_meta(doc_id)[1]
+                if filter is not None and not filter(meta):
+                    continue
+                matches.append((doc_id, score, meta))
+                for facet, counts in facet_counts.items():
+                    value = meta.get(facet)
+                    counts.update(value if isinstance(value, list) else [value])
+
+            facet_counts = {facet: dict(counts) for facet, counts in facet_counts.items()}
+            total = len(matches)
+            if limit <= 0:
+                return SearchResults([], total, facet_counts)
+
+            if sort_key is not None:
+                key = lambda match: (sort_key(match[2]), match[1])
+            else:
+                key = lambda match: (match[1], match[2].get("created_at", 0))
+            ranked = heapq.nlargest(skip + limit, matches, key=key)
+
+            hits = [(doc_id, score) for doc_id, score, _ in ranked[skip:skip + limit]]
+            return SearchResults(hits, total, facet_counts)
+
+    def _score(self, tokens: List[str], fields: List[str], prefix: bool) -> Dict[str, float]:
+        doc_count = len(self._seg_ids) - len(self._deleted) + len(self._delta_docs)
+        if doc_count == 0:
+            return {}
+        total_length = self._seg_total_length - self._deleted_length + self._delta_length
+        average_length = (total_length / doc_count) or 1.0
+
+        scores: Optional[Dict[str, float]] = None
+        for position, token in enumerate(tokens):
+            is_prefix = prefix and position == len(tokens) - 1
+            token_scores: Dict[str, float] = {}
+
+            for field in fields:
+                weight = self.field_weights.get(field, 1.0)
+                for term in self._expand(_term(field, token), is_prefix):
+                    postings = self._postings(term)
+                    df = len(postings)
+                    if df == 0:
+                        continue
+                    idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+                    for doc_id, tf in postings.items():
+                        doc_length = self._doc_length_meta(doc_id)[0]
+                        norm = tf + self.k1 * (1 - self.b + self.b * doc_length / average_length)
+                        token_scores[doc_id] = token_scores.get(doc_id, 0.0) + \
+                            weight * idf * tf * (self.k1 + 1) / norm
+
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {doc_id: score + token_scores[doc_id]
+                          for doc_id, score in scores.items() if doc_id in token_scores}
+            if not scores:
+                return {}
+
+        return scores or {}
@@ -0,0 +1,223 @@
+"""
+Background task queue.
+
+Tasks are plain functions registered under a name with @task_queue.task(name)
+and take JSON-serializable keyword arguments. With TASK_QUEUE_BACKEND=celery
+they are sent to Celery over Redis and executed by a worker started with
+
+    celery -A app.core.tasks.celery_app worker
+
+otherwise a small pool of daemon threads in the API process runs them. Either
+way enqueue() returns immediately, failing tasks are retried with
+exponential backoff, and queue depth and lag are tracked for the metrics
+endpoint.
+"""
+
+import abc
+import logging
+import queue
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Modules whose import registers tasks; the Celery worker loads them on start
+TASK_MODULES = [
+    'app.core.firebase_config', 'app.service.post', 'app.service.media', 'app.service.notification',
+    'app.service.connection'
+]
+
+
+class TaskQueue(abc.ABC):
+    """Common task registry, retry policy and metrics."""
+
+    backend = "base"
+
+    def __init__(self, max_retries: int = 5, retry_backoff: float = 2.0):
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._tasks: Dict[str, Callable[..., Any]] = {}
+
+    def task(self, name: str) -> Callable:
+        """Register a function as a task under a name."""
+        def decorator(func: Callable) -> Callable:
+            self._tasks[name] = func
+            self._registered(name, func)
+            return func
+        return decorator
+
+    def _registered(self, name: str, func: Callable) -> None:
+        pass
+
+    def retry_delay(self, attempt: int) -> float:
+        return self.retry_backoff * (2 ** attempt)
+
+    @abc.abstractmethod
+    def enqueue(self, name: str, **kwargs) -> str:
+        """Schedule a registered task and return its ID without waiting for it."""
+
+    @abc.abstractmethod
+    def metrics(self) -> Dict[str, Any]:
+        """Queue depth, lag and outcome counts for the metrics endpoint."""
+
+
+class InProcessTaskQueue(TaskQueue):
+    """Run tasks on daemon threads inside the current process."""
+
+    backend = "inprocess"
+
+    def __init__(self, workers: int = 2, **kwargs):
+        super().__init__(**kwargs)
+        self.workers = workers
+        self._queue: "queue.Queue" = queue.Queue()
+        self._pending: Dict[str, float] = {}
+        self._stats = {"processed": 0, "failed": 0, "retried": 0}
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _ensure_workers(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"task-worker-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def enqueue(self, name: str, **kwargs) -> str:
+        if name not in self._tasks:
+            raise KeyError(f"Unknown task: {name}")
+
+        task_id = str(uuid.uuid4())
+        with self._lock:
+            self._pending[task_id] = time.time()
+        self._ensure_workers()
+        self._queue.put((task_id, name, kwargs, 0))
+        return task_id
+
+    def _work(self) -> None:
+        while True:
+            task_id, name, kwargs, attempt = self._queue.get()
+            try:
+                self._tasks[name](**kwargs)
+            except Exception as e:
+                if attempt < self.max_retries:
+                    delay = self.retry_delay(attempt)
+                    logger.warning(f"Task {name} ({task_id}) failed, retrying in {delay:.1f}s: {str(e)}")
+                    with self._lock:
+                        self._stats["retried"] += 1
+                    timer = threading.Timer(delay, self._queue.put, args=((task_id, name, kwargs, attempt + 1),))
+                    timer.daemon = True
+                    timer.start()
+                else:
+                    logger.error(f"Task {name} ({task_id}) failed after {attempt + 1} attempts: {str(e)}")
+                    self._finish(task_id, "failed")
+            else:
+                self._finish(task_id, "processed")
+            finally:
+                self._queue.task_done()
+
+    def _finish(self, task_id: str, outcome: str) -> None:
+        with self._lock:
+            self._pending.pop(task_id, None)
+            self._stats[outcome] += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            oldest = min(self._pending.values(), default=None)
+            return {
+                "backend": self.backend,
+                "depth": len(self._pending),
+                "lag_seconds": round(time.time() - oldest, 3) if oldest is not None else 0.0,
+                **self._stats
+            }
+
+
+class CeleryTaskQueue(TaskQueue):
+    """Send tasks to Celery workers over Redis.
+
+    Pending task IDs are kept in a Redis sorted set scored by enqueue time so
+    that any API process can report depth and lag.
+    """
+
+    backend = "celery"
+    PENDING_KEY = "linkedout:tasks:pending"
+    STATS_KEY = "linkedout:tasks:stats"
+
+    def __init__(self, broker_url: str, **kwargs):
+        super().__init__(**kwargs)
+        from celery import Celery
+        import redis
+
+        self.celery = Celery('linkedout', broker=broker_url, include=TASK_MODULES)
+        self.celery.conf.update(task_acks_late=True, task_reject_on_worker_lost=True)
+        self._redis = redis.Redis.from_url(broker_url)
+        self._celery_tasks = {}
+
+    def _registered(self, name: str, func: Callable) -> None:
+        task_queue = self
+
+        @self.celery.task(name=name, bind=True, max_retries=self.max_retries)
+        def run(celery_task, task_id: str, kwargs: Dict[str, Any]):
+            try:
+                func(**kwargs)
+            except Exception as e:
+                if celery_task.request.retries < task_queue.max_retries:
+                    task_queue._redis.hincrby(task_queue.STATS_KEY, "retried", 1)
+                    raise celery_task.retry(exc=e, countdown=task_queue.retry_delay(celery_task.request.retries))
+                logger.error(f"Task {name} ({task_id}) failed: {str(e)}")
+                task_queue._finish(task_id, "failed")
+                raise
+            task_queue._finish(task_id, "processed")
+
+        self._celery_tasks[name] = run
+
+    def enqueue(self, name: str, **kwargs) -> str:
+        task_id = str(uuid.uuid4())
+        self._redis.zadd(self.PENDING_KEY, {task_id: time.time()})
+        self._celery_tasks[name].apply_async(kwargs={"task_id": task_id, "kwargs": kwargs}, task_id=task_id)
+        return task_id
+
+    def _finish(self, task_id: str, outcome: str) -> None:
+        pipeline = self._redis.pipeline()
+        pipeline.zrem(self.PENDING_KEY, task_id)
+        pipeline.hincrby(self.STATS_KEY, outcome, 1)
+        pipeline.execute()
+
+    def metrics(self) -> Dict[str, Any]:
+        depth = self._redis.zcard(self.PENDING_KEY)
+        oldest = self._redis.zrange(self.PENDING_KEY, 0, 0, withscores=True)
+        stats = {key.decode(): int(value) for key, value in self._redis.hgetall(self.STATS_KEY).items()}
+        return {
+            "backend": self.backend,
+            "depth": depth,
+            "lag_seconds": round(time.time() - oldest[0][1], 3) if oldest else 0.0,
+            "processed": stats.get("processed", 0),
+            "failed": stats.get("failed", 0),
+            "retried": stats.get("retried", 0)
+        }
+
+
+def _create_task_queue() -> TaskQueue:
+    options = {
+        "max_retries": settings.TASK_MAX_RETRIES,
+        "retry_backoff": settings.TASK_RETRY_BACKOFF_SECONDS
+    }
+
+    if settings.TASK_QUEUE_BACKEND == "celery":
+        try:
+            return CeleryTaskQueue(settings.REDIS_URL, **options)
+        except ImportError as e:
+            logger.warning(f"Celery backend unavailable, running tasks in-process: {str(e)}")
+
+    return InProcessTaskQueue(workers=settings.TASK_QUEUE_WORKERS, **options)
+
+
+task_queue = _create_task_queue()
+
+# Entry point for `celery -A app.core.tasks.celery_app worker`
+celery_app: Optional[Any] = getattr(task_queue, "celery", None)
@@ -0,0 +1,170 @@
+"""
+Local verification of Firebase ID tokens.
+
+Google's signing certificates are fetched once and kept, already parsed, for
+as long as their Cache-Control max-age allows. Signatures are checked locally
+and the decoded claims of recently verified tokens are remembered, keyed by
+a hash of the token, until the token expires. The key source is injectable so
+verification can run against fixed keys without network access.
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+import urllib.request
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from cryptography import x509
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+
+from app.core.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_CERTS_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+ISSUER_PREFIX = "https://securetoken.google.com/"
+
+# Never refetch keys for an unknown kid more often than this
+MIN_REFRESH_INTERVAL = 30.0
+# Fallback key lifetime when the response has no usable max-age
+DEFAULT_KEY_MAX_AGE = 3600.0
+
+_MAX_AGE_PATTERN = re.compile(r"max-age=(\d+)")
+
+
+class TokenVerificationError(ValueError):
+    """Raised when an ID token is malformed, badly signed or has invalid claims."""
+
+
+class GoogleCertificateSource:
+    """Fetch the securetoken X.509 certificates and their cache lifetime."""
+
+    def __init__(self, url: str = GOOGLE_CERTS_URL, timeout: float = 10.0):
+        self.url = url
+        self.timeout = timeout
+
+    def __call__(self) -> Tuple[Dict[str, str], float]:
+        with urllib.request.urlopen(self.url, timeout=self.timeout) as response:
+            certificates = json.loads(response.read().decode())
+            match = _MAX_AGE_PATTERN.search(response.headers.get("Cache-Control", ""))
+
+        max_age = float(match.group(1)) if match else DEFAULT_KEY_MAX_AGE
+        return certificates, max_age
+
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+class FirebaseTokenVerifier:
+    """Verify Firebase ID tokens against cached Google public keys."""
+
+    def __init__(
+            self,
+            project_id: str,
+            key_source: Optional[Callable[[], Tuple[Dict[str, str], float]]] = None,
+            cache_size: int = 1024,
+            clock_skew: float = 60.0,
+            clock: Callable[[], float] = time.time
+    ):
+        self.project_id = project_id
+        self.issuer = ISSUER_PREFIX + project_id
+        self.clock_skew = clock_skew
+        self._key_source = key_source or GoogleCertificateSource()
+        self._clock = clock
+        self._keys: Dict[str, Any] = {}
+        self._keys_expire_at = 0.0
+        self._keys_fetched_at = float("-inf")
+        self._keys_lock = threading.Lock()
+        self._verified = TTLCache(ttl=0, max_size=cache_size, clock=clock)
+
+    def _refresh_keys(self, now: float) -> None:
+        certificates, max_age = self._key_source()
+        self._keys = {
+            kid: x509.load_pem_x509_certificate(pem.encode()).public_key()
+            for kid, pem in certificates.items()
+        }
+        self._keys_fetched_at = now
+        self._keys_expire_at = now + max_age
+        logger.info(f"Loaded {len(self._keys)} Firebase signing keys (max-age {max_age:.0f}s)")
+
+    def _get_key(self, kid: str):
+        with self._keys_lock:
+            now = self._clock()
+            expired = now >= self._keys_expire_at
+            unknown = kid not in self._keys and now - self._keys_fetched_at >= MIN_REFRESH_INTERVAL
+            if expired or unknown:
+                self._refresh_keys(now)
+            return self._keys.get(kid)
+
+    def verify(self, token: str) -> Dict[str, Any]:
+        """Verify an ID token and return its claims, with the user ID under 'uid'."""
+        if not isinstance(token, str) or not token:
+            raise TokenVerificationError("ID token must be a non-empty string")
+
+        token_hash = hashlib.sha256(token.encode()).digest()
+        claims = self._verified.get(token_hash)
+        if claims is not None:
+            return dict(claims)
+
+        claims = self._verify_uncached(token)
+
+        # Remember the claims until the token expires
+        self._verified.set(token_hash, claims, ttl=claims["exp"] - self._clock())
+        return dict(claims)
+
+    def _verify_uncached(self, token: str) -> Dict[str, Any]:
+        try:
+            header_segment, payload_segment, signature_segment = token.split(".")
+            header = json.loads(_b64decode(header_segment))
+            claims = json.loads(_b64decode(payload_segment))
+            signature = _b64decode(signature_segment)
+        except ValueError as e:
+            raise TokenVerificationError(f"Malformed ID token: {str(e)}")
+
+        if header.get("alg") != "RS256":
+            raise TokenVerificationError(f"Unexpected signing algorithm: {header.get('alg')}")
+
+        key = self._get_key(header.get("kid", ""))
+        if key is None:
+            raise TokenVerificationError("ID token signed with an unknown key")
+
+        signing_input = f"{header_segment}.{payload_segment}".encode()
+        try:
+            key.verify(signature, signing_input, padding.PKCS1v15(), hashes.SHA256())
+        except InvalidSignature:
+            raise TokenVerificationError("Invalid ID token signature")
+
+        self._check_claims(claims)
+        claims["uid"] = claims["sub"]
+        return claims
+
+    def _check_claims(self, claims: Dict[str, Any]) -> None:
+        now = self._clock()
+
+        if claims.get("aud") != self.project_id:
+            raise TokenVerificationError("ID token has an incorrect audience")
+        if claims.get("iss") != self.issuer:
+            raise TokenVerificationError("ID token has an incorrect issuer")
+
+        subject = claims.get("sub")
+        if not isinstance(subject, str) or not subject or len(subject) > 128:
+            raise TokenVerificationError("ID token has an invalid subject")
+
+        for claim in ("exp", "iat"):
+            if not isinstance(claims.get(claim), (int, float)):
+                raise TokenVerificationError(f"ID token has no valid '{claim}' claim")
+        if claims["exp"] <= now - self.clock_skew:
+            raise TokenVerificationError("ID token has expired")
+        if claims["iat"] > now + self.clock_skew:
+            raise TokenVerificationError("ID token was issued in the future")
+
+        auth_time = claims.get("auth_time")
+        if auth_time is not None and auth_time > now + self.clock_skew:
+            raise TokenVerificationError("ID token has an authentication time in the future")
@@ -1,6 +1,13 @@
-from firebase_admin import firestore
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from firebase_admin import firestore, firestore_async
+from google.api_core.exceptions import Aborted, FailedPrecondition, NotFound, ResourceExhausted
 import logging
+import threading
+import time
 from app.config import settings
+from app.core.cache import TTLCache
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -9,11 +16,312 @@ logger = logging.getLogger(__name__)
 try:
     # Initialize Firestore
     db = firestore.client()
+    # Async endpoints await this client instead of holding a worker thread for their I/O
+    async_db = firestore_async.client()
     logger.info("Firebase Firestore connection established successfully")
 except Exception as e:
     logger.error(f"Failed to connect to Firestore: {str(e)}")
     raise
 
+# Firestore rejects batches with more than 500 writes
+MAX_BATCH_SIZE = 500
+
+# Commit errors after which Firestore has applied nothing, so the batch can
+# be resent without applying increments twice
+RETRYABLE_COMMIT_ERRORS = (Aborted, ResourceExhausted)
+
+# Aggregation counts keyed by (collection, equality filters)
+count_cache = TTLCache(settings.COUNT_CACHE_TTL_SECONDS)
+
+
 def get_db():
     """Get Firestore database instance."""
-    return db
\ No newline at end of file
+    return db
+
+
+async def get_async_db():
+    """Get the asyncio Firestore database instance.
+
+    A coroutine so FastAPI resolves it on the event loop; plain functions
+    used as dependencies are run on the threadpool.
+    """
+    return async_db
+
+
+def get_many(client: firestore.Client, collection: str, ids: List[str],
+             field_paths: Optional[List[str]] = None) -> Tuple[list, List[str]]:
+    """Fetch documents by ID in a single round trip.
+
+    Returns the snapshots of the documents that exist, in the order of ids
+    (duplicates collapsed), and the ids that were not found.
+    """
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        return [], []
+
+    collection_ref = client.collection(collection)
+    refs = [collection_ref.document(doc_id) for doc_id in ids]
+    return _found_and_missing(ids, client.get_all(refs, field_paths=field_paths))
+
+
+async def get_many_async(client: firestore_async.AsyncClient, collection: str, ids: List[str],
+                         field_paths: Optional[List[str]] = None) -> Tuple[list, List[str]]:
+    """get_many for the async client."""
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        return [], []
+
+    collection_ref = client.collection(collection)
+    refs = [collection_ref.document(doc_id) for doc_id in ids]
+    return _found_and_missing(ids, [doc async for doc in client.get_all(refs, field_paths=field_paths)])
+
+
+def _found_and_missing(ids: List[str], docs) -> Tuple[list, List[str]]:
+    docs_by_id = {doc.id: doc for doc in docs if doc.exists}
+    found = [docs_by_id[doc_id] for doc_id in ids if doc_id in docs_by_id]
+    missing = [doc_id for doc_id in ids if doc_id not in docs_by_id]
+    return found, missing
+
+
+def count_query(query) -> int:
+    """Count the documents matching a query with a server-side aggregation."""
+    return query.count().get()[0][0].value
+
+
+async def count_query_async(query) -> int:
+    """Count the documents matching an async query with a server-side aggregation."""
+    return (await query.count().get())[0][0].value
+
+
+def _count_key(collection: str, filters: Dict[str, Any]) -> tuple:
+    return collection, tuple(sorted(filters.items()))
+
+
+def _filtered_query(client, collection: str, filters: Dict[str, Any]):
+    query = client.collection(collection)
+    for field, value in filters.items():
+        query = query.where(field, '==', value)
+    return query
+
+
+def count_documents(client: firestore.Client, collection: str, filters: Optional[Dict[str, Any]] = None) -> int:
+    """Count the documents in a collection matching equality filters.
+
+    Only the aggregate crosses the wire. Results are cached for
+    COUNT_CACHE_TTL_SECONDS and dropped early by invalidate_counts.
+    """
+    filters = filters or {}
+    key = _count_key(collection, filters)
+    count = count_cache.get(key)
+    if count is not None:
+        return count
+
+    count = count_query(_filtered_query(client, collection, filters))
+    count_cache.set(key, count)
+    return count
+
+
+async def count_documents_async(client: firestore_async.AsyncClient, collection: str,
+                                filters: Optional[Dict[str, Any]] = None) -> int:
+    """count_documents for the async client, sharing the same cache."""
+    filters = filters or {}
+    key = _count_key(collection, filters)
+    count = count_cache.get(key)
+    if count is not None:
+        return count
+
+    count = await count_query_async(_filtered_query(client, collection, filters))
+    count_cache.set(key, count)
+    return count
+
+
+def invalidate_counts(collection: str, *documents: Dict[str, Any]) -> None:
+    """Drop cached counts of a collection whose filters match any of the given documents.
+
+    Pass the written document's data on create and delete, and both the old
+    and the new data when an update changes a filtered field.
+    """
+    def matches(key) -> bool:
+        key_collection, filters = key
+        if key_collection != collection:
+            return False
+        return any(all(document.get(field) == value for field, value in filters) for document in documents)
+
+    count_cache.invalidate(matches)
+
+
+def resolve_server_timestamps(data: Dict[str, Any], write_time) -> Dict[str, Any]:
+    """Replace SERVER_TIMESTAMP sentinels in written data with the commit time of the write."""
+    return {field: write_time if value is firestore.SERVER_TIMESTAMP else value for field, value in data.items()}
+
+
+def add_document(collection_ref, data: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """Create a document under a generated ID and return the ID and the stored data, without reading it back."""
+    write_time, doc_ref = collection_ref.add(data)
+    return doc_ref.id, resolve_server_timestamps(data, write_time)
+
+
+def update_document(client: firestore.Client, doc_ref, data: Dict[str, Any],
+                    snapshot=None) -> Optional[Dict[str, Any]]:
+    """Apply a partial update and return the whole stored document, without reading it back.
+
+    Pass the snapshot the caller already read, e.g. for an ownership check;
+    otherwise it is read here. The update is conditional on that snapshot
+    still being current, so merging it with the update locally gives exactly
+    what was stored. If another write got in between, the update is applied
+    unconditionally and the result read back. Returns None when the document
+    does not exist. Update keys must be top-level fields.
+    """
+    if snapshot is None:
+        snapshot = doc_ref.get()
+    if not snapshot.exists:
+        return None
+
+    try:
+        result = doc_ref.update(data, option=client.write_option(last_update_time=snapshot.update_time))
+    except FailedPrecondition:
+        try:
+            doc_ref.update(data)
+        except NotFound:
+            return None
+        return doc_ref.get().to_dict()
+    return {**snapshot.to_dict(), **resolve_server_timestamps(data, result.update_time)}
+
+
+class BatchedWrites:
+    """Accumulate writes and commit them in batches Firestore accepts."""
+
+    def __init__(self, client: firestore.Client, batch_size: int = MAX_BATCH_SIZE):
+        self._client = client
+        self._batch_size = min(batch_size, MAX_BATCH_SIZE)
+        self._batch = client.batch()
+        self._pending = 0
+        self.committed = 0
+
+    def set(self, doc_ref, data: dict, merge: bool = False) -> None:
+        self._batch.set(doc_ref, data, merge=merge)
+        self._added()
+
+    def update(self, doc_ref, data: dict) -> None:
+        self._batch.update(doc_ref, data)
+        self._added()
+
+    def delete(self, doc_ref) -> None:
+        self._batch.delete(doc_ref)
+        self._added()
+
+    def _added(self) -> None:
+        self._pending += 1
+        if self._pending >= self._batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._pending == 0:
+            return
+        self._batch.commit()
+        self.committed += self._pending
+        self._batch = self._client.batch()
+        self._pending = 0
+
+
+def iter_documents(query, page_size: int = MAX_BATCH_SIZE) -> Iterator:
+    """Yield every document a query matches, fetching one page at a time.
+
+    Pages are read in document ID order from a cursor, so memory use is
+    bounded by the page size and writes to documents already yielded do not
+    shift later pages.
+    """
+    query = query.order_by(firestore.FieldPath.document_id()).limit(page_size)
+    last_doc = None
+    while True:
+        page = (query.start_after(last_doc) if last_doc is not None else query).get()
+        yield from page
+        if len(page) < page_size:
+            return
+        last_doc = page[-1]
+
+
+def iter_modified_documents(collection_ref, since: datetime) -> Iterator:
+    """Yield every document of a collection created or updated at or after since, each once."""
+    seen = set()
+    # Documents only get an updated_at once they are edited, so both fields are queried
+    for field in ('created_at', 'updated_at'):
+        for doc in collection_ref.where(field, '>=', since).stream():
+            if doc.id not in seen:
+                seen.add(doc.id)
+                yield doc
+
+
+class BulkWriter(BatchedWrites):
+    """BatchedWrites that keeps several batches in flight and retries contention.
+
+    Full batches are committed on a small thread pool. Once max_in_flight
+    commits are outstanding, the producer waits, so a caller streaming a
+    large query runs at the commit rate with bounded memory.
+
+    before_commit(batch) runs as each batch is sealed and may add writes that
+    must commit with it. It can return a function to call once that batch has
+    committed. on_progress(committed) runs after every commit, on a pool thread.
+    """
+
+    def __init__(self, client: firestore.Client, batch_size: int = MAX_BATCH_SIZE,
+                 max_in_flight: int = settings.BULK_WRITER_MAX_IN_FLIGHT,
+                 max_retries: int = settings.BULK_WRITER_MAX_RETRIES,
+                 retry_backoff: float = settings.BULK_WRITER_RETRY_BACKOFF_SECONDS,
+                 before_commit: Optional[Callable] = None,
+                 on_progress: Optional[Callable[[int], None]] = None):
+        super().__init__(client, batch_size)
+        self._max_in_flight = max_in_flight
+        self._max_retries = max_retries
+        self._retry_backoff = retry_backoff
+        self._before_commit = before_commit
+        self._on_progress = on_progress
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="bulk-writer")
+        self._in_flight = set()
+        self._lock = threading.Lock()
+
+    def flush(self) -> None:
+        if self._pending == 0:
+            return
+        committed_callback = self._before_commit(self._batch) if self._before_commit else None
+        batch, count = self._batch, self._pending
+        self._batch = self._client.batch()
+        self._pending = 0
+
+        # Wait for a free slot; a batch that failed for good raises here
+        while len(self._in_flight) >= self._max_in_flight:
+            done, self._in_flight = wait(self._in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                future.result()
+        self._in_flight.add(self._executor.submit(self._commit, batch, count, committed_callback))
+
+    def _commit(self, batch, count: int, committed_callback: Optional[Callable]) -> None:
+        for attempt in range(self._max_retries + 1):
+            try:
+                batch.commit()
+                break
+            except RETRYABLE_COMMIT_ERRORS as e:
+                if attempt == self._max_retries:
+                    raise
+                delay = self._retry_backoff * (2 ** attempt)
+                logger.warning(f"Batch of {count} writes failed ({str(e)}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+        if committed_callback:
+            committed_callback()
+        # Report under the lock so progress never goes backwards
+        with self._lock:
+            self.committed += count
+            if self._on_progress:
+                self._on_progress(self.committed)
+
+    def close(self) -> int:
+        """Commit what is pending, wait for every batch and return the number of writes committed."""
+        try:
+            self.flush()
+            for future in wait(self._in_flight).done:
+                future.result()
+            self._in_flight = set()
+        finally:
+            self._executor.shutdown(wait=True)
+        return self.committed
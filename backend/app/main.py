@@ -1,13 +1,20 @@
 from fastapi import FastAPI, APIRouter
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+import asyncio
 import os
+import socketio
 import uvicorn
 import logging
 from firebase_admin import firestore
 
 from app.config import settings
 from app.controller import api_router
+from app.controller.media import router as media_router
+from app.controller import realtime  # noqa: F401  (registers the socket.io event handlers)
+from app.core.realtime import publisher, sio
+from app.core.tasks import task_queue
+from app.utils.email import mail_queue
+from app.utils.security import hashing_pool
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -37,12 +44,20 @@ async def test_cors():
     logger.info("CORS test endpoint called")
     return {"message": "CORS is working!"}
 
-# Mount the static files
-app.mount("/media", StaticFiles(directory=settings.UPLOADS_DIR), name="media")
+# Serve uploaded media with long-lived caching, validators and byte ranges
+app.include_router(media_router, prefix="/media", tags=["media"])
 
 # Include API routers
 app.include_router(api_router, prefix="/api")
 
+# Real-time push; clients connect with path "/ws/socket.io"
+app.mount("/ws", socketio.ASGIApp(sio))
+
+@app.on_event("startup")
+async def bind_realtime_publisher():
+    # Services publish from worker threads; hand their events to this loop
+    publisher.bind_loop(asyncio.get_running_loop())
+
 # Root endpoint
 @app.get("/")
 def root():
@@ -61,6 +76,21 @@ def health_check():
     logger.info("Health check endpoint called")
     return {"status": "healthy"}
 
+# Background task queue metrics
+@app.get("/metrics/tasks")
+def task_metrics():
+    return task_queue.metrics()
+
+# Password hashing pool metrics
+@app.get("/metrics/hashing")
+def hashing_metrics():
+    return hashing_pool.metrics()
+
+# Outbound mail queue metrics
+@app.get("/metrics/mail")
+def mail_metrics():
+    return mail_queue.metrics()
+
 # Debug endpoint to see all routes
 @app.get("/debug/routes")
 def get_routes():
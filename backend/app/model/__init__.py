@@ -6,16 +6,16 @@ from app.database import Base
 from app.model.user import User
 
 # Profile models
-from app.model.profile import Profile, Experience, Education, Skill, Endorsement
+from app.model.profile import Profile, ProfileSummary, Experience, Education, Skill, Endorsement
 
 # Connection models
 from app.model.connection import Connection, Follow
 
 # Content models
-from app.model.post import Post, Comment, Like, CommentLike
+from app.model.post import Post, PostSummary, Comment, Like, CommentLike
 
 # Notification model
 from app.model.notification import Notification
 
 # Job models
-from app.model.job import Job, JobApplication, SavedJob
\ No newline at end of file
+from app.model.job import Job, JobSummary, JobApplication, SavedJob
\ No newline at end of file
@@ -3,6 +3,11 @@ from typing import Optional, Dict, Any
 
 class Job:
     """Job model for Firestore."""
+    FIELDS = [
+        "title", "company_name", "location", "job_type", "description", "requirements", "salary_min",
+        "salary_max", "currency", "is_remote", "poster_id", "is_active", "created_at", "updated_at"
+    ]
+
     def __init__(
         self,
         title: str,
@@ -75,6 +80,58 @@ class Job:
             job_id=job_id
         )
 
+class JobSummary:
+    """The fields of a job that list views render, without the long description and requirements."""
+    FIELDS = [
+        "title", "company_name", "location", "job_type", "salary_min", "salary_max", "currency",
+        "is_remote", "poster_id", "is_active", "created_at"
+    ]
+
+    def __init__(
+        self,
+        title: str,
+        company_name: str,
+        location: str,
+        job_type: str,
+        salary_min: Optional[float] = None,
+        salary_max: Optional[float] = None,
+        currency: Optional[str] = None,
+        is_remote: bool = False,
+        poster_id: Optional[str] = None,
+        is_active: bool = True,
+        created_at: Optional[datetime] = None,
+        job_id: Optional[str] = None
+    ):
+        self.job_id = job_id
+        self.title = title
+        self.company_name = company_name
+        self.location = location
+        self.job_type = job_type
+        self.salary_min = salary_min
+        self.salary_max = salary_max
+        self.currency = currency
+        self.is_remote = is_remote
+        self.poster_id = poster_id
+        self.is_active = is_active
+        self.created_at = created_at
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], job_id: Optional[str] = None) -> 'JobSummary':
+        return cls(
+            title=data["title"],
+            company_name=data["company_name"],
+            location=data["location"],
+            job_type=data["job_type"],
+            salary_min=data.get("salary_min"),
+            salary_max=data.get("salary_max"),
+            currency=data.get("currency"),
+            is_remote=data.get("is_remote", False),
+            poster_id=data.get("poster_id"),
+            is_active=data.get("is_active", True),
+            created_at=data.get("created_at"),
+            job_id=job_id
+        )
+
 class SavedJob:
     """SavedJob model for Firestore."""
     def __init__(
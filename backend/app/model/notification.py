@@ -1,8 +1,13 @@
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 
 class Notification:
     """Notification model for Firestore."""
+    FIELDS = [
+        "user_id", "type", "message", "is_read", "source_id", "source_type", "created_by", "created_at",
+        "actors", "actor_count"
+    ]
+
     def __init__(
         self,
         user_id: str,
@@ -13,7 +18,9 @@ class Notification:
         source_type: Optional[str] = None,
         created_by: Optional[str] = None,
         created_at: Optional[datetime] = None,
-        notification_id: Optional[str] = None
+        notification_id: Optional[str] = None,
+        actors: Optional[List[Dict[str, str]]] = None,
+        actor_count: int = 1
     ):
         self.notification_id = notification_id
         self.user_id = user_id
@@ -24,6 +31,9 @@ class Notification:
         self.source_type = source_type
         self.created_by = created_by
         self.created_at = created_at or datetime.utcnow()
+        # Coalesced notifications keep a sample of the latest actors ({"id", "name"}) and a total
+        self.actors = actors or []
+        self.actor_count = actor_count
 
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -34,7 +44,9 @@ class Notification:
             "source_id": self.source_id,
             "source_type": self.source_type,
             "created_by": self.created_by,
-            "created_at": self.created_at
+            "created_at": self.created_at,
+            "actors": self.actors,
+            "actor_count": self.actor_count
         }
 
     @classmethod
@@ -48,5 +60,7 @@ class Notification:
             source_type=data.get("source_type"),
             created_by=data.get("created_by"),
             created_at=data.get("created_at"),
-            notification_id=notification_id
+            notification_id=notification_id,
+            actors=data.get("actors"),
+            actor_count=data.get("actor_count", 1)
         )
\ No newline at end of file
@@ -3,11 +3,19 @@ from typing import Optional, Dict, Any
 
 class Post:
     """Post model for Firestore."""
+    FIELDS = [
+        "author_id", "content", "image_url", "image_variants", "likes_count", "comments_count",
+        "created_at", "updated_at"
+    ]
+
     def __init__(
         self,
         author_id: str,
         content: str,
         image_url: Optional[str] = None,
+        image_variants: Optional[Dict[str, Dict[str, Any]]] = None,
+        likes_count: int = 0,
+        comments_count: int = 0,
         created_at: Optional[datetime] = None,
         updated_at: Optional[datetime] = None,
         post_id: Optional[str] = None
@@ -16,6 +24,11 @@ class Post:
         self.author_id = author_id
         self.content = content
         self.image_url = image_url
+        # Resized copies of image_url, filled in once generated
+        self.image_variants = image_variants
+        # Denormalized engagement counters, maintained transactionally
+        self.likes_count = likes_count
+        self.comments_count = comments_count
         self.created_at = created_at or datetime.utcnow()
         self.updated_at = updated_at
 
@@ -24,6 +37,9 @@ class Post:
             "author_id": self.author_id,
             "content": self.content,
             "image_url": self.image_url,
+            "image_variants": self.image_variants,
+            "likes_count": self.likes_count,
+            "comments_count": self.comments_count,
             "created_at": self.created_at,
             "updated_at": self.updated_at
         }
@@ -34,11 +50,48 @@ class Post:
             author_id=data["author_id"],
             content=data["content"],
             image_url=data.get("image_url"),
+            image_variants=data.get("image_variants"),
+            likes_count=data.get("likes_count", 0),
+            comments_count=data.get("comments_count", 0),
             created_at=data.get("created_at"),
             updated_at=data.get("updated_at"),
             post_id=post_id
         )
 
+class PostSummary:
+    """The fields of a post that feeds render, without the image variant metadata."""
+    FIELDS = ["author_id", "content", "image_url", "likes_count", "comments_count", "created_at"]
+
+    def __init__(
+        self,
+        author_id: str,
+        content: str,
+        image_url: Optional[str] = None,
+        likes_count: int = 0,
+        comments_count: int = 0,
+        created_at: Optional[datetime] = None,
+        post_id: Optional[str] = None
+    ):
+        self.post_id = post_id
+        self.author_id = author_id
+        self.content = content
+        self.image_url = image_url
+        self.likes_count = likes_count
+        self.comments_count = comments_count
+        self.created_at = created_at
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], post_id: Optional[str] = None) -> 'PostSummary':
+        return cls(
+            author_id=data["author_id"],
+            content=data["content"],
+            image_url=data.get("image_url"),
+            likes_count=data.get("likes_count", 0),
+            comments_count=data.get("comments_count", 0),
+            created_at=data.get("created_at"),
+            post_id=post_id
+        )
+
 class Comment:
     """Comment model for Firestore."""
     def __init__(
@@ -3,6 +3,11 @@ from typing import Optional, Dict, Any
 
 class Profile:
     """Profile model for Firestore."""
+    FIELDS = [
+        "user_id", "headline", "about", "location", "profile_image", "cover_image", "profile_image_variants",
+        "cover_image_variants", "phone_number", "website", "created_at", "updated_at"
+    ]
+
     def __init__(
         self,
         user_id: str,
@@ -11,6 +16,8 @@ class Profile:
         location: Optional[str] = None,
         profile_image: Optional[str] = None,
         cover_image: Optional[str] = None,
+        profile_image_variants: Optional[Dict[str, Dict[str, Any]]] = None,
+        cover_image_variants: Optional[Dict[str, Dict[str, Any]]] = None,
         phone_number: Optional[str] = None,
         website: Optional[str] = None,
         created_at: Optional[datetime] = None,
@@ -24,6 +31,8 @@ class Profile:
         self.location = location
         self.profile_image = profile_image
         self.cover_image = cover_image
+        self.profile_image_variants = profile_image_variants
+        self.cover_image_variants = cover_image_variants
         self.phone_number = phone_number
         self.website = website
         self.created_at = created_at or datetime.utcnow()
@@ -37,6 +46,8 @@ class Profile:
             "location": self.location,
             "profile_image": self.profile_image,
             "cover_image": self.cover_image,
+            "profile_image_variants": self.profile_image_variants,
+            "cover_image_variants": self.cover_image_variants,
             "phone_number": self.phone_number,
             "website": self.website,
             "created_at": self.created_at,
@@ -52,6 +63,8 @@ class Profile:
             location=data.get("location"),
             profile_image=data.get("profile_image"),
             cover_image=data.get("cover_image"),
+            profile_image_variants=data.get("profile_image_variants"),
+            cover_image_variants=data.get("cover_image_variants"),
             phone_number=data.get("phone_number"),
             website=data.get("website"),
             created_at=data.get("created_at"),
@@ -59,6 +72,37 @@ class Profile:
             profile_id=profile_id
         )
 
+class ProfileSummary:
+    """The fields of a profile that search results render, without the about text and contact details."""
+    FIELDS = ["user_id", "headline", "location", "profile_image", "created_at"]
+
+    def __init__(
+        self,
+        user_id: str,
+        headline: Optional[str] = None,
+        location: Optional[str] = None,
+        profile_image: Optional[str] = None,
+        created_at: Optional[datetime] = None,
+        profile_id: Optional[str] = None
+    ):
+        self.profile_id = profile_id
+        self.user_id = user_id
+        self.headline = headline
+        self.location = location
+        self.profile_image = profile_image
+        self.created_at = created_at
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], profile_id: Optional[str] = None) -> 'ProfileSummary':
+        return cls(
+            user_id=data["user_id"],
+            headline=data.get("headline"),
+            location=data.get("location"),
+            profile_image=data.get("profile_image"),
+            created_at=data.get("created_at"),
+            profile_id=profile_id
+        )
+
 class Education:
     """Education model for Firestore."""
     def __init__(
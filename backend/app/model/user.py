@@ -14,8 +14,11 @@ class User:
         is_verified: bool = False,
         role: str = "user",
         created_at: Optional[datetime] = None,
-        updated_at: Optional[datetime] = None
+        updated_at: Optional[datetime] = None,
+        token_version: int = 0,
+        id: Optional[str] = None
     ):
+        self.id = id
         self.email = email
         self.first_name = first_name
         self.last_name = last_name
@@ -25,6 +28,7 @@ class User:
         self.role = role
         self.created_at = created_at or datetime.utcnow()
         self.updated_at = updated_at
+        self.token_version = token_version
 
     def to_dict(self) -> Dict[str, Any]:
         """Convert user object to dictionary for Firestore."""
@@ -37,11 +41,12 @@ class User:
             "is_verified": self.is_verified,
             "role": self.role,
             "created_at": self.created_at,
-            "updated_at": self.updated_at
+            "updated_at": self.updated_at,
+            "token_version": self.token_version
         }
 
     @classmethod
-    def from_dict(cls, data: Dict[str, Any]) -> 'User':
+    def from_dict(cls, data: Dict[str, Any], user_id: Optional[str] = None) -> 'User':
         """Create user object from Firestore dictionary."""
         return cls(
             email=data["email"],
@@ -52,5 +57,7 @@ class User:
             is_verified=data.get("is_verified", False),
             role=data.get("role", "user"),
             created_at=data.get("created_at"),
-            updated_at=data.get("updated_at")
+            updated_at=data.get("updated_at"),
+            token_version=data.get("token_version", 0),
+            id=user_id
         )
\ No newline at end of file
@@ -5,7 +5,7 @@ from datetime import datetime
 from app.schema.user import UserResponse
 
 class ConnectionBase(BaseModel):
-    receiver_id: int
+    receiver_id: str
 
 class ConnectionCreate(ConnectionBase):
     pass
@@ -14,9 +14,9 @@ class ConnectionUpdate(BaseModel):
     status: str
 
 class ConnectionInDB(BaseModel):
-    id: int
-    sender_id: int
-    receiver_id: int
+    connection_id: str
+    sender_id: str
+    receiver_id: str
     status: str
     created_at: datetime
     updated_at: Optional[datetime] = None
@@ -5,12 +5,12 @@ from datetime import datetime
 from app.schema.user import UserResponse
 
 class NotificationBase(BaseModel):
-    user_id: int
+    user_id: str
     type: str
     message: str
-    source_id: Optional[int] = None
+    source_id: Optional[str] = None
     source_type: Optional[str] = None
-    created_by: Optional[int] = None
+    created_by: Optional[str] = None
 
 class NotificationCreate(NotificationBase):
     pass
@@ -18,10 +18,16 @@ class NotificationCreate(NotificationBase):
 class NotificationUpdate(BaseModel):
     is_read: bool
 
+class NotificationActor(BaseModel):
+    id: str
+    name: str
+
 class NotificationInDB(NotificationBase):
-    id: int
+    notification_id: str
     is_read: bool
     created_at: datetime
+    actors: List[NotificationActor] = []
+    actor_count: int = 1
 
     class Config:
         orm_mode = True
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 from datetime import datetime
 
 from app.schema.user import UserResponse
@@ -17,7 +17,7 @@ class CommentBase(BaseModel):
     content: str
 
 class CommentCreate(CommentBase):
-    post_id: int
+    pass
 
 class CommentUpdate(BaseModel):
     content: Optional[str] = None
@@ -35,9 +35,9 @@ class CommentLikeCreate(CommentLikeBase):
     pass
 
 class LikeInDB(BaseModel):
-    id: int
-    post_id: int
-    user_id: int
+    like_id: str
+    post_id: str
+    user_id: str
     created_at: datetime
 
     class Config:
@@ -59,9 +59,9 @@ class CommentLikeWithUser(CommentLikeInDB):
     user: Optional[UserResponse] = None
 
 class CommentInDB(CommentBase):
-    id: int
-    post_id: int
-    author_id: int
+    comment_id: str
+    post_id: str
+    author_id: str
     created_at: datetime
     updated_at: Optional[datetime] = None
 
@@ -74,9 +74,12 @@ class CommentWithUser(CommentInDB):
     likes_count: Optional[int] = 0
 
 class PostInDB(PostBase):
-    id: int
-    author_id: int
+    post_id: str
+    author_id: str
     image_url: Optional[str] = None
+    image_variants: Optional[Dict[str, Dict[str, Any]]] = None
+    likes_count: int = 0
+    comments_count: int = 0
     created_at: datetime
     updated_at: Optional[datetime] = None
 
@@ -86,6 +89,4 @@ class PostInDB(PostBase):
 class PostWithUser(PostInDB):
     author: Optional[UserResponse] = None
     comments: List[CommentWithUser] = []
-    likes: List[LikeWithUser] = []
-    comments_count: Optional[int] = 0
-    likes_count: Optional[int] = 0
\ No newline at end of file
+    likes: List[LikeWithUser] = []
\ No newline at end of file
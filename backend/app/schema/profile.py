@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 from datetime import datetime, date
 
 class ProfileBase(BaseModel):
@@ -96,6 +96,8 @@ class ProfileInDB(ProfileBase):
     user_id: int
     profile_image: Optional[str] = None
     cover_image: Optional[str] = None
+    profile_image_variants: Optional[Dict[str, Dict[str, Any]]] = None
+    cover_image_variants: Optional[Dict[str, Dict[str, Any]]] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
     experiences: List[ExperienceInDB] = []
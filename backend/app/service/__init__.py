@@ -2,6 +2,7 @@ from app.service.auth import *
 from app.service.user import *
 from app.service.profile import *
 from app.service.connection import *
+from app.service.feed import *
 from app.service.post import *
 from app.service.notification import *
 from app.service.job import *
\ No newline at end of file
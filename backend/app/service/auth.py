@@ -3,14 +3,15 @@ from datetime import timedelta
 from fastapi import HTTPException, status
 import logging
 from firebase_admin import auth
-from firebase_admin import firestore
+from firebase_admin import firestore, firestore_async
 
 from app.model.user import User
 from app.schema.user import UserCreate, UserLogin, FirebaseLogin, PasswordReset, PasswordResetConfirm, VerifyEmail
-from app.utils.security import get_password_hash, verify_password, create_access_token, generate_verification_code
+from app.utils.security import get_password_hash_async, verify_password_async, create_access_token, generate_verification_code
 from app.utils.email import send_verification_email, send_password_reset_email
 from app.config import settings
 from app.core.firebase_config import verify_firebase_token
+from app.service.user import revoke_tokens_async
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -106,7 +107,7 @@ def login_with_firebase(db: firestore.Client, login_data: FirebaseLogin) -> Dict
         # Create access token
         access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(
-            data={"sub": firebase_uid}, expires_delta=access_token_expires
+            data={"sub": firebase_uid}, expires_delta=access_token_expires, user=user
         )
 
         logger.info(f"Firebase login successful for user: {email}")
@@ -125,11 +126,11 @@ def login_with_firebase(db: firestore.Client, login_data: FirebaseLogin) -> Dict
         )
 
 
-def login_user(db: firestore.Client, login_data: UserLogin) -> Dict[str, Any]:
+async def login_user_async(db: firestore_async.AsyncClient, login_data: UserLogin) -> Dict[str, Any]:
     """Authenticate a user and return an access token."""
     logger.info(f"Login attempt for email: {login_data.email}")
 
-    user_doc = db.collection('users').document(login_data.email).get()
+    user_doc = await db.collection('users').document(login_data.email).get()
     if not user_doc.exists:
         logger.warning(f"Login failed: User not found for email: {login_data.email}")
         raise HTTPException(
@@ -140,7 +141,7 @@ def login_user(db: firestore.Client, login_data: UserLogin) -> Dict[str, Any]:
 
     user = User.from_dict(user_doc.to_dict())
 
-    if not verify_password(login_data.password, user.hashed_password):
+    if not await verify_password_async(login_data.password, user.hashed_password):
         logger.warning(f"Login failed: Incorrect password for user: {login_data.email}")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -155,7 +156,7 @@ def login_user(db: firestore.Client, login_data: UserLogin) -> Dict[str, Any]:
     # Create access token
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": login_data.email}, expires_delta=access_token_expires
+        data={"sub": login_data.email}, expires_delta=access_token_expires, user=user
     )
 
     logger.info(f"Login successful for user: {login_data.email}")
@@ -193,21 +194,21 @@ def request_password_reset(db: firestore.Client, reset_data: PasswordReset) -> b
         raise HTTPException(status_code=500, detail="Failed to process password reset. Please try again.")
 
 
-def reset_password(db: firestore.Client, reset_data: PasswordResetConfirm) -> bool:
+async def reset_password_async(db: firestore_async.AsyncClient, reset_data: PasswordResetConfirm) -> bool:
     """Reset a user's password with the provided token."""
     logger.info(f"Attempting to reset password with token: {reset_data.token[:10]}...")
 
-    user_doc = db.collection('users').document(reset_data.email).get()
+    user_doc = await db.collection('users').document(reset_data.email).get()
     if not user_doc.exists:
         logger.warning(f"Password reset failed: Invalid reset token")
         raise HTTPException(status_code=400, detail="Invalid reset token")
 
+    # Hash outside the try so an overloaded hashing pool surfaces as a 503
+    hashed_password = await get_password_hash_async(reset_data.password)
+
     try:
-        # Update password
-        user = User.from_dict(user_doc.to_dict())
-        user.hashed_password = get_password_hash(reset_data.password)
-        user.verification_code = None
-        db.collection('users').document(reset_data.email).set(user.to_dict())
+        # Update password; tokens issued before the reset stop working
+        await revoke_tokens_async(db, reset_data.email, {'hashed_password': hashed_password, 'verification_code': None})
 
         logger.info(f"Password reset successfully for user: {reset_data.email}")
         return True
@@ -1,411 +1,443 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from fastapi import HTTPException
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func, and_, or_, not_
-from firebase_admin import firestore
-
+from firebase_admin import firestore, firestore_async
+from datetime import datetime
+import asyncio
+import logging
+import threading
+import time
+
+from app.config import settings
+from app.core.graph import ConnectionGraph
+from app.core.tasks import task_queue
 from app.model.connection import Connection, Follow
 from app.model.user import User
 from app.model.notification import Notification
+from app.database import get_db, count_documents, count_documents_async, invalidate_counts, get_many
 from app.schema.connection import ConnectionCreate, ConnectionUpdate, FollowCreate
+from app.service.feed import connect_timelines, disconnect_timelines
+from app.service.notification import notify_user
+from app.utils.helpers import paginate_query
+
+# Configure logging
+logger = logging.getLogger(__name__)
 
+_connection_graph: Optional[ConnectionGraph] = None
+_connection_graph_loaded_at = 0.0
+_connection_graph_lock = threading.Lock()
+# Connection writes seen while a refresh is loading, replayed onto the new graph before it is swapped in
+_connection_graph_pending: Optional[List[Tuple[str, str, str, bool]]] = None
 
-def get_connection(db: firestore.Client, user_id: str, connected_user_id: str) -> Optional[Connection]:
-    """Get connection between two users."""
+
+def get_connection(db: firestore.Client, connection_id: str) -> Optional[Connection]:
+    """Get a connection by ID."""
     connections_ref = db.collection('connections')
-    query = connections_ref.where('user_id', '==', user_id).where('connected_user_id', '==', connected_user_id)
-    docs = query.get()
+    doc = connections_ref.document(connection_id).get()
     
-    if not docs:
+    if not doc.exists:
         return None
     
-    return Connection.from_dict(docs[0].to_dict())
+    return Connection.from_dict(doc.to_dict(), doc.id)
 
 
-def get_connections(db: firestore.Client, user_id: str, skip: int = 0, limit: int = 100) -> List[Connection]:
+def get_connections(db: firestore.Client, user_id: str, skip: int = 0, limit: int = 100,
+                    cursor: Optional[str] = None) -> List[Connection]:
     """Get all connections for a user."""
     connections_ref = db.collection('connections')
     query = connections_ref.where('user_id', '==', user_id).order_by('created_at', direction=firestore.Query.DESCENDING)
     
     # Apply pagination
-    if skip > 0:
-        query = query.offset(skip)
-    if limit > 0:
-        query = query.limit(limit)
+    query = paginate_query(query, skip, limit, cursor)
     
     docs = query.get()
-    return [Connection.from_dict(doc.to_dict()) for doc in docs]
+    return [Connection.from_dict(doc.to_dict(), doc.id) for doc in docs]
 
 
-def create_connection(db: firestore.Client, user_id: str, connected_user_id: str) -> Connection:
-    """Create a new connection."""
-    # Check if connection already exists
-    existing = get_connection(db, user_id, connected_user_id)
-    if existing:
-        return existing
-    
-    # Create new connection
-    connection = Connection(
-        user_id=user_id,
-        connected_user_id=connected_user_id,
-        status='pending'
-    )
-    
-    # Add to Firestore
-    connections_ref = db.collection('connections')
-    doc_ref = connections_ref.add(connection.to_dict())[1]
-    
-    # Get the created document
-    doc = doc_ref.get()
-    return Connection.from_dict(doc.to_dict())
+def get_connection_count(db: firestore.Client, user_id: str) -> int:
+    """Get total number of connections for a user."""
+    return count_user_connections(db, user_id)
 
 
-def update_connection_status(db: firestore.Client, user_id: str, connected_user_id: str, status: str) -> Optional[Connection]:
-    """Update connection status."""
+def get_accepted_connection_ids(db: firestore.Client, user_id: str) -> List[str]:
+    """Get the IDs of all users with an accepted connection to a user."""
     connections_ref = db.collection('connections')
-    query = connections_ref.where('user_id', '==', user_id).where('connected_user_id', '==', connected_user_id)
-    docs = query.get()
-    
-    if not docs:
-        return None
-    
-    # Update the connection
-    doc_ref = docs[0].reference
-    doc_ref.update({'status': status})
-    
-    # Get the updated document
-    doc = doc_ref.get()
-    return Connection.from_dict(doc.to_dict())
+    sent = connections_ref.where('sender_id', '==', user_id).where('status', '==', 'accepted')
+    received = connections_ref.where('receiver_id', '==', user_id).where('status', '==', 'accepted')
 
+    connection_ids = set()
+    for doc in sent.stream():
+        connection_ids.add(doc.get('receiver_id'))
+    for doc in received.stream():
+        connection_ids.add(doc.get('sender_id'))
 
-def delete_connection(db: firestore.Client, user_id: str, connected_user_id: str) -> bool:
-    """Delete a connection."""
-    connections_ref = db.collection('connections')
-    query = connections_ref.where('user_id', '==', user_id).where('connected_user_id', '==', connected_user_id)
-    docs = query.get()
-    
-    if not docs:
-        return False
-    
-    # Delete the connection
-    docs[0].reference.delete()
-    return True
+    return list(connection_ids)
 
 
-def get_connection_count(db: firestore.Client, user_id: str) -> int:
-    """Get total number of connections for a user."""
+def get_connection_by_users(db: firestore.Client, user_id: str, other_user_id: str) -> Optional[Connection]:
+    """Get a connection between two users, whichever of them sent it."""
     connections_ref = db.collection('connections')
-    query = connections_ref.where('user_id', '==', user_id)
-    return len(query.get())
-
-
-def get_connection_by_users(db: Session, sender_id: int, receiver_id: int) -> Optional[Connection]:
-    """Get a connection between two users."""
-    return db.query(Connection).filter(
-        ((Connection.sender_id == sender_id) & (Connection.receiver_id == receiver_id)) |
-        ((Connection.sender_id == receiver_id) & (Connection.receiver_id == sender_id))
-    ).first()
+    
+    for sender_id, receiver_id in ((user_id, other_user_id), (other_user_id, user_id)):
+        query = connections_ref.where('sender_id', '==', sender_id).where('receiver_id', '==', receiver_id).limit(1)
+        docs = query.get()
+        if docs:
+            return Connection.from_dict(docs[0].to_dict(), docs[0].id)
+    
+    return None
 
 
-def create_connection_request(db: Session, sender_id: int, connection_data: ConnectionCreate) -> Connection:
+def create_connection_request(db: firestore.Client, sender_id: str, connection_data: ConnectionCreate) -> Connection:
     """Create a new connection request."""
     # Check if users are the same
     if sender_id == connection_data.receiver_id:
         raise HTTPException(status_code=400, detail="Cannot connect with yourself")
-
+    
     # Check if connection already exists
     existing_connection = get_connection_by_users(db, sender_id, connection_data.receiver_id)
     if existing_connection:
         raise HTTPException(status_code=400,
                             detail=f"Connection already exists with status: {existing_connection.status}")
-
+    
     # Create connection request
-    db_connection = Connection(
+    connection = Connection(
         sender_id=sender_id,
         receiver_id=connection_data.receiver_id,
         status="pending"
     )
-
-    db.add(db_connection)
-    db.commit()
-    db.refresh(db_connection)
-
+    doc_ref = db.collection('connections').add(connection.to_dict())[1]
+    connection.connection_id = doc_ref.id
+    invalidate_counts('connections', connection.to_dict())
+    _update_connection_graph(connection)
+    
     # Create notification for receiver
-    sender = db.query(User).filter(User.id == sender_id).first()
-
-    notification = Notification(
-        user_id=connection_data.receiver_id,
-        type="connection_request",
-        message=f"{sender.first_name} {sender.last_name} sent you a connection request",
-        source_id=db_connection.id,
-        source_type="connection",
-        created_by=sender_id
-    )
-
-    db.add(notification)
-    db.commit()
-
-    return db_connection
+    notify_user(db, connection.receiver_id, sender_id, "connection_request",
+                "sent you a connection request", connection.connection_id, "connection")
+    
+    return connection
 
 
-def update_connection_status(db: Session, connection_id: int, user_id: int,
+def update_connection_status(db: firestore.Client, connection_id: str, user_id: str,
                              connection_data: ConnectionUpdate) -> Connection:
     """Update a connection request status."""
-    db_connection = get_connection(db, connection_id)
-
+    connection = get_connection(db, connection_id)
+    if not connection:
+        raise HTTPException(status_code=404, detail="Connection not found")
+    
     # Check if user is the receiver of the request
-    if db_connection.receiver_id != user_id:
+    if connection.receiver_id != user_id:
         raise HTTPException(status_code=403, detail="Only the receiver can update the connection status")
-
+    
     # Check if status is valid
     valid_statuses = ["accepted", "rejected"]
     if connection_data.status not in valid_statuses:
         raise HTTPException(status_code=400, detail=f"Status must be one of: {', '.join(valid_statuses)}")
-
+    
     # Update status
-    db_connection.status = connection_data.status
-    db.commit()
-    db.refresh(db_connection)
-
+    previous_data = connection.to_dict()
+    connection.status = connection_data.status
+    connection.updated_at = datetime.utcnow()
+    db.collection('connections').document(connection_id).update({
+        'status': connection.status,
+        'updated_at': connection.updated_at
+    })
+    invalidate_counts('connections', previous_data, connection.to_dict())
+    _update_connection_graph(connection)
+    
     # Create notification for sender if accepted
-    if connection_data.status == "accepted":
-        receiver = db.query(User).filter(User.id == user_id).first()
+    if connection.status == "accepted":
+        task_queue.enqueue("connection.sync_timelines", user_id=connection.sender_id, other_user_id=user_id)
+        notify_user(db, connection.sender_id, user_id, "connection_accepted",
+                    "accepted your connection request", connection_id, "connection")
+    
+    return connection
 
-        notification = Notification(
-            user_id=db_connection.sender_id,
-            type="connection_accepted",
-            message=f"{receiver.first_name} {receiver.last_name} accepted your connection request",
-            source_id=db_connection.id,
-            source_type="connection",
-            created_by=user_id
-        )
 
-        db.add(notification)
-        db.commit()
+def _connections_query(db, field: str, user_id: str, status: str):
+    """Connections with the given status where the user is on the given side, newest first."""
+    return db.collection('connections').where(field, '==', user_id).where('status', '==', status).order_by(
+        'created_at', direction=firestore.Query.DESCENDING
+    )
+
 
-    return db_connection
+def _merge_connection_pages(pages: List[List[Connection]], skip: int, limit: int) -> List[Connection]:
+    connections = [connection for page in pages for connection in page]
+    connections.sort(key=lambda connection: (connection.created_at, connection.connection_id), reverse=True)
+    return connections[skip:skip + limit]
 
 
-def get_user_connections(db: Session, user_id: int, skip: int = 0, limit: int = 50) -> List[Connection]:
+def get_user_connections(db: firestore.Client, user_id: str, skip: int = 0, limit: int = 50,
+                         cursor: Optional[str] = None) -> List[Connection]:
     """Get all connections for a user with status 'accepted'."""
-    return db.query(Connection).filter(
-        ((Connection.sender_id == user_id) | (Connection.receiver_id == user_id)) &
-        (Connection.status == "accepted")
-    ).offset(skip).limit(limit).all()
+    if cursor:
+        skip = 0
+    
+    # A user can be either side of a connection, so merge both keyset pages
+    pages = []
+    for field in ('sender_id', 'receiver_id'):
+        query = paginate_query(_connections_query(db, field, user_id, 'accepted'), limit=skip + limit, cursor=cursor)
+        pages.append([Connection.from_dict(doc.to_dict(), doc.id) for doc in query.get()])
+    
+    return _merge_connection_pages(pages, skip, limit)
 
 
-def count_user_connections(db: Session, user_id: int) -> int:
-    """Count the number of connections for a user with status 'accepted'."""
-    return db.query(Connection).filter(
-        ((Connection.sender_id == user_id) | (Connection.receiver_id == user_id)) &
-        (Connection.status == "accepted")
-    ).count()
+async def get_user_connections_async(db: firestore_async.AsyncClient, user_id: str, skip: int = 0, limit: int = 50,
+                                     cursor: Optional[str] = None) -> List[Connection]:
+    """Get all connections for a user with status 'accepted' from the async client."""
+    if cursor:
+        skip = 0
+    
+    async def side(field: str) -> List[Connection]:
+        query = paginate_query(_connections_query(db, field, user_id, 'accepted'), limit=skip + limit, cursor=cursor)
+        return [Connection.from_dict(doc.to_dict(), doc.id) async for doc in query.stream()]
+    
+    pages = await asyncio.gather(side('sender_id'), side('receiver_id'))
+    return _merge_connection_pages(pages, skip, limit)
 
 
-def get_connection_requests(db: Session, user_id: int, skip: int = 0, limit: int = 50) -> List[Connection]:
-    """Get all pending connection requests received by a user."""
-    return db.query(Connection).filter(
-        (Connection.receiver_id == user_id) &
-        (Connection.status == "pending")
-    ).offset(skip).limit(limit).all()
+def count_user_connections(db: firestore.Client, user_id: str) -> int:
+    """Count the number of connections for a user with status 'accepted'."""
+    return (
+        count_documents(db, 'connections', {'sender_id': user_id, 'status': 'accepted'}) +
+        count_documents(db, 'connections', {'receiver_id': user_id, 'status': 'accepted'})
+    )
 
 
-def count_connection_requests(db: Session, user_id: int) -> int:
-    """Count the number of pending connection requests received by a user."""
-    return db.query(Connection).filter(
-        (Connection.receiver_id == user_id) &
-        (Connection.status == "pending")
-    ).count()
+async def count_user_connections_async(db: firestore_async.AsyncClient, user_id: str) -> int:
+    """Count the number of connections for a user with status 'accepted' from the async client."""
+    counts = await asyncio.gather(
+        count_documents_async(db, 'connections', {'sender_id': user_id, 'status': 'accepted'}),
+        count_documents_async(db, 'connections', {'receiver_id': user_id, 'status': 'accepted'})
+    )
+    return sum(counts)
 
 
-def get_sent_connection_requests(db: Session, user_id: int, skip: int = 0, limit: int = 50) -> List[Connection]:
-    """Get all pending connection requests sent by a user."""
-    return db.query(Connection).filter(
-        (Connection.sender_id == user_id) &
-        (Connection.status == "pending")
-    ).offset(skip).limit(limit).all()
+def get_connection_requests(db: firestore.Client, user_id: str, skip: int = 0, limit: int = 50,
+                            cursor: Optional[str] = None) -> List[Connection]:
+    """Get all pending connection requests received by a user."""
+    query = paginate_query(_connections_query(db, 'receiver_id', user_id, 'pending'), skip, limit, cursor)
+    
+    docs = query.get()
+    return [Connection.from_dict(doc.to_dict(), doc.id) for doc in docs]
 
 
-def count_sent_connection_requests(db: Session, user_id: int) -> int:
-    """Count the number of pending connection requests sent by a user."""
-    return db.query(Connection).filter(
-        (Connection.sender_id == user_id) &
-        (Connection.status == "pending")
-    ).count()
+async def get_connection_requests_async(db: firestore_async.AsyncClient, user_id: str, skip: int = 0, limit: int = 50,
+                                        cursor: Optional[str] = None) -> List[Connection]:
+    """Get all pending connection requests received by a user from the async client."""
+    query = paginate_query(_connections_query(db, 'receiver_id', user_id, 'pending'), skip, limit, cursor)
+    return [Connection.from_dict(doc.to_dict(), doc.id) async for doc in query.stream()]
 
 
-def delete_connection(db: Session, connection_id: int, user_id: int) -> bool:
-    """Delete a connection or withdraw a connection request."""
-    db_connection = get_connection(db, connection_id)
+def count_connection_requests(db: firestore.Client, user_id: str) -> int:
+    """Count the number of pending connection requests received by a user."""
+    return count_documents(db, 'connections', {'receiver_id': user_id, 'status': 'pending'})
 
-    # Check if user is part of the connection
-    if db_connection.sender_id != user_id and db_connection.receiver_id != user_id:
-        raise HTTPException(status_code=403, detail="Not authorized to delete this connection")
 
-    db.delete(db_connection)
-    db.commit()
+async def count_connection_requests_async(db: firestore_async.AsyncClient, user_id: str) -> int:
+    """Count the number of pending connection requests received by a user from the async client."""
+    return await count_documents_async(db, 'connections', {'receiver_id': user_id, 'status': 'pending'})
 
-    return True
 
+def get_sent_connection_requests(db: firestore.Client, user_id: str, skip: int = 0, limit: int = 50,
+                                 cursor: Optional[str] = None) -> List[Connection]:
+    """Get all pending connection requests sent by a user."""
+    query = paginate_query(_connections_query(db, 'sender_id', user_id, 'pending'), skip, limit, cursor)
+    
+    docs = query.get()
+    return [Connection.from_dict(doc.to_dict(), doc.id) for doc in docs]
 
-def get_connection_suggestions(db: Session, user_id: int, skip: int = 0, limit: int = 20) -> List[User]:
-    """Get connection suggestions for a user (connections of connections)."""
-    # Get user's existing connections (both accepted and pending)
-    user_connections = db.query(Connection).filter(
-        ((Connection.sender_id == user_id) | (Connection.receiver_id == user_id))
-    ).all()
 
-    # Get IDs of users already connected or with pending requests
-    connected_ids = set()
-    for conn in user_connections:
-        if conn.sender_id == user_id:
-            connected_ids.add(conn.receiver_id)
-        else:
-            connected_ids.add(conn.sender_id)
+async def get_sent_connection_requests_async(db: firestore_async.AsyncClient, user_id: str, skip: int = 0,
+                                             limit: int = 50, cursor: Optional[str] = None) -> List[Connection]:
+    """Get all pending connection requests sent by a user from the async client."""
+    query = paginate_query(_connections_query(db, 'sender_id', user_id, 'pending'), skip, limit, cursor)
+    return [Connection.from_dict(doc.to_dict(), doc.id) async for doc in query.stream()]
 
-    # Add user's own ID to excluded list
-    connected_ids.add(user_id)
 
-    # Get IDs of user's connections
-    accepted_connection_ids = set()
-    for conn in user_connections:
-        if conn.status == "accepted":
-            if conn.sender_id == user_id:
-                accepted_connection_ids.add(conn.receiver_id)
-            else:
-                accepted_connection_ids.add(conn.sender_id)
+def count_sent_connection_requests(db: firestore.Client, user_id: str) -> int:
+    """Count the number of pending connection requests sent by a user."""
+    return count_documents(db, 'connections', {'sender_id': user_id, 'status': 'pending'})
 
-    # Get connections of user's connections
-    suggestions = []
 
-    for connection_id in accepted_connection_ids:
-        connections_of_connection = db.query(Connection).filter(
-            ((Connection.sender_id == connection_id) | (Connection.receiver_id == connection_id)) &
-            (Connection.status == "accepted")
-        ).all()
+async def count_sent_connection_requests_async(db: firestore_async.AsyncClient, user_id: str) -> int:
+    """Count the number of pending connection requests sent by a user from the async client."""
+    return await count_documents_async(db, 'connections', {'sender_id': user_id, 'status': 'pending'})
 
-        for conn in connections_of_connection:
-            suggestion_id = conn.sender_id if conn.receiver_id == connection_id else conn.receiver_id
 
-            # Skip if user is already connected or it's the user themself
-            if suggestion_id in connected_ids:
-                continue
+def delete_connection(db: firestore.Client, connection_id: str, user_id: str) -> bool:
+    """Delete a connection or withdraw a connection request."""
+    connection = get_connection(db, connection_id)
+    if not connection:
+        raise HTTPException(status_code=404, detail="Connection not found")
+    
+    # Check if user is part of the connection
+    if connection.sender_id != user_id and connection.receiver_id != user_id:
+        raise HTTPException(status_code=403, detail="Not authorized to delete this connection")
+    
+    db.collection('connections').document(connection_id).delete()
+    invalidate_counts('connections', connection.to_dict())
+    _update_connection_graph(connection, deleted=True)
+    if connection.status == 'accepted':
+        task_queue.enqueue("connection.sync_timelines", user_id=connection.sender_id,
+                           other_user_id=connection.receiver_id)
+    
+    return True
 
-            # Add to suggestions and connected_ids to avoid duplicates
-            suggestions.append(suggestion_id)
-            connected_ids.add(suggestion_id)
 
-            # Break if we have enough suggestions
-            if len(suggestions) >= limit + skip:
-                break
+@task_queue.task("connection.sync_timelines")
+def _sync_timelines_task(user_id: str, other_user_id: str) -> None:
+    # Act on the current state, so an accept and a removal that run out of order still converge
+    db = get_db()
+    connection = get_connection_by_users(db, user_id, other_user_id)
+    if connection and connection.status == 'accepted':
+        count = connect_timelines(db, user_id, other_user_id)
+        logger.info(f"Backfilled {count} timeline entries for new connection {user_id} - {other_user_id}")
+    else:
+        count = disconnect_timelines(db, user_id, other_user_id)
+        logger.info(f"Pruned {count} timeline entries for removed connection {user_id} - {other_user_id}")
+
+
+# Suggestion graph
+def _load_connection_graph(db: firestore.Client, graph: ConnectionGraph) -> None:
+    accepted, other = [], []
+    connections = db.collection('connections').select(['sender_id', 'receiver_id', 'status'])
+    for doc in connections.stream():
+        data = doc.to_dict()
+        pair = (data['sender_id'], data['receiver_id'])
+        if data.get('status') == 'accepted':
+            accepted.append(pair)
+        else:
+            other.append(pair)
+    
+    graph.build(accepted, other)
+    logger.info(f"Loaded connection graph with {len(accepted)} accepted connections")
 
-    # If we don't have enough suggestions, add some random users
-    if len(suggestions) < limit + skip:
-        random_users = db.query(User).filter(
-            (User.id.notin_(connected_ids)) &
-            (User.is_active == True)
-        ).limit(limit + skip - len(suggestions)).all()
 
-        for user in random_users:
-            suggestions.append(user.id)
+def _refresh_connection_graph(db: firestore.Client) -> None:
+    """Load a fresh graph off the request path and swap it in, keeping the old one serving meanwhile."""
+    global _connection_graph, _connection_graph_loaded_at, _connection_graph_pending
+    
+    graph = ConnectionGraph()
+    try:
+        _load_connection_graph(db, graph)
+    except Exception as e:
+        logger.warning(f"Connection graph refresh failed, keeping the current graph: {str(e)}")
+        with _connection_graph_lock:
+            _connection_graph_loaded_at, _connection_graph_pending = time.monotonic(), None
+        return
+    
+    with _connection_graph_lock:
+        for update in _connection_graph_pending or ():
+            _apply_connection_update(graph, *update)
+        _connection_graph, _connection_graph_loaded_at = graph, time.monotonic()
+        _connection_graph_pending = None
 
-    # Get user objects for suggestion IDs with pagination
-    suggestion_users = db.query(User).filter(
-        User.id.in_(suggestions[skip:skip + limit])
-    ).all()
 
-    return suggestion_users
+def get_connection_graph(db: firestore.Client) -> ConnectionGraph:
+    """Get the process-wide connection graph.
+    
+    The graph is updated in place by this process's connection writes and
+    rebuilt from Firestore every CONNECTION_GRAPH_REFRESH_SECONDS to pick up
+    writes handled by other processes. Only the first load blocks; later
+    rebuilds run on a background thread while the current graph keeps serving.
+    """
+    global _connection_graph, _connection_graph_loaded_at, _connection_graph_pending
+    
+    with _connection_graph_lock:
+        if _connection_graph is None:
+            graph = ConnectionGraph()
+            _load_connection_graph(db, graph)
+            _connection_graph, _connection_graph_loaded_at = graph, time.monotonic()
+        elif (_connection_graph_pending is None and
+              time.monotonic() - _connection_graph_loaded_at > settings.CONNECTION_GRAPH_REFRESH_SECONDS):
+            _connection_graph_pending = []
+            threading.Thread(target=_refresh_connection_graph, args=(db,), name="connection-graph-refresh",
+                             daemon=True).start()
+        return _connection_graph
+
+
+def _apply_connection_update(graph: ConnectionGraph, sender_id: str, receiver_id: str, status: str,
+                             deleted: bool) -> None:
+    if deleted:
+        graph.remove(sender_id, receiver_id)
+    elif status == 'accepted':
+        graph.add_edge(sender_id, receiver_id)
+    else:
+        graph.block(sender_id, receiver_id)
+
+
+def _update_connection_graph(connection: Connection, deleted: bool = False) -> None:
+    """Apply a connection write to the graph if this process has loaded it."""
+    update = (connection.sender_id, connection.receiver_id, connection.status, deleted)
+    with _connection_graph_lock:
+        graph = _connection_graph
+        if _connection_graph_pending is not None:
+            _connection_graph_pending.append(update)
+    
+    if graph is not None:
+        _apply_connection_update(graph, *update)
 
 
-def count_connection_suggestions(db: Session, user_id: int) -> int:
-    """Estimate the number of connection suggestions for a user."""
-    # Count connections of connections (this is an approximation)
-    connections_count = count_user_connections(db, user_id)
+def get_connection_suggestions(db: firestore.Client, user_id: str, skip: int = 0,
+                               limit: int = 20) -> Tuple[List[User], int]:
+    """Get connection suggestions for a user (connections of connections).
+    
+    Candidates are ranked by mutual connection count; the page and the exact
+    number of candidates come from the same graph traversal.
+    """
+    ranked, total = get_connection_graph(db).suggestions(user_id, skip, limit)
+    mutual_counts = dict(ranked)
+    
+    docs, _ = get_many(db, 'users', [suggestion_id for suggestion_id, _ in ranked])
+    users = []
+    for doc in docs:
+        user = User.from_dict(doc.to_dict(), doc.id)
+        user.mutual_connections_count = mutual_counts[doc.id]
+        users.append(user)
+    
+    return users, total
 
-    # Assuming each connection has an average of 50 connections
-    # and about 20% are not already connected to the user
-    estimated_suggestions = min(connections_count * 50 * 0.2, 100)
 
-    return int(estimated_suggestions)
+def count_connection_suggestions(db: firestore.Client, user_id: str) -> int:
+    """Count the connection suggestions for a user."""
+    return get_connection_graph(db).suggestions(user_id, limit=0)[1]
 
 
-def check_connection_status(db: Session, user_id: int, other_user_id: int) -> Dict[str, Any]:
+def check_connection_status(db: firestore.Client, user_id: str, other_user_id: str) -> Dict[str, Any]:
     """Check the connection status between two users."""
     connection = get_connection_by_users(db, user_id, other_user_id)
-
+    
     if not connection:
         return {
             "status": "none",
             "connection_id": None
         }
-
+    
     return {
         "status": connection.status,
-        "connection_id": connection.id,
+        "connection_id": connection.connection_id,
         "is_sender": connection.sender_id == user_id
     }
 
 
-def get_mutual_connections(db: Session, user_id: int, other_user_id: int, skip: int = 0, limit: int = 20) -> List[User]:
-    """Get mutual connections between two users."""
-    # Get IDs of users connected to first user
-    user1_connections_query = db.query(
-        func.if_(Connection.sender_id == user_id, Connection.receiver_id, Connection.sender_id).label('connection_id')
-    ).filter(
-        ((Connection.sender_id == user_id) | (Connection.receiver_id == user_id)) &
-        (Connection.status == "accepted")
-    ).subquery()
-
-    # Get IDs of users connected to second user
-    user2_connections_query = db.query(
-        func.if_(Connection.sender_id == other_user_id, Connection.receiver_id, Connection.sender_id).label(
-            'connection_id')
-    ).filter(
-        ((Connection.sender_id == other_user_id) | (Connection.receiver_id == other_user_id)) &
-        (Connection.status == "accepted")
-    ).subquery()
-
-    # Find intersection
-    mutual_connection_ids = db.query(user1_connections_query.c.connection_id).filter(
-        user1_connections_query.c.connection_id.in_(
-            db.query(user2_connections_query.c.connection_id)
-        )
-    ).offset(skip).limit(limit).all()
-
-    # Convert to list of IDs
-    mutual_ids = [id[0] for id in mutual_connection_ids]
+def get_mutual_connections(db: firestore.Client, user_id: str, other_user_id: str, skip: int = 0,
+                           limit: int = 20) -> Tuple[List[User], int]:
+    """Get a page of mutual connections between two users, with their total number."""
+    mutual_ids = get_connection_graph(db).mutual(user_id, other_user_id)
+    
+    docs, _ = get_many(db, 'users', mutual_ids[skip:skip + limit])
+    return [User.from_dict(doc.to_dict(), doc.id) for doc in docs], len(mutual_ids)
 
-    # Get user objects
-    mutual_users = db.query(User).filter(User.id.in_(mutual_ids)).all()
 
-    return mutual_users
+def count_mutual_connections(db: firestore.Client, user_id: str, other_user_id: str) -> int:
+    """Count mutual connections between two users."""
+    return len(get_connection_graph(db).mutual(user_id, other_user_id))
 
 
-def count_mutual_connections(db: Session, user_id: int, other_user_id: int) -> int:
-    """Count mutual connections between two users."""
-    # Get IDs of users connected to first user
-    user1_connections_query = db.query(
-        func.if_(Connection.sender_id == user_id, Connection.receiver_id, Connection.sender_id).label('connection_id')
-    ).filter(
-        ((Connection.sender_id == user_id) | (Connection.receiver_id == user_id)) &
-        (Connection.status == "accepted")
-    ).subquery()
-
-    # Get IDs of users connected to second user
-    user2_connections_query = db.query(
-        func.if_(Connection.sender_id == other_user_id, Connection.receiver_id, Connection.sender_id).label(
-            'connection_id')
-    ).filter(
-        ((Connection.sender_id == other_user_id) | (Connection.receiver_id == other_user_id)) &
-        (Connection.status == "accepted")
-    ).subquery()
-
-    # Count intersection
-    return db.query(user1_connections_query.c.connection_id).filter(
-        user1_connections_query.c.connection_id.in_(
-            db.query(user2_connections_query.c.connection_id)
-        )
-    ).count()
+def get_mutual_connection_counts(db: firestore.Client, user_id: str, other_user_ids: List[str]) -> Dict[str, int]:
+    """Count mutual connections between a user and each of a list of users."""
+    return get_connection_graph(db).mutual_counts(user_id, other_user_ids)
 
 
 # Follow functionality
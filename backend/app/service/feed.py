@@ -0,0 +1,442 @@
+from typing import List, Dict, Any, Optional, Tuple
+from collections import Counter, defaultdict
+from datetime import datetime
+import asyncio
+import logging
+from firebase_admin import firestore, firestore_async
+
+from app.config import settings
+from app.database import MAX_BATCH_SIZE, BatchedWrites, count_query, count_query_async, get_many
+from app.utils.helpers import encode_cursor, paginate_query
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Firestore 'in' filters accept at most 30 values
+IN_QUERY_LIMIT = 30
+
+TIMELINES_COLLECTION = 'timelines'
+ENTRIES_COLLECTION = 'timeline_entries'
+
+
+def _timeline_ref(db: firestore.Client, user_id: str):
+    return db.collection(TIMELINES_COLLECTION).document(user_id)
+
+
+def _entry_ref(db: firestore.Client, user_id: str, post_id: str):
+    return _timeline_ref(db, user_id).collection(ENTRIES_COLLECTION).document(post_id)
+
+
+def _timeline_entry(post_id: str, author_id: str, created_at: datetime) -> Dict[str, Any]:
+    return {
+        "post_id": post_id,
+        "author_id": author_id,
+        "created_at": created_at
+    }
+
+
+@firestore.transactional
+def _add_entry_chunk(transaction, db: firestore.Client, entries: List[Tuple[str, Dict[str, Any]]]) -> int:
+    refs = [_entry_ref(db, user_id, entry['post_id']) for user_id, entry in entries]
+    existing = {doc.reference.path for doc in transaction.get_all(refs) if doc.exists}
+
+    added = Counter()
+    for ref, (user_id, entry) in zip(refs, entries):
+        transaction.set(ref, entry)
+        if ref.path not in existing:
+            added[user_id] += 1
+
+    for user_id, count in added.items():
+        transaction.set(_timeline_ref(db, user_id), {"length": firestore.Increment(count)}, merge=True)
+    return sum(added.values())
+
+
+def _add_entries(db: firestore.Client, entries: List[Tuple[str, Dict[str, Any]]]) -> int:
+    """Write (user_id, entry) pairs, counting only new entries towards each timeline's length.
+
+    Each chunk is read and written in one transaction, so an entry that is
+    already on a timeline, or written concurrently, is counted once.
+    Returns the number of new entries.
+    """
+    # An entry costs at most two writes: itself and its timeline's counter
+    chunk_size = MAX_BATCH_SIZE // 2
+
+    added = 0
+    for start in range(0, len(entries), chunk_size):
+        added += _add_entry_chunk(db.transaction(), db, entries[start:start + chunk_size])
+    return added
+
+
+def _trim_timeline(db: firestore.Client, user_id: str) -> int:
+    """Delete the entries past FEED_TIMELINE_MAX_LENGTH from a timeline and reset its length."""
+    max_length = settings.FEED_TIMELINE_MAX_LENGTH
+    entries_ref = _timeline_ref(db, user_id).collection(ENTRIES_COLLECTION)
+    overflow = entries_ref.order_by('created_at', direction=firestore.Query.DESCENDING).offset(max_length)
+
+    writes = BatchedWrites(db)
+    for doc in overflow.select([]).stream():
+        writes.delete(doc.reference)
+    writes.flush()
+
+    # The counter only decides when to trim, so correct any drift while here
+    length = max_length if writes.committed else count_query(entries_ref)
+    _timeline_ref(db, user_id).set({"length": length}, merge=True)
+    return writes.committed
+
+
+def trim_timelines(db: firestore.Client, user_ids: List[str]) -> int:
+    """Trim the timelines that have grown FEED_TIMELINE_TRIM_SLACK entries past the cap.
+
+    Entries past the cap are never read, so the slack only bounds storage and
+    saves a trim query on every write. Returns the number of entries deleted.
+    """
+    trim_at = settings.FEED_TIMELINE_MAX_LENGTH + settings.FEED_TIMELINE_TRIM_SLACK
+    docs, _ = get_many(db, TIMELINES_COLLECTION, user_ids, field_paths=['length'])
+
+    deleted = 0
+    for doc in docs:
+        if (doc.to_dict() or {}).get('length', 0) > trim_at:
+            deleted += _trim_timeline(db, doc.id)
+    return deleted
+
+
+def _mark_celebrity(db: firestore.Client, author_id: str, connection_ids: List[str]) -> None:
+    """Switch an author to fan-out-on-read for all of their connections."""
+    author_timeline = _timeline_ref(db, author_id).get()
+    if author_timeline.exists and author_timeline.to_dict().get('is_celebrity'):
+        return
+
+    writes = BatchedWrites(db)
+    for connection_id in connection_ids:
+        writes.set(
+            _timeline_ref(db, connection_id),
+            {"celebrity_ids": firestore.ArrayUnion([author_id])},
+            merge=True
+        )
+    writes.set(_timeline_ref(db, author_id), {"is_celebrity": True}, merge=True)
+    writes.flush()
+
+    logger.info(f"Author {author_id} switched to fan-out-on-read ({len(connection_ids)} connections)")
+
+
+def add_to_author_timeline(db: firestore.Client, post_id: str, author_id: str, created_at: datetime) -> None:
+    """Put a new post on its author's own timeline, ahead of the fan-out to connections."""
+    _add_entries(db, [(author_id, _timeline_entry(post_id, author_id, created_at))])
+
+    trim_timelines(db, [author_id])
+
+
+def fan_out_post(db: firestore.Client, post_id: str, author_id: str, created_at: datetime,
+                 connection_ids: List[str]) -> int:
+    """Push a new post onto the timelines of its author's accepted connections.
+
+    Authors with more connections than FEED_CELEBRITY_THRESHOLD are not fanned
+    out; their posts are merged into readers' feeds at query time instead.
+    Returns the number of timelines written.
+    """
+    if len(connection_ids) > settings.FEED_CELEBRITY_THRESHOLD:
+        _mark_celebrity(db, author_id, connection_ids)
+        return 0
+
+    entry = _timeline_entry(post_id, author_id, created_at)
+    _add_entries(db, [(user_id, entry) for user_id in connection_ids])
+
+    trim_timelines(db, connection_ids)
+    return len(connection_ids)
+
+
+def remove_post_from_timelines(db: firestore.Client, post_id: str) -> int:
+    """Remove a deleted post from every timeline it was pushed onto."""
+    query = db.collection_group(ENTRIES_COLLECTION).where('post_id', '==', post_id)
+
+    removed = 0
+    writes = BatchedWrites(db)
+    for doc in query.select([]).stream():
+        writes.delete(doc.reference)
+        writes.set(doc.reference.parent.parent, {"length": firestore.Increment(-1)}, merge=True)
+        removed += 1
+    writes.flush()
+
+    return removed
+
+
+def connect_timelines(db: firestore.Client, user_id: str, other_user_id: str) -> int:
+    """Backfill two newly connected users' timelines with each other's recent posts.
+
+    A celebrity's posts are not copied; the reader gets the celebrity's ID in
+    celebrity_ids instead, as connections made before the author crossed
+    FEED_CELEBRITY_THRESHOLD did. Returns the number of entries added.
+    """
+    docs, _ = get_many(db, TIMELINES_COLLECTION, [user_id, other_user_id], field_paths=['is_celebrity'])
+    celebrities = {doc.id for doc in docs if (doc.to_dict() or {}).get('is_celebrity')}
+    posts_ref = db.collection('posts')
+
+    entries = []
+    writes = BatchedWrites(db)
+    for reader_id, author_id in ((user_id, other_user_id), (other_user_id, user_id)):
+        if author_id in celebrities:
+            writes.set(_timeline_ref(db, reader_id), {"celebrity_ids": firestore.ArrayUnion([author_id])}, merge=True)
+            continue
+
+        query = posts_ref.where('author_id', '==', author_id).order_by(
+            'created_at', direction=firestore.Query.DESCENDING
+        ).limit(settings.FEED_BACKFILL_POSTS)
+        for doc in query.select(['author_id', 'created_at']).stream():
+            data = doc.to_dict()
+            entries.append((reader_id, _timeline_entry(doc.id, data['author_id'], data['created_at'])))
+    writes.flush()
+    written = _add_entries(db, entries)
+
+    trim_timelines(db, [user_id, other_user_id])
+    return written
+
+
+def disconnect_timelines(db: firestore.Client, user_id: str, other_user_id: str) -> int:
+    """Remove two disconnected users' posts from each other's timelines.
+
+    Returns the number of entries removed.
+    """
+    removed = 0
+    writes = BatchedWrites(db)
+    for reader_id, author_id in ((user_id, other_user_id), (other_user_id, user_id)):
+        timeline_ref = _timeline_ref(db, reader_id)
+        entries = timeline_ref.collection(ENTRIES_COLLECTION).where('author_id', '==', author_id)
+
+        reader_removed = 0
+        for doc in entries.select([]).stream():
+            writes.delete(doc.reference)
+            reader_removed += 1
+
+        update = {"celebrity_ids": firestore.ArrayRemove([author_id])}
+        if reader_removed:
+            update["length"] = firestore.Increment(-reader_removed)
+        writes.set(timeline_ref, update, merge=True)
+        removed += reader_removed
+    writes.flush()
+
+    return removed
+
+
+def _celebrity_ids(timeline_doc) -> List[str]:
+    if not timeline_doc.exists:
+        return []
+    return timeline_doc.to_dict().get('celebrity_ids', [])
+
+
+def _get_celebrity_ids(db: firestore.Client, user_id: str) -> List[str]:
+    return _celebrity_ids(_timeline_ref(db, user_id).get())
+
+
+def _celebrity_queries(db, celebrity_ids: List[str], limit: int, cursor: Optional[str] = None) -> list:
+    """Queries for the latest posts of celebrity authors (fan-out-on-read), one per 'in' chunk."""
+    posts_ref = db.collection('posts')
+    queries = []
+
+    for i in range(0, len(celebrity_ids), IN_QUERY_LIMIT):
+        chunk = celebrity_ids[i:i + IN_QUERY_LIMIT]
+        query = posts_ref.where('author_id', 'in', chunk).order_by(
+            'created_at', direction=firestore.Query.DESCENDING
+        )
+        queries.append(paginate_query(query, limit=limit, cursor=cursor))
+
+    return queries
+
+
+def _celebrity_entry(doc) -> Dict[str, Any]:
+    data = doc.to_dict()
+    return _timeline_entry(doc.id, data['author_id'], data['created_at'])
+
+
+def _get_celebrity_entries(db: firestore.Client, celebrity_ids: List[str], limit: int,
+                           cursor: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Fetch the latest posts of celebrity authors (fan-out-on-read)."""
+    return [
+        _celebrity_entry(doc)
+        for query in _celebrity_queries(db, celebrity_ids, limit, cursor)
+        for doc in query.stream()
+    ]
+
+
+def _timeline_window(skip: int, limit: int, cursor: Optional[str]) -> Tuple[int, int]:
+    if cursor:
+        skip = 0
+    return skip, min(skip + limit, settings.FEED_TIMELINE_MAX_LENGTH)
+
+
+def _timeline_entries_query(db, user_id: str, window: int, cursor: Optional[str]):
+    entries_ref = _timeline_ref(db, user_id).collection(ENTRIES_COLLECTION)
+    query = entries_ref.order_by('created_at', direction=firestore.Query.DESCENDING)
+    return paginate_query(query, limit=window, cursor=cursor)
+
+
+def _timeline_page(entries: List[Dict[str, Any]], celebrity_entries: List[Dict[str, Any]], skip: int,
+                   window: int, limit: int) -> Tuple[List[str], Optional[str]]:
+    """Merge fanned-out and celebrity entries into one page of post IDs and the next page's cursor."""
+    if celebrity_entries:
+        entries = entries + celebrity_entries
+        entries.sort(key=lambda entry: (entry['created_at'], entry['post_id']), reverse=True)
+
+    page = []
+    seen = set()
+    for entry in entries:
+        if entry['post_id'] in seen:
+            continue
+        seen.add(entry['post_id'])
+        page.append(entry)
+    page = page[skip:window]
+
+    next_cursor = None
+    if page and len(page) >= limit:
+        next_cursor = encode_cursor(page[-1]['created_at'], page[-1]['post_id'])
+
+    return [entry['post_id'] for entry in page], next_cursor
+
+
+def get_timeline_post_ids(db: firestore.Client, user_id: str, skip: int = 0, limit: int = 20,
+                          cursor: Optional[str] = None) -> Tuple[List[str], Optional[str]]:
+    """Get a page of post IDs from a user's timeline, newest first.
+
+    With a cursor the page starts right after the cursor's post; otherwise
+    the first skip entries are dropped from the merged window. Also returns
+    the cursor of the page's last entry when the page is full, so callers
+    that drop deleted posts while hydrating can still resume after it.
+    """
+    skip, window = _timeline_window(skip, limit, cursor)
+    if window <= skip:
+        return [], None
+
+    entries = [doc.to_dict() for doc in _timeline_entries_query(db, user_id, window, cursor).stream()]
+
+    # Merge in posts from authors that are read at query time
+    celebrity_ids = _get_celebrity_ids(db, user_id)
+    celebrity_entries = _get_celebrity_entries(db, celebrity_ids, window, cursor) if celebrity_ids else []
+
+    return _timeline_page(entries, celebrity_entries, skip, window, limit)
+
+
+async def get_timeline_post_ids_async(db: firestore_async.AsyncClient, user_id: str, skip: int = 0,
+                                      limit: int = 20, cursor: Optional[str] = None) -> Tuple[List[str], Optional[str]]:
+    """get_timeline_post_ids for the async client, reading the entries and celebrity posts concurrently."""
+    skip, window = _timeline_window(skip, limit, cursor)
+    if window <= skip:
+        return [], None
+
+    entry_docs, timeline_doc = await asyncio.gather(
+        _timeline_entries_query(db, user_id, window, cursor).get(),
+        _timeline_ref(db, user_id).get()
+    )
+
+    # Merge in posts from authors that are read at query time
+    celebrity_pages = await asyncio.gather(
+        *(query.get() for query in _celebrity_queries(db, _celebrity_ids(timeline_doc), window, cursor))
+    )
+    celebrity_entries = [_celebrity_entry(doc) for docs in celebrity_pages for doc in docs]
+
+    return _timeline_page([doc.to_dict() for doc in entry_docs], celebrity_entries, skip, window, limit)
+
+
+def _count_queries(db, user_id: str, celebrity_ids: List[str]) -> list:
+    max_length = settings.FEED_TIMELINE_MAX_LENGTH
+    entries_ref = _timeline_ref(db, user_id).collection(ENTRIES_COLLECTION)
+    posts_ref = db.collection('posts')
+
+    queries = [entries_ref.limit(max_length)]
+    for i in range(0, len(celebrity_ids), IN_QUERY_LIMIT):
+        chunk = celebrity_ids[i:i + IN_QUERY_LIMIT]
+        queries.append(posts_ref.where('author_id', 'in', chunk).limit(max_length))
+    return queries
+
+
+def count_timeline_posts(db: firestore.Client, user_id: str) -> int:
+    """Count the posts reachable from a user's timeline."""
+    max_length = settings.FEED_TIMELINE_MAX_LENGTH
+    total = 0
+    for query in _count_queries(db, user_id, _get_celebrity_ids(db, user_id)):
+        if total >= max_length:
+            break
+        total += count_query(query)
+
+    return min(total, max_length)
+
+
+async def count_timeline_posts_async(db: firestore_async.AsyncClient, user_id: str) -> int:
+    """Count the posts reachable from a user's timeline."""
+    timeline_doc = await _timeline_ref(db, user_id).get()
+    counts = await asyncio.gather(
+        *(count_query_async(query) for query in _count_queries(db, user_id, _celebrity_ids(timeline_doc)))
+    )
+    return min(sum(counts), settings.FEED_TIMELINE_MAX_LENGTH)
+
+
+def rebuild_timelines(db: firestore.Client, clear: bool = True) -> Dict[str, int]:
+    """Backfill every timeline from the posts and connections collections."""
+    max_length = settings.FEED_TIMELINE_MAX_LENGTH
+    writes = BatchedWrites(db)
+
+    if clear:
+        for doc in db.collection_group(ENTRIES_COLLECTION).stream():
+            writes.delete(doc.reference)
+        for doc in db.collection(TIMELINES_COLLECTION).stream():
+            writes.delete(doc.reference)
+        writes.flush()
+        logger.info(f"Cleared {writes.committed} timeline documents")
+
+    # Build the accepted-connection adjacency list
+    adjacency = defaultdict(set)
+    connections = db.collection('connections').where('status', '==', 'accepted')
+    for doc in connections.stream():
+        data = doc.to_dict()
+        adjacency[data['sender_id']].add(data['receiver_id'])
+        adjacency[data['receiver_id']].add(data['sender_id'])
+
+    celebrities = {
+        user_id for user_id, connection_ids in adjacency.items()
+        if len(connection_ids) > settings.FEED_CELEBRITY_THRESHOLD
+    }
+
+    # Walk posts newest first so each timeline keeps its most recent entries
+    lengths = defaultdict(int)
+    posts_seen = 0
+    posts = db.collection('posts').order_by('created_at', direction=firestore.Query.DESCENDING)
+    for doc in posts.stream():
+        data = doc.to_dict()
+        author_id = data['author_id']
+        posts_seen += 1
+
+        recipients = [author_id]
+        if author_id not in celebrities:
+            recipients.extend(adjacency.get(author_id, ()))
+
+        entry = _timeline_entry(doc.id, author_id, data['created_at'])
+        for user_id in recipients:
+            if lengths[user_id] >= max_length:
+                continue
+            lengths[user_id] += 1
+            writes.set(_entry_ref(db, user_id, doc.id), entry)
+
+    for author_id in celebrities:
+        for connection_id in adjacency[author_id]:
+            writes.set(
+                _timeline_ref(db, connection_id),
+                {"celebrity_ids": firestore.ArrayUnion([author_id])},
+                merge=True
+            )
+        writes.set(_timeline_ref(db, author_id), {"is_celebrity": True}, merge=True)
+
+    writes.flush()
+
+    # Seed the length counters that decide when a timeline is trimmed; without
+    # a clear, timelines may hold entries this pass did not write, so recount
+    for user_id, length in lengths.items():
+        if not clear:
+            length = count_query(_timeline_ref(db, user_id).collection(ENTRIES_COLLECTION))
+        writes.set(_timeline_ref(db, user_id), {"length": length}, merge=True)
+
+    writes.flush()
+
+    return {
+        "posts": posts_seen,
+        "timelines": len(lengths),
+        "celebrities": len(celebrities),
+        "writes": writes.committed
+    }
@@ -1,16 +1,47 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from fastapi import HTTPException
 from sqlalchemy.orm import Session
 from sqlalchemy import desc, or_, and_, func
-from firebase_admin import firestore
+from firebase_admin import firestore, firestore_async
+import anyio
+import asyncio
 import uuid
-from datetime import datetime
-
-from app.model.job import Job, JobApplication, SavedJob
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+
+from app.config import settings
+from app.database import (
+    get_db, BatchedWrites, add_document, get_many, get_many_async, count_documents, count_documents_async,
+    invalidate_counts, update_document, iter_modified_documents
+)
+from app.core.search_index import InvertedIndex, timestamp
+from app.model.job import Job, JobSummary, JobApplication, SavedJob
 from app.model.user import User
 from app.model.notification import Notification
 from app.schema.job import JobCreate, JobUpdate, JobApplicationCreate, JobApplicationUpdate, SavedJobCreate
+from app.service.notification import coalesce_notification, create_notification
 from app.service.user import get_user
+from app.utils.helpers import encode_cursor, list_items, paginate_query
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+JOB_INDEX_PATH = os.path.join(settings.SEARCH_INDEX_DIR, 'jobs.seg')
+JOB_FIELD_WEIGHTS = {"title": 3.0, "company_name": 2.0, "location": 1.0, "description": 1.0}
+JOB_FACETS = ['job_type', 'is_remote', 'salary_buckets']
+
+# (label, inclusive lower bound, exclusive upper bound)
+SALARY_BUCKETS = [
+    ("0-50k", 0, 50000),
+    ("50k-100k", 50000, 100000),
+    ("100k-150k", 100000, 150000),
+    ("150k+", 150000, None)
+]
+
+_job_index: Optional[InvertedIndex] = None
+_job_index_lock = threading.Lock()
 
 
 def get_job(db: firestore.Client, job_id: str) -> Optional[Job]:
@@ -24,44 +55,65 @@ def get_job(db: firestore.Client, job_id: str) -> Optional[Job]:
     return Job.from_dict(doc.to_dict())
 
 
+async def get_job_async(db: firestore_async.AsyncClient, job_id: str) -> Optional[Job]:
+    """Get a job by ID."""
+    doc = await db.collection('jobs').document(job_id).get()
+    
+    if not doc.exists:
+        return None
+    
+    return Job.from_dict(doc.to_dict(), doc.id)
+
+
 def create_job(db: firestore.Client, job: Job) -> Job:
     """Create a new job."""
-    jobs_ref = db.collection('jobs')
-    doc_ref = jobs_ref.add(job.to_dict())[1]
+    job_id, data = add_document(db.collection('jobs'), job.to_dict())
+    created_job = Job.from_dict(data, job_id)
     
-    # Get the created document
-    doc = doc_ref.get()
-    return Job.from_dict(doc.to_dict())
+    index_job(db, created_job)
+    invalidate_counts('jobs', created_job.to_dict())
+    return created_job
 
 
-def update_job(db: firestore.Client, job_id: str, job_data: dict) -> Optional[Job]:
+def update_job(db: firestore.Client, job_id: str, user_id: str, job_data: JobUpdate) -> Job:
     """Update a job."""
     jobs_ref = db.collection('jobs')
     doc_ref = jobs_ref.document(job_id)
     doc = doc_ref.get()
     
     if not doc.exists:
-        return None
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    # Check if user is the poster
+    if doc.to_dict().get('poster_id') != user_id:
+        raise HTTPException(status_code=403, detail="Not authorized to update this job")
     
     # Update the job
-    doc_ref.update(job_data)
+    update_data = job_data.dict(exclude_unset=True)
+    update_data['updated_at'] = datetime.utcnow()
+    updated_job = Job.from_dict(update_document(db, doc_ref, update_data, snapshot=doc), job_id)
     
-    # Get the updated document
-    doc = doc_ref.get()
-    return Job.from_dict(doc.to_dict())
+    index_job(db, updated_job)
+    return updated_job
 
 
-def delete_job(db: firestore.Client, job_id: str) -> bool:
+def delete_job(db: firestore.Client, job_id: str, user_id: str) -> bool:
     """Delete a job."""
     jobs_ref = db.collection('jobs')
     doc_ref = jobs_ref.document(job_id)
     doc = doc_ref.get()
     
     if not doc.exists:
-        return False
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    # Check if user is the poster
+    if doc.to_dict().get('poster_id') != user_id:
+        raise HTTPException(status_code=403, detail="Not authorized to delete this job")
     
     # Delete the job
     doc_ref.delete()
+    get_job_index(db).remove(job_id)
+    invalidate_counts('jobs', doc.to_dict())
     return True
 
 
@@ -70,9 +122,38 @@ def get_jobs(
     skip: int = 0,
     limit: int = 100,
     company_id: Optional[str] = None,
-    search_query: Optional[str] = None
-) -> List[Job]:
-    """Get all jobs with optional filtering."""
+    search_query: Optional[str] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[List[str]] = None
+) -> List[JobSummary]:
+    """Get all jobs with optional filtering.
+    
+    Only the summary fields are fetched; with fields, just those are, and
+    the jobs come back as dicts.
+    """
+    # Text matching goes through the search index so pages are filtered before pagination
+    if search_query:
+        return search_jobs(db, search_query, skip=skip, limit=limit, fields=fields)[0]
+    
+    docs = _jobs_query(db, skip, limit, company_id, cursor, fields).get()
+    return list_items(docs, JobSummary, 'job_id', fields)
+
+
+async def get_jobs_async(
+    db: firestore_async.AsyncClient,
+    skip: int = 0,
+    limit: int = 100,
+    company_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[List[str]] = None
+) -> List[JobSummary]:
+    """Get all jobs, projected like get_jobs; text queries go through search_jobs_async."""
+    docs = await _jobs_query(db, skip, limit, company_id, cursor, fields).get()
+    return list_items(docs, JobSummary, 'job_id', fields)
+
+
+def _jobs_query(db, skip: int, limit: int, company_id: Optional[str], cursor: Optional[str],
+                fields: Optional[List[str]]):
     jobs_ref = db.collection('jobs')
     query = jobs_ref.order_by('created_at', direction=firestore.Query.DESCENDING)
     
@@ -81,143 +162,245 @@ def get_jobs(
         query = query.where('company_id', '==', company_id)
     
     # Apply pagination
-    if skip > 0:
-        query = query.offset(skip)
-    if limit > 0:
-        query = query.limit(limit)
-    
-    docs = query.get()
-    jobs = [Job.from_dict(doc.to_dict()) for doc in docs]
-    
-    # Apply search filter if provided
-    if search_query:
-        search_query = search_query.lower()
-        jobs = [
-            job for job in jobs
-            if search_query in job.title.lower() or
-               search_query in job.description.lower() or
-               search_query in job.location.lower()
-        ]
-    
-    return jobs
+    query = paginate_query(query, skip, limit, cursor)
+    return query.select(fields or JobSummary.FIELDS)
 
 
 def count_jobs(db: firestore.Client, company_id: Optional[str] = None) -> int:
     """Get total number of jobs."""
-    jobs_ref = db.collection('jobs')
-    query = jobs_ref
-    
-    if company_id:
-        query = query.where('company_id', '==', company_id)
-    
-    return len(query.get())
+    filters = {'company_id': company_id} if company_id else None
+    return count_documents(db, 'jobs', filters)
+
+
+async def count_jobs_async(db: firestore_async.AsyncClient, company_id: Optional[str] = None) -> int:
+    """Get total number of jobs."""
+    filters = {'company_id': company_id} if company_id else None
+    return await count_documents_async(db, 'jobs', filters)
 
 
-def get_user_jobs(db: firestore.Client, user_id: str, skip: int = 0, limit: int = 100) -> List[Job]:
-    """Get all job postings by a specific user."""
+def _user_jobs_query(db, user_id: str, skip: int, limit: int, cursor: Optional[str],
+                     fields: Optional[List[str]]):
     jobs_ref = db.collection('jobs')
     query = jobs_ref.where('poster_id', '==', user_id).order_by('created_at', direction=firestore.Query.DESCENDING)
     
     # Apply pagination
-    if skip > 0:
-        query = query.offset(skip)
-    if limit > 0:
-        query = query.limit(limit)
-    
-    docs = query.get()
-    jobs = [Job.from_dict(doc.to_dict()) for doc in docs]
-    
-    return jobs
+    query = paginate_query(query, skip, limit, cursor)
+    return query.select(fields or JobSummary.FIELDS)
+
+
+def get_user_jobs(db: firestore.Client, user_id: str, skip: int = 0, limit: int = 100,
+                  cursor: Optional[str] = None, fields: Optional[List[str]] = None) -> List[JobSummary]:
+    """Get all job postings by a specific user, projected like get_jobs."""
+    docs = _user_jobs_query(db, user_id, skip, limit, cursor, fields).get()
+    return list_items(docs, JobSummary, 'job_id', fields)
+
+
+async def get_user_jobs_async(db: firestore_async.AsyncClient, user_id: str, skip: int = 0, limit: int = 100,
+                              cursor: Optional[str] = None, fields: Optional[List[str]] = None) -> List[JobSummary]:
+    """Get all job postings by a specific user, projected like get_jobs."""
+    docs = await _user_jobs_query(db, user_id, skip, limit, cursor, fields).get()
+    return list_items(docs, JobSummary, 'job_id', fields)
 
 
 def count_user_jobs(db: firestore.Client, user_id: str) -> int:
     """Count the total number of job postings by a specific user."""
-    jobs_ref = db.collection('jobs')
-    query = jobs_ref.where('poster_id', '==', user_id)
+    return count_documents(db, 'jobs', {'poster_id': user_id})
+
+
+async def count_user_jobs_async(db: firestore_async.AsyncClient, user_id: str) -> int:
+    """Count the total number of job postings by a specific user."""
+    return await count_documents_async(db, 'jobs', {'poster_id': user_id})
+
+
+# Search functions
+def salary_buckets(salary_min: Optional[float], salary_max: Optional[float]) -> List[str]:
+    """Get the labels of the salary buckets a salary range overlaps."""
+    if salary_min is None and salary_max is None:
+        return []
+    
+    low = salary_min if salary_min is not None else salary_max
+    high = salary_max if salary_max is not None else salary_min
+    return [
+        label for label, bucket_min, bucket_max in SALARY_BUCKETS
+        if high >= bucket_min and (bucket_max is None or low < bucket_max)
+    ]
+
+
+def _job_search_document(job: Job) -> Tuple[str, Dict[str, Optional[str]], Dict[str, Any]]:
+    fields = {
+        "title": job.title,
+        "company_name": job.company_name,
+        "description": job.description,
+        "location": job.location
+    }
+    meta = {
+        "poster_id": job.poster_id,
+        "job_type": job.job_type,
+        "is_remote": bool(job.is_remote),
+        "is_active": bool(job.is_active),
+        "salary_min": job.salary_min,
+        "salary_max": job.salary_max,
+        "salary_buckets": salary_buckets(job.salary_min, job.salary_max),
+        "created_at": timestamp(job.created_at),
+        "modified_at": timestamp(job.updated_at or job.created_at)
+    }
+    return job.job_id, fields, meta
+
+
+def _iter_job_search_documents(db: firestore.Client, since: Optional[float] = None):
+    if since is None:
+        docs = db.collection('jobs').stream()
+    else:
+        docs = iter_modified_documents(db.collection('jobs'), datetime.fromtimestamp(since, tz=timezone.utc))
+    for doc in docs:
+        yield _job_search_document(Job.from_dict(doc.to_dict(), doc.id))
+
+
+def _new_job_index(db: firestore.Client) -> InvertedIndex:
+    return InvertedIndex(JOB_INDEX_PATH, field_weights=JOB_FIELD_WEIGHTS,
+                         flush_threshold=settings.SEARCH_INDEX_FLUSH_THRESHOLD,
+                         source=lambda since: _iter_job_search_documents(db, since),
+                         flush_interval=settings.SEARCH_INDEX_FLUSH_INTERVAL_SECONDS)
+
+
+def get_job_index(db: firestore.Client) -> InvertedIndex:
+    """Get the process-wide job search index, loading or building it on first use."""
+    global _job_index
+    
+    with _job_index_lock:
+        if _job_index is None:
+            index = _new_job_index(db)
+            if not index.load():
+                count = index.rebuild()
+                logger.info(f"Built job search index with {count} jobs")
+            _job_index = index
+    
+    return _job_index
+
+
+def index_job(db: firestore.Client, job: Job) -> None:
+    """Add or replace a job in the search index."""
+    doc_id, fields, meta = _job_search_document(job)
+    get_job_index(db).add(doc_id, fields, meta)
+
+
+def rebuild_job_index(db: firestore.Client) -> int:
+    """Rebuild the job search index from the jobs collection."""
+    global _job_index
+    
+    with _job_index_lock:
+        if _job_index is None:
+            _job_index = _new_job_index(db)
+        return _job_index.rebuild()
+
+
+def _job_filter(job_type: Optional[str] = None, is_remote: Optional[bool] = None,
+                min_salary: Optional[float] = None, max_salary: Optional[float] = None,
+                salary_range: Optional[str] = None):
+    """Build a metadata predicate for the faceted job filters."""
+    def matches(meta: Dict[str, Any]) -> bool:
+        if job_type and meta.get('job_type') != job_type:
+            return False
+        
+        if is_remote is not None and meta.get('is_remote') != is_remote:
+            return False
+        
+        if salary_range and salary_range not in meta.get('salary_buckets', []):
+            return False
+        
+        # A job matches a salary range if its own range overlaps it
+        upper = meta.get('salary_max') if meta.get('salary_max') is not None else meta.get('salary_min')
+        lower = meta.get('salary_min') if meta.get('salary_min') is not None else meta.get('salary_max')
+        if min_salary is not None and (upper is None or upper < min_salary):
+            return False
+        if max_salary is not None and (lower is None or lower > max_salary):
+            return False
+        
+        return True
     
-    return len(query.get())
+    return matches
 
 
 def search_jobs(db: firestore.Client, query: Optional[str] = None, location: Optional[str] = None,
                 job_type: Optional[str] = None, is_remote: Optional[bool] = None,
                 min_salary: Optional[float] = None, max_salary: Optional[float] = None,
-                skip: int = 0, limit: int = 100) -> List[Job]:
-    """Search for jobs with various filters."""
-    jobs_ref = db.collection('jobs')
-    query = jobs_ref.order_by('created_at', direction=firestore.Query.DESCENDING)
-    
-    # Apply filters
-    if query:
-        search_term = f"%{query}%"
-        query = query.where('title', '>=', search_term).where('title', '<=', search_term)
-    
-    if location:
-        search_location = f"%{location}%"
-        query = query.where('location', '>=', search_location).where('location', '<=', search_location)
-    
-    if job_type:
-        query = query.where('job_type', '==', job_type)
-    
-    if is_remote is not None:
-        query = query.where('is_remote', '==', is_remote)
-    
-    if min_salary is not None:
-        query = query.where('salary_max', '>=', min_salary)
-    
-    if max_salary is not None:
-        query = query.where('salary_min', '<=', max_salary)
-    
-    # Apply pagination
-    if skip > 0:
-        query = query.offset(skip)
-    if limit > 0:
-        query = query.limit(limit)
-    
-    docs = query.get()
-    jobs = [Job.from_dict(doc.to_dict()) for doc in docs]
-    
-    # Apply search filter if provided
-    if query:
-        search_query = query.to_dict()['title'].lower()
-        jobs = [
-            job for job in jobs
-            if search_query in job.title.lower() or
-               search_query in job.description.lower() or
-               search_query in job.location.lower()
-        ]
+                salary_range: Optional[str] = None, sort: Optional[str] = None,
+                skip: int = 0, limit: int = 100,
+                fields: Optional[List[str]] = None) -> Tuple[List[JobSummary], int, Dict[str, Dict[Any, int]]]:
+    """Search for jobs with various filters.
+    
+    Returns the requested page, the total number of matches and facet counts
+    for job_type, is_remote and salary_buckets, all from one index pass.
+    Results are ordered by relevance when there is a query and by recency
+    otherwise, unless sort says differently. Jobs are projected like get_jobs.
+    """
+    index, results = _search_job_index(db, query, location, job_type, is_remote, min_salary, max_salary,
+                                       salary_range, sort, skip, limit)
+    
+    docs, missing_ids = get_many(db, 'jobs', [job_id for job_id, _ in results.hits],
+                                 field_paths=fields or JobSummary.FIELDS)
+    
+    # Drop hits for jobs deleted through another process
+    for job_id in missing_ids:
+        index.remove(job_id)
+    
+    return list_items(docs, JobSummary, 'job_id', fields), results.total, results.facets
+
+
+async def search_jobs_async(db: firestore_async.AsyncClient, query: Optional[str] = None,
+                            location: Optional[str] = None, job_type: Optional[str] = None,
+                            is_remote: Optional[bool] = None, min_salary: Optional[float] = None,
+                            max_salary: Optional[float] = None, salary_range: Optional[str] = None,
+                            sort: Optional[str] = None, skip: int = 0, limit: int = 100,
+                            fields: Optional[List[str]] = None) -> Tuple[List[JobSummary], int, Dict[str, Dict[Any, int]]]:
+    """search_jobs for the async client.
+    
+    The index pass stays on a worker thread, since the first search in a
+    process loads the index and searches can flush it; only the job reads
+    are awaited.
+    """
+    index, results = await anyio.to_thread.run_sync(
+        _search_job_index, get_db(), query, location, job_type, is_remote, min_salary, max_salary,
+        salary_range, sort, skip, limit
+    )
     
-    return jobs
+    docs, missing_ids = await get_many_async(db, 'jobs', [job_id for job_id, _ in results.hits],
+                                             field_paths=fields or JobSummary.FIELDS)
+    
+    # Drop hits for jobs deleted through another process
+    for job_id in missing_ids:
+        index.remove(job_id)
+    
+    return list_items(docs, JobSummary, 'job_id', fields), results.total, results.facets
+
+
+def _search_job_index(db: firestore.Client, query: Optional[str], location: Optional[str],
+                      job_type: Optional[str], is_remote: Optional[bool], min_salary: Optional[float],
+                      max_salary: Optional[float], salary_range: Optional[str], sort: Optional[str],
+                      skip: int, limit: int):
+    if sort is None:
+        sort = 'relevance' if query else 'recency'
+    sort_key = (lambda meta: meta.get('created_at', 0)) if sort == 'recency' else None
+    
+    index = get_job_index(db)
+    return index, index.search(
+        query,
+        field_queries={"location": location} if location else None,
+        filter=_job_filter(job_type, is_remote, min_salary, max_salary, salary_range),
+        facets=JOB_FACETS,
+        sort_key=sort_key,
+        skip=skip,
+        limit=limit
+    )
 
 
 def count_search_jobs(db: firestore.Client, query: Optional[str] = None, location: Optional[str] = None,
                       job_type: Optional[str] = None, is_remote: Optional[bool] = None,
-                      min_salary: Optional[float] = None, max_salary: Optional[float] = None) -> int:
+                      min_salary: Optional[float] = None, max_salary: Optional[float] = None,
+                      salary_range: Optional[str] = None) -> int:
     """Count the number of jobs matching the search criteria."""
-    jobs_ref = db.collection('jobs')
-    query = jobs_ref
-    
-    # Apply filters
-    if query:
-        search_term = f"%{query}%"
-        query = query.where('title', '>=', search_term).where('title', '<=', search_term)
-    
-    if location:
-        search_location = f"%{location}%"
-        query = query.where('location', '>=', search_location).where('location', '<=', search_location)
-    
-    if job_type:
-        query = query.where('job_type', '==', job_type)
-    
-    if is_remote is not None:
-        query = query.where('is_remote', '==', is_remote)
-    
-    if min_salary is not None:
-        query = query.where('salary_max', '>=', min_salary)
-    
-    if max_salary is not None:
-        query = query.where('salary_min', '<=', max_salary)
-    
-    return len(query.get())
+    return search_jobs(db, query, location, job_type, is_remote, min_salary, max_salary,
+                       salary_range, limit=0)[1]
 
 
 # Job application functions
@@ -265,23 +448,11 @@ def create_job_application(db: firestore.Client, applicant_id: str, application_
     
     # Set the application ID
     db_application.application_id = application_id
+    invalidate_counts('job_applications', db_application.to_dict())
 
-    # Create notification for job poster
-    applicant = get_user(db, applicant_id)
-
-    notification_id = str(uuid.uuid4())
-    notification = Notification(
-        user_id=job.poster_id,
-        type="job_application",
-        message=f"{applicant.first_name} {applicant.last_name} applied for your job posting: {job.title}",
-        source_id=application_id,
-        source_type="job_application",
-        created_by=applicant_id
-    )
-
-    # Add notification to Firestore
-    notification_ref = db.collection('notifications').document(notification_id)
-    notification_ref.set(notification.to_dict())
+    # Notify the job poster; applications to the same job share one notification
+    coalesce_notification(db, job.poster_id, applicant_id, "job_application",
+                          f"applied for your job posting: {job.title}", application_data.job_id, "job")
 
     return db_application
 
@@ -310,7 +481,6 @@ def update_job_application_status(db: firestore.Client, application_id: str, use
     # Create notification for applicant
     employer = get_user(db, user_id)
 
-    notification_id = str(uuid.uuid4())
     notification_message = f"Your application for {job.title} has been {application_data.status}"
 
     notification = Notification(
@@ -323,14 +493,13 @@ def update_job_application_status(db: firestore.Client, application_id: str, use
     )
 
     # Add notification to Firestore
-    notification_ref = db.collection('notifications').document(notification_id)
-    notification_ref.set(notification.to_dict())
+    create_notification(db, notification)
 
     return db_application
 
 
-def get_job_applications(db: firestore.Client, job_id: str, user_id: str, skip: int = 0, limit: int = 50) -> List[
-    JobApplication]:
+def get_job_applications(db: firestore.Client, job_id: str, user_id: str, skip: int = 0, limit: int = 50,
+                         cursor: Optional[str] = None) -> List[JobApplication]:
     """Get all applications for a job."""
     # Check if user is the job poster
     job = get_job(db, job_id)
@@ -344,10 +513,7 @@ def get_job_applications(db: firestore.Client, job_id: str, user_id: str, skip:
     query = applications_ref.where('job_id', '==', job_id).order_by('created_at', direction=firestore.Query.DESCENDING)
     
     # Apply pagination
-    if skip > 0:
-        query = query.offset(skip)
-    if limit > 0:
-        query = query.limit(limit)
+    query = paginate_query(query, skip, limit, cursor)
     
     docs = query.get()
     applications = [JobApplication.from_dict(doc.to_dict(), doc.id) for doc in docs]
@@ -364,24 +530,18 @@ def count_job_applications(db: firestore.Client, job_id: str, user_id: str) -> i
 
     if job.poster_id != user_id:
         raise HTTPException(status_code=403, detail="Not authorized to view these applications")
-        
-    applications_ref = db.collection('job_applications')
-    query = applications_ref.where('job_id', '==', job_id)
-    docs = query.get()
     
-    return len(docs)
+    return count_documents(db, 'job_applications', {'job_id': job_id})
 
 
-def get_user_applications(db: firestore.Client, user_id: str, skip: int = 0, limit: int = 50) -> List[JobApplication]:
+def get_user_applications(db: firestore.Client, user_id: str, skip: int = 0, limit: int = 50,
+                          cursor: Optional[str] = None) -> List[JobApplication]:
     """Get all job applications by a specific user."""
     applications_ref = db.collection('job_applications')
     query = applications_ref.where('applicant_id', '==', user_id).order_by('created_at', direction=firestore.Query.DESCENDING)
     
     # Apply pagination
-    if skip > 0:
-        query = query.offset(skip)
-    if limit > 0:
-        query = query.limit(limit)
+    query = paginate_query(query, skip, limit, cursor)
     
     docs = query.get()
     applications = [JobApplication.from_dict(doc.to_dict(), doc.id) for doc in docs]
@@ -391,11 +551,7 @@ def get_user_applications(db: firestore.Client, user_id: str, skip: int = 0, lim
 
 def count_user_applications(db: firestore.Client, user_id: str) -> int:
     """Count the total number of job applications by a specific user."""
-    applications_ref = db.collection('job_applications')
-    query = applications_ref.where('applicant_id', '==', user_id)
-    docs = query.get()
-    
-    return len(docs)
+    return count_documents(db, 'job_applications', {'applicant_id': user_id})
 
 
 # Saved job functions
@@ -416,11 +572,9 @@ def save_job(db: firestore.Client, user_id: str, job_id: str) -> Optional[SavedJ
     
     # Create new saved job
     saved_job = SavedJob(user_id=user_id, job_id=job_id)
-    doc_ref = saved_jobs_ref.add(saved_job.to_dict())[1]
-    
-    # Get the created document
-    doc = doc_ref.get()
-    return SavedJob.from_dict(doc.to_dict())
+    saved_job_id, data = add_document(saved_jobs_ref, saved_job.to_dict())
+    invalidate_counts('saved_jobs', data)
+    return SavedJob.from_dict(data, saved_job_id)
 
 
 def unsave_job(db: firestore.Client, user_id: str, job_id: str) -> bool:
@@ -434,39 +588,59 @@ def unsave_job(db: firestore.Client, user_id: str, job_id: str) -> bool:
     
     # Delete the saved job
     docs[0].reference.delete()
+    invalidate_counts('saved_jobs', docs[0].to_dict())
     return True
 
 
-def get_saved_jobs(db: firestore.Client, user_id: str, skip: int = 0, limit: int = 100) -> List[Job]:
-    """Get all saved jobs for a user."""
+def get_saved_jobs(db: firestore.Client, user_id: str, skip: int = 0, limit: int = 100,
+                   cursor: Optional[str] = None) -> Tuple[List[Job], Optional[str]]:
+    """Get all saved jobs for a user.
+    
+    Also returns the cursor of the next page, taken from the last saved-job
+    row scanned so rows of deleted jobs do not end pagination early.
+    """
     saved_jobs_ref = db.collection('saved_jobs')
     query = saved_jobs_ref.where('user_id', '==', user_id).order_by('created_at', direction=firestore.Query.DESCENDING)
     
     # Apply pagination
-    if skip > 0:
-        query = query.offset(skip)
-    if limit > 0:
-        query = query.limit(limit)
+    query = paginate_query(query, skip, limit, cursor)
     
     docs = query.get()
-    saved_jobs = [SavedJob.from_dict(doc.to_dict()) for doc in docs]
+    saved_jobs = [SavedJob.from_dict(doc.to_dict(), doc.id) for doc in docs]
+    
+    # Get the actual jobs in a single round trip
+    job_docs, missing_ids = get_many(db, 'jobs', [saved_job.job_id for saved_job in saved_jobs])
+    jobs_by_id = {doc.id: Job.from_dict(doc.to_dict(), doc.id) for doc in job_docs}
     
-    # Get the actual jobs
     jobs = []
     for saved_job in saved_jobs:
-        job = get_job(db, saved_job.job_id)
+        job = jobs_by_id.get(saved_job.job_id)
         if job:
+            job.saved_job_id = saved_job.saved_job_id
+            job.saved_at = saved_job.created_at
             jobs.append(job)
     
-    return jobs
+    # Lazily clean up saved-job rows whose job has been deleted
+    if missing_ids:
+        missing = set(missing_ids)
+        writes = BatchedWrites(db)
+        for saved_job in saved_jobs:
+            if saved_job.job_id in missing:
+                writes.delete(saved_jobs_ref.document(saved_job.saved_job_id))
+        writes.flush()
+        invalidate_counts('saved_jobs', {'user_id': user_id})
+        logger.info(f"Removed {writes.committed} stale saved jobs for user {user_id}")
+    
+    next_cursor = None
+    if limit > 0 and len(saved_jobs) >= limit:
+        next_cursor = encode_cursor(saved_jobs[-1].created_at, saved_jobs[-1].saved_job_id)
+    
+    return jobs, next_cursor
 
 
 def count_saved_jobs(db: firestore.Client, user_id: str) -> int:
     """Count the total number of saved jobs for a user."""
-    saved_jobs_ref = db.collection('saved_jobs')
-    query = saved_jobs_ref.where('user_id', '==', user_id)
-    
-    return len(query.get())
+    return count_documents(db, 'saved_jobs', {'user_id': user_id})
 
 
 def is_job_saved(db: firestore.Client, user_id: str, job_id: str) -> bool:
@@ -484,4 +658,30 @@ def is_job_applied(db: firestore.Client, user_id: str, job_id: str) -> bool:
     query = applications_ref.where('job_id', '==', job_id).where('applicant_id', '==', user_id)
     docs = query.get()
     
-    return len(docs) > 0
\ No newline at end of file
+    return len(docs) > 0
+
+
+async def get_job_flags_async(db: firestore_async.AsyncClient, user_id: str,
+                              job_ids: List[str]) -> Tuple[set, set]:
+    """IDs among job_ids that a user has saved and applied to, read in batches rather than per job."""
+    # Firestore caps "in" filters at 30 values
+    chunks = [job_ids[i:i + 30] for i in range(0, len(job_ids), 30)]
+    saved_queries = [
+        db.collection('saved_jobs').where('user_id', '==', user_id).where('job_id', 'in', chunk).select(['job_id'])
+        for chunk in chunks
+    ]
+    applied_queries = [
+        db.collection('job_applications').where('applicant_id', '==', user_id).where('job_id', 'in', chunk)
+        .select(['job_id'])
+        for chunk in chunks
+    ]
+    
+    pages = await asyncio.gather(*(query.get() for query in saved_queries + applied_queries))
+    saved_ids = {doc.get('job_id') for docs in pages[:len(chunks)] for doc in docs}
+    applied_ids = {doc.get('job_id') for docs in pages[len(chunks):] for doc in docs}
+    return saved_ids, applied_ids
+
+
+async def count_applications_async(db: firestore_async.AsyncClient, job_id: str) -> int:
+    """Count the applications for a job; callers check that the user is its poster."""
+    return await count_documents_async(db, 'job_applications', {'job_id': job_id})
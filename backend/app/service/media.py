@@ -0,0 +1,160 @@
+from datetime import datetime
+from typing import Any, Dict, Optional
+import logging
+import os
+import uuid
+from firebase_admin import firestore
+
+from app.config import settings
+from app.core.images import IMAGE_VARIANTS, generate_variants, get_image_pool
+from app.core.media_store import media_store, hash_file
+from app.core.tasks import task_queue
+from app.database import get_db
+from app.utils.helpers import delete_file, sniff_content_type
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# (collection, image field, variants field) of every stored image reference
+IMAGE_FIELDS = [
+    ('posts', 'image_url', 'image_variants'),
+    ('profiles', 'profile_image', 'profile_image_variants'),
+    ('profiles', 'cover_image', 'cover_image_variants'),
+]
+
+
+def schedule_image_variants(source_path: str, collection: str, document_id: str, field: str,
+                            variants_field: str) -> None:
+    """Generate variants of an uploaded image in the background and record them on its document."""
+    task_queue.enqueue(
+        "media.generate_variants",
+        source_path=source_path,
+        collection=collection,
+        document_id=document_id,
+        field=field,
+        variants_field=variants_field
+    )
+
+
+def delete_image(image_path: Optional[str], variants: Optional[Dict[str, Dict[str, Any]]] = None) -> None:
+    """Delete an uploaded image together with its generated variants.
+
+    Images in the media store own their variants and are only removed once
+    the last reference is released.
+    """
+    if image_path:
+        delete_file(image_path)
+        if media_store.is_managed(image_path):
+            return
+    for variant in (variants or {}).values():
+        delete_file(variant["path"])
+        delete_file(variant["webp"])
+
+
+@task_queue.task("media.generate_variants")
+def _generate_variants_task(source_path: str, collection: str, document_id: str, field: str,
+                            variants_field: str) -> None:
+    db = get_db()
+    managed = media_store.is_managed(source_path)
+
+    # Identical content uploaded before already has its variants
+    variants = media_store.get_variants(db, source_path) if managed else None
+    if variants is None:
+        variants = get_image_pool().submit(
+            generate_variants, source_path, settings.UPLOADS_DIR, IMAGE_VARIANTS, settings.IMAGE_QUALITY
+        ).result()
+        if managed and not media_store.set_variants(db, source_path, variants):
+            # The last reference went away while we were working
+            delete_image(None, variants)
+            return
+
+    doc_ref = db.collection(collection).document(document_id)
+    doc = doc_ref.get()
+
+    # The document was deleted or got a new image while we were working
+    if not doc.exists or doc.to_dict().get(field) != source_path:
+        if not managed:
+            delete_image(None, variants)
+        return
+
+    # Only write if nothing changed since the check above; otherwise retry
+    doc_ref.update({variants_field: variants}, option=db.write_option(last_update_time=doc.update_time))
+    logger.info(f"Recorded {len(variants)} variants for {collection}/{document_id}.{field}")
+
+
+def _adopt_legacy_file(db: firestore.Client, legacy_path: str) -> str:
+    """Add a file from the old flat layout to the media store and return its new path."""
+    full_path = os.path.join(settings.UPLOADS_DIR, legacy_path)
+
+    # Hand the store a hard link so the old file stays valid until the
+    # document points at the new path; a rerun can then pick up where it stopped
+    incoming_dir = os.path.join(settings.UPLOADS_DIR, ".incoming")
+    os.makedirs(incoming_dir, exist_ok=True)
+    staged_path = os.path.join(incoming_dir, f"backfill-{uuid.uuid4().hex}")
+    os.link(full_path, staged_path)
+
+    with open(full_path, "rb") as f:
+        content_type = sniff_content_type(f.read(16))
+
+    return media_store.add(db, staged_path, hash_file(full_path), os.path.splitext(legacy_path)[1].lower(), metadata={
+        "content_type": content_type,
+        "size": os.path.getsize(full_path),
+        "created_at": datetime.utcnow()
+    })
+
+
+def _adopt_legacy_variants(db: firestore.Client, path: str,
+                           legacy_variants: Optional[Dict[str, Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    """Give a stored image variants, reusing the legacy files where there are any."""
+    variants = media_store.get_variants(db, path)
+    if variants is not None:
+        return variants
+
+    if not legacy_variants:
+        variants = generate_variants(path, settings.UPLOADS_DIR, IMAGE_VARIANTS, settings.IMAGE_QUALITY)
+    else:
+        stem = os.path.splitext(path)[0]
+        variants = {}
+        for name, legacy in legacy_variants.items():
+            variant = dict(legacy)
+            for key in ('path', 'webp'):
+                variant[key] = f"{stem}_{name}{os.path.splitext(legacy[key])[1]}"
+                target = os.path.join(settings.UPLOADS_DIR, variant[key])
+                if not os.path.exists(target):
+                    os.link(os.path.join(settings.UPLOADS_DIR, legacy[key]), target)
+            variants[name] = variant
+
+    media_store.set_variants(db, path, variants)
+    return variants
+
+
+def backfill_media_store(db: firestore.Client) -> Dict[str, int]:
+    """Move images referenced from the old flat upload folders into the media store.
+
+    Documents are streamed one collection at a time and each file is hashed
+    in chunks, so memory use does not grow with the number or size of files.
+    """
+    stats = {"scanned": 0, "migrated": 0, "missing": 0}
+
+    for collection, field, variants_field in IMAGE_FIELDS:
+        for doc in db.collection(collection).stream():
+            data = doc.to_dict()
+            legacy_path = data.get(field)
+            if not legacy_path or media_store.is_managed(legacy_path):
+                continue
+            stats["scanned"] += 1
+
+            if not os.path.exists(os.path.join(settings.UPLOADS_DIR, legacy_path)):
+                logger.warning(f"Missing file for {collection}/{doc.id}.{field}: {legacy_path}")
+                stats["missing"] += 1
+                continue
+
+            path = _adopt_legacy_file(db, legacy_path)
+            variants = _adopt_legacy_variants(db, path, data.get(variants_field))
+            doc.reference.update({field: path, variants_field: variants})
+
+            # The document no longer points at the old files
+            delete_image(legacy_path, data.get(variants_field))
+            stats["migrated"] += 1
+
+    return stats
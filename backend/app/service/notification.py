@@ -1,110 +1,467 @@
-from typing import List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from datetime import datetime
+import logging
+import time
+import anyio
 from fastapi import HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from firebase_admin import firestore
+from firebase_admin import firestore, firestore_async
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition
 
+from app.config import settings
+from app.core.realtime import publish_to_user
+from app.core.tasks import task_queue
+from app.database import (
+    MAX_BATCH_SIZE, BulkWriter,
+    count_documents, count_documents_async, count_query,
+    get_db, invalidate_counts, iter_documents
+)
 from app.model.notification import Notification
-from app.schema.notification import NotificationUpdate
+from app.schema.notification import NotificationInDB, NotificationUpdate
+from app.utils.helpers import list_items, paginate_query
 
+# Configure logging
+logger = logging.getLogger(__name__)
 
-def get_notification(db: Session, notification_id: int) -> Notification:
+# Per-user unread counters, one document per user ID. Writes only ever
+# increment them, so a counter first created by a write starts from zero
+# rather than the user's real unread count; it is marked seeded once it
+# has been recounted, and reads recount counters that are not.
+COUNTERS_COLLECTION = 'notification_counters'
+RECONCILE_ATTEMPTS = 5
+
+# Pointers from a (user, type, source) key to the notification it is
+# currently being coalesced into
+GROUPS_COLLECTION = 'notification_groups'
+
+# Progress of mass updates running in the background
+BULK_JOBS_COLLECTION = 'notification_jobs'
+
+# Socket events pushed to a user's room. New and updated notifications are
+# sent whole; every change to the badge is sent as an unread delta.
+NOTIFICATION_EVENT = 'notification'
+UNREAD_COUNT_EVENT = 'unread_count_changed'
+
+
+def get_notification(db: firestore.Client, notification_id: str) -> Notification:
     """Get a notification by ID."""
-    notification = db.query(Notification).filter(Notification.id == notification_id).first()
-    if not notification:
+    doc = db.collection('notifications').document(notification_id).get()
+    if not doc.exists:
         raise HTTPException(status_code=404, detail="Notification not found")
+    return Notification.from_dict(doc.to_dict(), doc.id)
+
+
+def unread_counter_ref(db: firestore.Client, user_id: str):
+    """Reference to a user's unread-notification counter document."""
+    return db.collection(COUNTERS_COLLECTION).document(user_id)
+
+
+def unread_counter_update(delta: int) -> Dict[str, Any]:
+    """Data to merge into a counter document to change it by delta."""
+    return {'unread': firestore.Increment(delta), 'updated_at': datetime.utcnow()}
+
+
+def publish_notification(notification: Notification, unread_delta: int = 0) -> None:
+    """Push a stored notification, and how it changed the unread count, to its recipient's clients."""
+    payload = NotificationInDB(
+        notification_id=notification.notification_id, **notification.to_dict()
+    ).model_dump(mode='json')
+    publish_to_user(notification.user_id, NOTIFICATION_EVENT, payload)
+    publish_unread_delta(notification.user_id, unread_delta)
+
+
+def publish_unread_delta(user_id: str, delta: int) -> None:
+    """Tell a user's connected clients their unread count changed by delta."""
+    if delta:
+        publish_to_user(user_id, UNREAD_COUNT_EVENT, {'delta': delta})
+
+
+def create_notification(db: firestore.Client, notification: Notification) -> Notification:
+    """Store a notification, bump the recipient's unread counter and drop their cached counts."""
+    doc_ref = db.collection('notifications').document()
+    
+    # The notification and the counter change commit together
+    batch = db.batch()
+    batch.set(doc_ref, notification.to_dict())
+    if not notification.is_read:
+        batch.set(unread_counter_ref(db, notification.user_id), unread_counter_update(1), merge=True)
+    batch.commit()
+    
+    notification.notification_id = doc_ref.id
+    invalidate_counts('notifications', notification.to_dict())
+    publish_notification(notification, 0 if notification.is_read else 1)
     return notification
 
 
-def get_user_notifications(db: Session, user_id: int, skip: int = 0, limit: int = 20) -> List[Notification]:
-    """Get all notifications for a user."""
-    return db.query(Notification).filter(
-        Notification.user_id == user_id
-    ).order_by(desc(Notification.created_at)).offset(skip).limit(limit).all()
+def _actor(db: firestore.Client, actor_id: str) -> Dict[str, str]:
+    """The ID and display name of the user who caused a notification."""
+    actor_doc = db.collection('users').document(actor_id).get()
+    actor = actor_doc.to_dict() if actor_doc.exists else {}
+    actor_name = f"{actor.get('first_name', '')} {actor.get('last_name', '')}".strip() or "Someone"
+    return {'id': actor_id, 'name': actor_name}
+
+
+def coalesced_message(actors: List[Dict[str, str]], actor_count: int, action: str) -> str:
+    """Describe a group of actors, e.g. "Ana and 41 others liked your post"."""
+    if actor_count <= 1:
+        return f"{actors[0]['name']} {action}"
+    if actor_count == 2 and len(actors) >= 2:
+        return f"{actors[0]['name']} and {actors[1]['name']} {action}"
+    others = actor_count - 1
+    return f"{actors[0]['name']} and {others} other{'s' if others != 1 else ''} {action}"
+
+
+def notify_user(db: firestore.Client, user_id: str, actor_id: str, notification_type: str, action: str,
+                source_id: str, source_type: str) -> Notification:
+    """Notify a user about an action another user took, e.g. "Jane Doe liked your post"."""
+    actor = _actor(db, actor_id)
+    notification = Notification(
+        user_id=user_id,
+        type=notification_type,
+        message=coalesced_message([actor], 1, action),
+        source_id=source_id,
+        source_type=source_type,
+        created_by=actor_id,
+        actors=[actor]
+    )
+    return create_notification(db, notification)
+
+
+def coalesce_notification(db: firestore.Client, user_id: str, actor_id: str, notification_type: str,
+                          action: str, source_id: str, source_type: str) -> Notification:
+    """Fold an action into the user's open notification for the same type and source.
+
+    Within NOTIFICATION_COALESCE_WINDOW_SECONDS of a group being opened, more
+    actions on the same source update one rolling document, e.g. "Ana and 41
+    others liked your post", instead of adding one each. The document moves
+    back to the top and becomes unread again; the unread counter only
+    changes when it was read.
+    """
+    actor = _actor(db, actor_id)
+    notifications_ref = db.collection('notifications')
+    group_ref = db.collection(GROUPS_COLLECTION).document(f"{user_id}_{notification_type}_{source_id}")
+    counter_ref = unread_counter_ref(db, user_id)
+    
+    @firestore.transactional
+    def _coalesce(transaction) -> Tuple[Notification, int]:
+        now = time.time()
+        group_doc = group_ref.get(transaction=transaction)
+        current_doc = None
+        if group_doc.exists and group_doc.get('expires_at') > now:
+            current_doc = notifications_ref.document(group_doc.get('notification_id')).get(transaction=transaction)
+        
+        # No open group, or its notification was deleted: start a new one
+        if current_doc is None or not current_doc.exists:
+            notification_ref = notifications_ref.document()
+            notification = Notification(
+                user_id=user_id,
+                type=notification_type,
+                message=coalesced_message([actor], 1, action),
+                source_id=source_id,
+                source_type=source_type,
+                created_by=actor_id,
+                notification_id=notification_ref.id,
+                actors=[actor]
+            )
+            transaction.set(notification_ref, notification.to_dict())
+            transaction.set(group_ref, {
+                'notification_id': notification_ref.id,
+                'expires_at': now + settings.NOTIFICATION_COALESCE_WINDOW_SECONDS
+            })
+            transaction.set(counter_ref, unread_counter_update(1), merge=True)
+            return notification, 1
+        
+        notification = Notification.from_dict(current_doc.to_dict(), current_doc.id)
+        # A repeat actor moves to the front of the sample without being counted again
+        sampled = any(sample['id'] == actor_id for sample in notification.actors)
+        others = [sample for sample in notification.actors if sample['id'] != actor_id]
+        notification.actors = [actor] + others[:settings.NOTIFICATION_ACTOR_SAMPLE_SIZE - 1]
+        if not sampled:
+            notification.actor_count += 1
+        notification.message = coalesced_message(notification.actors, notification.actor_count, action)
+        notification.created_by = actor_id
+        notification.created_at = datetime.utcnow()
+        
+        delta = 1 if notification.is_read else 0
+        notification.is_read = False
+        transaction.update(current_doc.reference, {
+            'actors': notification.actors,
+            'actor_count': notification.actor_count,
+            'message': notification.message,
+            'created_by': notification.created_by,
+            'created_at': notification.created_at,
+            'is_read': False
+        })
+        if delta:
+            transaction.set(counter_ref, unread_counter_update(delta), merge=True)
+        return notification, delta
+    
+    notification, delta = _coalesce(db.transaction())
+    if delta:
+        invalidate_counts('notifications', notification.to_dict())
+    publish_notification(notification, delta)
+    return notification
+
+
+def _user_notifications_query(db, user_id: str, skip: int, limit: int, cursor: Optional[str],
+                              fields: Optional[List[str]] = None):
+    notifications_ref = db.collection('notifications')
+    query = notifications_ref.where('user_id', '==', user_id).order_by(
+        'created_at', direction=firestore.Query.DESCENDING
+    )
+    if fields:
+        query = query.select(fields)
+    
+    # Apply pagination
+    return paginate_query(query, skip, limit, cursor)
+
+
+def get_user_notifications(db: firestore.Client, user_id: str, skip: int = 0, limit: int = 20,
+                           cursor: Optional[str] = None, fields: Optional[List[str]] = None) -> List[Notification]:
+    """Get all notifications for a user, as dicts of just the given fields if there are any."""
+    docs = _user_notifications_query(db, user_id, skip, limit, cursor, fields).get()
+    return list_items(docs, Notification, 'notification_id', fields)
+
+
+async def get_user_notifications_async(db: firestore_async.AsyncClient, user_id: str, skip: int = 0,
+                                       limit: int = 20, cursor: Optional[str] = None,
+                                       fields: Optional[List[str]] = None) -> List[Notification]:
+    """Get all notifications for a user, as dicts of just the given fields if there are any."""
+    docs = await _user_notifications_query(db, user_id, skip, limit, cursor, fields).get()
+    return list_items(docs, Notification, 'notification_id', fields)
 
 
-def count_user_notifications(db: Session, user_id: int) -> int:
+def count_user_notifications(db: firestore.Client, user_id: str) -> int:
     """Count the total number of notifications for a user."""
-    return db.query(Notification).filter(Notification.user_id == user_id).count()
+    return count_documents(db, 'notifications', {'user_id': user_id})
 
 
-def count_unread_notifications(db: Session, user_id: int) -> int:
-    """Count the number of unread notifications for a user."""
-    return db.query(Notification).filter(
-        (Notification.user_id == user_id) &
-        (Notification.is_read == False)
-    ).count()
+async def count_user_notifications_async(db: firestore_async.AsyncClient, user_id: str) -> int:
+    """Count the total number of notifications for a user."""
+    return await count_documents_async(db, 'notifications', {'user_id': user_id})
 
 
-def mark_notification_as_read(db: Session, notification_id: int, user_id: int) -> Notification:
-    """Mark a notification as read."""
-    db_notification = get_notification(db, notification_id)
+def _is_seeded(counter_doc) -> bool:
+    return counter_doc.exists and bool(counter_doc.to_dict().get('seeded'))
 
-    # Check if notification belongs to user
-    if db_notification.user_id != user_id:
-        raise HTTPException(status_code=403, detail="Not authorized to update this notification")
 
-    # Update notification
-    db_notification.is_read = True
-    db.commit()
-    db.refresh(db_notification)
+def count_unread_notifications(db: firestore.Client, user_id: str) -> int:
+    """Count the number of unread notifications for a user from their counter document."""
+    counter_doc = unread_counter_ref(db, user_id).get()
+    if not _is_seeded(counter_doc):
+        # First read for this user: seed the counter from the notifications
+        return reconcile_unread_counter(db, user_id)
+    return max(counter_doc.get('unread') or 0, 0)
 
-    return db_notification
 
+async def count_unread_notifications_async(db: firestore_async.AsyncClient, user_id: str) -> int:
+    """Count the number of unread notifications for a user from their counter document."""
+    counter_doc = await unread_counter_ref(db, user_id).get()
+    if not _is_seeded(counter_doc):
+        # Seeding happens once per user; it reuses the synchronous path on a worker thread
+        return await anyio.to_thread.run_sync(reconcile_unread_counter, get_db(), user_id)
+    return max(counter_doc.get('unread') or 0, 0)
 
-def mark_all_notifications_as_read(db: firestore.Client, user_id: str) -> int:
-    """Mark all notifications for a user as read."""
-    notifications_ref = db.collection('notifications')
-    query = notifications_ref.where('user_id', '==', user_id).where('is_read', '==', False)
+
+def reconcile_unread_counter(db: firestore.Client, user_id: str) -> int:
+    """Recount a user's unread notifications and store the result in their counter.
     
-    # Get all unread notifications
-    docs = query.get()
-    count = 0
+    The counter is read before the count and only written if it has not
+    changed since, so increments that commit during the count are never
+    overwritten; on a conflict the count is retried.
+    """
+    query = db.collection('notifications').where('user_id', '==', user_id).where('is_read', '==', False)
+    counter_ref = unread_counter_ref(db, user_id)
     
-    # Update each notification
-    batch = db.batch()
-    for doc in docs:
-        batch.update(doc.reference, {'is_read': True})
-        count += 1
+    for _ in range(RECONCILE_ATTEMPTS):
+        counter_doc = counter_ref.get()
+        unread = count_query(query)
+        if _is_seeded(counter_doc) and counter_doc.get('unread') == unread:
+            return unread
+        
+        data = {'unread': unread, 'seeded': True, 'updated_at': datetime.utcnow()}
+        try:
+            if counter_doc.exists:
+                counter_ref.update(data, option=db.write_option(last_update_time=counter_doc.update_time))
+            else:
+                counter_ref.create(data)
+            return unread
+        except (AlreadyExists, FailedPrecondition):
+            # A notification write changed the counter mid-count; count again
+            continue
     
-    # Commit the batch
-    if count > 0:
-        batch.commit()
+    logger.warning(f"Gave up reconciling unread counter for {user_id} after {RECONCILE_ATTEMPTS} conflicts")
+    return unread
+
+
+def reconcile_unread_counters(db: firestore.Client) -> Dict[str, int]:
+    """Repair drift in every user's unread counter."""
+    stats = {'counters': 0, 'repaired': 0}
+    for counter_doc in db.collection(COUNTERS_COLLECTION).stream():
+        stats['counters'] += 1
+        stored = counter_doc.get('unread')
+        if reconcile_unread_counter(db, counter_doc.id) != stored:
+            logger.info(f"Repaired unread counter for {counter_doc.id} (was {stored})")
+            stats['repaired'] += 1
+    return stats
+
+
+def mark_notification_as_read(db: firestore.Client, notification_id: str, user_id: str) -> Notification:
+    """Mark a notification as read."""
+    notification_ref = db.collection('notifications').document(notification_id)
     
-    return count
+    @firestore.transactional
+    def _mark(transaction) -> Dict[str, Any]:
+        doc = notification_ref.get(transaction=transaction)
+        if not doc.exists:
+            raise HTTPException(status_code=404, detail="Notification not found")
+        
+        # Check if notification belongs to user
+        data = doc.to_dict()
+        if data['user_id'] != user_id:
+            raise HTTPException(status_code=403, detail="Not authorized to update this notification")
+        
+        if not data.get('is_read'):
+            transaction.update(notification_ref, {'is_read': True})
+            transaction.set(unread_counter_ref(db, user_id), unread_counter_update(-1), merge=True)
+        return data
+    
+    data = _mark(db.transaction())
+    invalidate_counts('notifications', data)
+    if not data.get('is_read'):
+        publish_unread_delta(user_id, -1)
+    data['is_read'] = True
+    return Notification.from_dict(data, notification_id)
 
 
-def delete_notification(db: Session, notification_id: int, user_id: int) -> bool:
-    """Delete a notification."""
-    db_notification = get_notification(db, notification_id)
+def _bulk_apply(db: firestore.Client, user_id: str, query, update: Optional[Dict[str, Any]] = None,
+                on_progress: Optional[Callable[[int], None]] = None) -> int:
+    """Update every document a query matches, or delete them without an update.
+
+    The query is read page by page and written through a BulkWriter, so
+    memory stays bounded however large the inbox is. Each batch keeps one
+    slot for its own counter change, and connected clients hear about that
+    change once the batch commits. Returns the number of documents written.
+    """
+    delta = 0
+    
+    def _seal(batch) -> Optional[Callable[[], None]]:
+        nonlocal delta
+        batch_delta, delta = delta, 0
+        if not batch_delta:
+            return None
+        batch.set(unread_counter_ref(db, user_id), unread_counter_update(batch_delta), merge=True)
+        return lambda: publish_unread_delta(user_id, batch_delta)
+    
+    chunk_size = MAX_BATCH_SIZE - 1
+    writer = BulkWriter(db, chunk_size, before_commit=_seal, on_progress=on_progress)
+    try:
+        for doc in iter_documents(query.select(['is_read']), chunk_size):
+            # Count the change before the write, which may seal the batch
+            if not doc.get('is_read'):
+                delta -= 1
+            if update is None:
+                writer.delete(doc.reference)
+            else:
+                writer.update(doc.reference, update)
+    finally:
+        count = writer.close()
+    
+    if count > 0:
+        invalidate_counts('notifications', {'user_id': user_id, 'is_read': False})
+    return count
 
-    # Check if notification belongs to user
-    if db_notification.user_id != user_id:
-        raise HTTPException(status_code=403, detail="Not authorized to delete this notification")
 
-    db.delete(db_notification)
-    db.commit()
+def mark_all_notifications_as_read(db: firestore.Client, user_id: str,
+                                   on_progress: Optional[Callable[[int], None]] = None) -> int:
+    """Mark all notifications for a user as read."""
+    query = db.collection('notifications').where('user_id', '==', user_id).where('is_read', '==', False)
+    return _bulk_apply(db, user_id, query, {'is_read': True}, on_progress)
 
+
+def delete_notification(db: firestore.Client, notification_id: str, user_id: str) -> bool:
+    """Delete a notification."""
+    notification_ref = db.collection('notifications').document(notification_id)
+    
+    @firestore.transactional
+    def _delete(transaction) -> Dict[str, Any]:
+        doc = notification_ref.get(transaction=transaction)
+        if not doc.exists:
+            raise HTTPException(status_code=404, detail="Notification not found")
+        
+        # Check if notification belongs to user
+        data = doc.to_dict()
+        if data['user_id'] != user_id:
+            raise HTTPException(status_code=403, detail="Not authorized to delete this notification")
+        
+        transaction.delete(notification_ref)
+        if not data.get('is_read'):
+            transaction.set(unread_counter_ref(db, user_id), unread_counter_update(-1), merge=True)
+        return data
+    
+    data = _delete(db.transaction())
+    invalidate_counts('notifications', data)
+    if not data.get('is_read'):
+        publish_unread_delta(user_id, -1)
     return True
 
 
-def delete_all_notifications(db: firestore.Client, user_id: str) -> int:
+def delete_all_notifications(db: firestore.Client, user_id: str,
+                             on_progress: Optional[Callable[[int], None]] = None) -> int:
     """Delete all notifications for a user."""
-    notifications_ref = db.collection('notifications')
-    query = notifications_ref.where('user_id', '==', user_id)
+    query = db.collection('notifications').where('user_id', '==', user_id)
+    return _bulk_apply(db, user_id, query, None, on_progress)
+
+
+# Mass updates that run as background jobs for very large inboxes
+BULK_ACTIONS = {
+    'mark_all_as_read': mark_all_notifications_as_read,
+    'delete_all': delete_all_notifications,
+}
+
+
+def start_bulk_job(db: firestore.Client, user_id: str, action: str) -> str:
+    """Queue a mass update of a user's notifications and return the ID to follow its progress with."""
+    job_ref = db.collection(BULK_JOBS_COLLECTION).document()
+    now = datetime.utcnow()
+    job_ref.set({
+        'user_id': user_id,
+        'action': action,
+        'status': 'queued',
+        'processed': 0,
+        'created_at': now,
+        'updated_at': now
+    })
+    task_queue.enqueue("notification.bulk", job_id=job_ref.id, user_id=user_id, action=action)
+    return job_ref.id
+
+
+def get_bulk_job(db: firestore.Client, job_id: str, user_id: str) -> Dict[str, Any]:
+    """Get the progress of a user's mass update."""
+    doc = db.collection(BULK_JOBS_COLLECTION).document(job_id).get()
+    if not doc.exists:
+        raise HTTPException(status_code=404, detail="Job not found")
     
-    # Get all notifications
-    docs = query.get()
-    count = 0
+    data = doc.to_dict()
+    if data['user_id'] != user_id:
+        raise HTTPException(status_code=403, detail="Not authorized to view this job")
+    return {'job_id': job_id, **data}
+
+
+@task_queue.task("notification.bulk")
+def _bulk_task(job_id: str, user_id: str, action: str) -> None:
+    db = get_db()
+    job_ref = db.collection(BULK_JOBS_COLLECTION).document(job_id)
+    job_ref.update({'status': 'running', 'updated_at': datetime.utcnow()})
     
-    # Delete each notification
-    batch = db.batch()
-    for doc in docs:
-        batch.delete(doc.reference)
-        count += 1
+    def _progress(processed: int) -> None:
+        job_ref.update({'processed': processed, 'updated_at': datetime.utcnow()})
     
-    # Commit the batch
-    if count > 0:
-        batch.commit()
+    # A retry picks up what is left, since finished documents no longer match
+    try:
+        count = BULK_ACTIONS[action](db, user_id, on_progress=_progress)
+    except Exception as e:
+        job_ref.update({'status': 'failed', 'error': str(e), 'updated_at': datetime.utcnow()})
+        raise
     
-    return count
\ No newline at end of file
+    job_ref.update({'status': 'done', 'processed': count, 'updated_at': datetime.utcnow()})
+    logger.info(f"Bulk {action} for user {user_id} wrote {count} notifications")
@@ -1,15 +1,42 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
+from collections import defaultdict
+from datetime import datetime, timezone
+import logging
+import os
+import threading
 from fastapi import HTTPException, UploadFile
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import desc, func, or_
-from firebase_admin import firestore
+from firebase_admin import firestore, firestore_async
 
-from app.model.post import Post, Comment, Like, CommentLike
+from app.config import settings
+from app.core.search_index import InvertedIndex, timestamp
+from app.core.tasks import task_queue
+from app.model.post import Post, PostSummary, Comment, Like, CommentLike
 from app.model.user import User
 from app.model.connection import Connection
 from app.model.notification import Notification
+from app.database import (
+    get_db, BatchedWrites, add_document, get_many, get_many_async, count_documents, count_documents_async,
+    invalidate_counts, update_document, iter_modified_documents
+)
 from app.schema.post import PostCreate, PostUpdate, CommentCreate, CommentUpdate, LikeCreate, CommentLikeCreate
-from app.utils.helpers import save_image_with_resize
+from app.service.connection import get_accepted_connection_ids
+from app.service.notification import coalesce_notification, publish_notification, unread_counter_ref, unread_counter_update
+from app.service.feed import (
+    add_to_author_timeline, fan_out_post, remove_post_from_timelines, get_timeline_post_ids, get_timeline_post_ids_async,
+    count_timeline_posts, count_timeline_posts_async
+)
+from app.service.media import schedule_image_variants, delete_image
+from app.utils.helpers import list_items, paginate_query
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+POST_INDEX_PATH = os.path.join(settings.SEARCH_INDEX_DIR, 'posts.seg')
+
+_post_index: Optional[InvertedIndex] = None
+_post_index_lock = threading.Lock()
 
 
 def get_post(db: firestore.Client, post_id: str) -> Optional[Post]:
@@ -20,96 +47,161 @@ def get_post(db: firestore.Client, post_id: str) -> Optional[Post]:
     if not doc.exists:
         return None
     
-    return Post.from_dict(doc.to_dict())
+    return Post.from_dict(doc.to_dict(), doc.id)
+
+
+async def get_post_async(db: firestore_async.AsyncClient, post_id: str) -> Optional[Post]:
+    """Get a post by ID."""
+    doc = await db.collection('posts').document(post_id).get()
+    
+    if not doc.exists:
+        return None
+    
+    return Post.from_dict(doc.to_dict(), doc.id)
 
 
 def create_post(db: firestore.Client, post: Post) -> Post:
     """Create a new post."""
-    posts_ref = db.collection('posts')
-    doc_ref = posts_ref.add(post.to_dict())[1]
+    post_id, data = add_document(db.collection('posts'), post.to_dict())
+    created_post = Post.from_dict(data, post_id)
     
-    # Get the created document
-    doc = doc_ref.get()
-    return Post.from_dict(doc.to_dict())
+    # The author sees the post right away; connections' timelines are written in the background
+    add_to_author_timeline(db, created_post.post_id, created_post.author_id, created_post.created_at)
+    index_post(db, created_post)
+    invalidate_counts('posts', created_post.to_dict())
+    
+    # Fan out and notify connections in the background so the request returns immediately
+    task_queue.enqueue("post.fan_out", post_id=created_post.post_id, author_id=created_post.author_id)
+    task_queue.enqueue("post.notify_connections", post_id=created_post.post_id, author_id=created_post.author_id)
+    if created_post.image_url:
+        schedule_image_variants(created_post.image_url, 'posts', created_post.post_id, 'image_url', 'image_variants')
+    return created_post
 
 
-def update_post(db: firestore.Client, post_id: str, post_data: dict) -> Optional[Post]:
+def update_post(db: firestore.Client, post_id: str, user_id: str, post_data: PostUpdate) -> Post:
     """Update a post."""
     posts_ref = db.collection('posts')
     doc_ref = posts_ref.document(post_id)
     doc = doc_ref.get()
     
     if not doc.exists:
-        return None
+        raise HTTPException(status_code=404, detail="Post not found")
+    
+    # Check if user is the author
+    if doc.to_dict()['author_id'] != user_id:
+        raise HTTPException(status_code=403, detail="Not authorized to update this post")
     
     # Update the post
-    doc_ref.update(post_data)
+    update_data = post_data.dict(exclude_unset=True)
+    update_data['updated_at'] = datetime.utcnow()
+    updated_post = Post.from_dict(update_document(db, doc_ref, update_data, snapshot=doc), post_id)
     
-    # Get the updated document
-    doc = doc_ref.get()
-    return Post.from_dict(doc.to_dict())
+    if 'content' in update_data:
+        index_post(db, updated_post)
+    return updated_post
 
 
-def delete_post(db: firestore.Client, post_id: str) -> bool:
+def delete_post(db: firestore.Client, post_id: str, user_id: str) -> bool:
     """Delete a post."""
     posts_ref = db.collection('posts')
     doc_ref = posts_ref.document(post_id)
     doc = doc_ref.get()
     
     if not doc.exists:
-        return False
+        raise HTTPException(status_code=404, detail="Post not found")
+    
+    # Check if user is the author
+    if doc.to_dict()['author_id'] != user_id:
+        raise HTTPException(status_code=403, detail="Not authorized to delete this post")
     
     # Delete the post
+    post_data = doc.to_dict()
     doc_ref.delete()
+    remove_post_from_timelines(db, post_id)
+    get_post_index(db).remove(post_id)
+    invalidate_counts('posts', post_data)
+    
+    # Release the post's reference to its image
+    if post_data.get('image_url'):
+        delete_image(post_data['image_url'], post_data.get('image_variants'))
     return True
 
 
-def get_feed_posts(db: firestore.Client, user_id: str, skip: int = 0, limit: int = 20) -> List[Post]:
-    """Get posts for a user's feed (posts from connections and followed users)."""
-    posts_ref = db.collection('posts')
-    query = posts_ref.order_by('created_at', direction=firestore.Query.DESCENDING)
+def _get_posts_by_ids(db: firestore.Client, post_ids: List[str],
+                      fields: Optional[List[str]] = None) -> List[PostSummary]:
+    """Fetch post summaries in a single round trip, keeping the given order and skipping missing ones."""
+    docs, _ = get_many(db, 'posts', post_ids, field_paths=fields or PostSummary.FIELDS)
+    return list_items(docs, PostSummary, 'post_id', fields)
+
+
+def get_feed_posts(db: firestore.Client, user_id: str, skip: int = 0, limit: int = 20,
+                   cursor: Optional[str] = None,
+                   fields: Optional[List[str]] = None) -> Tuple[List[PostSummary], Optional[str]]:
+    """Get posts for a user's feed (posts from connections and followed users).
     
-    # Apply filters
-    if user_id:
-        query = query.where('user_id', '==', user_id)
+    Only the summary fields are fetched; with fields, just those are, and
+    the posts come back as dicts. Also returns the cursor of the next page,
+    taken from the timeline so posts deleted since fan-out do not end it early.
+    """
+    post_ids, next_cursor = get_timeline_post_ids(db, user_id, skip, limit, cursor)
     
-    # Apply pagination
-    if skip > 0:
-        query = query.offset(skip)
-    if limit > 0:
-        query = query.limit(limit)
+    # Skip posts deleted since they were fanned out
+    return _get_posts_by_ids(db, post_ids, fields), next_cursor
+
+
+async def get_feed_posts_async(db: firestore_async.AsyncClient, user_id: str, skip: int = 0, limit: int = 20,
+                               cursor: Optional[str] = None,
+                               fields: Optional[List[str]] = None) -> Tuple[List[PostSummary], Optional[str]]:
+    """get_feed_posts for the async client."""
+    post_ids, next_cursor = await get_timeline_post_ids_async(db, user_id, skip, limit, cursor)
     
-    docs = query.get()
-    return [Post.from_dict(doc.to_dict()) for doc in docs]
+    # Skip posts deleted since they were fanned out
+    docs, _ = await get_many_async(db, 'posts', post_ids, field_paths=fields or PostSummary.FIELDS)
+    return list_items(docs, PostSummary, 'post_id', fields), next_cursor
 
 
 def count_feed_posts(db: firestore.Client, user_id: str) -> int:
     """Count the total number of posts in a user's feed."""
-    posts_ref = db.collection('posts')
-    query = posts_ref.where('user_id', '==', user_id)
-    return query.count()
+    return count_timeline_posts(db, user_id)
 
 
-def get_user_posts(db: firestore.Client, user_id: str, skip: int = 0, limit: int = 20) -> List[Post]:
-    """Get all posts by a specific user."""
+async def count_feed_posts_async(db: firestore_async.AsyncClient, user_id: str) -> int:
+    """Count the total number of posts in a user's feed."""
+    return await count_timeline_posts_async(db, user_id)
+
+
+def _user_posts_query(db, user_id: str, skip: int, limit: int, cursor: Optional[str],
+                      fields: Optional[List[str]] = None):
     posts_ref = db.collection('posts')
-    query = posts_ref.where('user_id', '==', user_id).order_by('created_at', direction=firestore.Query.DESCENDING)
+    query = posts_ref.where('author_id', '==', user_id).order_by('created_at', direction=firestore.Query.DESCENDING)
     
     # Apply pagination
-    if skip > 0:
-        query = query.offset(skip)
-    if limit > 0:
-        query = query.limit(limit)
-    
-    docs = query.get()
-    return [Post.from_dict(doc.to_dict()) for doc in docs]
+    query = paginate_query(query, skip, limit, cursor)
+    return query.select(fields or PostSummary.FIELDS)
+
+
+def get_user_posts(db: firestore.Client, user_id: str, skip: int = 0, limit: int = 20,
+                   cursor: Optional[str] = None, fields: Optional[List[str]] = None) -> List[PostSummary]:
+    """Get all posts by a specific user, projected like get_feed_posts."""
+    docs = _user_posts_query(db, user_id, skip, limit, cursor, fields).get()
+    return list_items(docs, PostSummary, 'post_id', fields)
+
+
+async def get_user_posts_async(db: firestore_async.AsyncClient, user_id: str, skip: int = 0, limit: int = 20,
+                               cursor: Optional[str] = None, fields: Optional[List[str]] = None) -> List[PostSummary]:
+    """Get all posts by a specific user, projected like get_feed_posts."""
+    docs = await _user_posts_query(db, user_id, skip, limit, cursor, fields).get()
+    return list_items(docs, PostSummary, 'post_id', fields)
 
 
 def count_user_posts(db: firestore.Client, user_id: str) -> int:
     """Count the total number of posts by a specific user."""
-    posts_ref = db.collection('posts')
-    query = posts_ref.where('user_id', '==', user_id)
-    return query.count()
+    return count_documents(db, 'posts', {'author_id': user_id})
+
+
+async def count_user_posts_async(db: firestore_async.AsyncClient, user_id: str) -> int:
+    """Count the total number of posts by a specific user."""
+    return await count_documents_async(db, 'posts', {'author_id': user_id})
 
 
 # Comment functions
@@ -121,379 +213,261 @@ def get_comment(db: firestore.Client, comment_id: str) -> Optional[Comment]:
     if not doc.exists:
         return None
     
-    return Comment.from_dict(doc.to_dict())
+    return Comment.from_dict(doc.to_dict(), doc.id)
 
 
-def create_comment(db: firestore.Client, comment: Comment) -> Comment:
-    """Create a new comment."""
-    comments_ref = db.collection('comments')
-    doc_ref = comments_ref.add(comment.to_dict())[1]
+def create_comment(db: firestore.Client, comment: Comment) -> Optional[Comment]:
+    """Create a new comment and bump the post's comment counter."""
+    post_ref = db.collection('posts').document(comment.post_id)
+    comment_ref = db.collection('comments').document()
     
-    # Get the created document
-    doc = doc_ref.get()
-    return Comment.from_dict(doc.to_dict())
+    @firestore.transactional
+    def _create(transaction) -> Optional[Dict[str, Any]]:
+        post_doc = post_ref.get(transaction=transaction)
+        if not post_doc.exists:
+            return None
+        
+        transaction.set(comment_ref, comment.to_dict())
+        transaction.update(post_ref, {'comments_count': firestore.Increment(1)})
+        return post_doc.to_dict()
+    
+    post_data = _create(db.transaction())
+    if post_data is None:
+        return None
+    invalidate_counts('comments', comment.to_dict())
+    
+    _notify_post_author(db, post_data['author_id'], comment.author_id, "comment",
+                        "commented on your post", comment.post_id)
+    return Comment.from_dict(comment.to_dict(), comment_ref.id)
 
 
-def update_comment(db: firestore.Client, comment_id: str, comment_data: dict) -> Optional[Comment]:
+def update_comment(db: firestore.Client, comment_id: str, user_id: str, comment_data: CommentUpdate) -> Comment:
     """Update a comment."""
-    comments_ref = db.collection('comments')
-    doc_ref = comments_ref.document(comment_id)
+    doc_ref = db.collection('comments').document(comment_id)
     doc = doc_ref.get()
     
     if not doc.exists:
-        return None
+        raise HTTPException(status_code=404, detail="Comment not found")
     
-    # Update the comment
-    doc_ref.update(comment_data)
+    # Check if user is the author
+    if doc.to_dict()['author_id'] != user_id:
+        raise HTTPException(status_code=403, detail="Not authorized to update this comment")
     
-    # Get the updated document
-    doc = doc_ref.get()
-    return Comment.from_dict(doc.to_dict())
+    # Update the comment
+    update_data = comment_data.dict(exclude_unset=True)
+    update_data['updated_at'] = datetime.utcnow()
+    data = update_document(db, doc_ref, update_data, snapshot=doc)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Comment not found")
+    return Comment.from_dict(data, comment_id)
 
 
-def delete_comment(db: firestore.Client, comment_id: str) -> bool:
-    """Delete a comment."""
-    comments_ref = db.collection('comments')
-    doc_ref = comments_ref.document(comment_id)
-    doc = doc_ref.get()
+def delete_comment(db: firestore.Client, comment_id: str, user_id: Optional[str] = None) -> bool:
+    """Delete a comment and decrement the post's comment counter."""
+    comment_ref = db.collection('comments').document(comment_id)
     
-    if not doc.exists:
+    @firestore.transactional
+    def _delete(transaction) -> Optional[Dict[str, Any]]:
+        comment_doc = comment_ref.get(transaction=transaction)
+        if not comment_doc.exists:
+            return None
+        
+        comment_data = comment_doc.to_dict()
+        post_ref = db.collection('posts').document(comment_data['post_id'])
+        post_doc = post_ref.get(transaction=transaction)
+        
+        # Check if user is the author or post owner
+        if user_id is not None:
+            post_author_id = post_doc.to_dict()['author_id'] if post_doc.exists else None
+            if comment_data['author_id'] != user_id and post_author_id != user_id:
+                raise HTTPException(status_code=403, detail="Not authorized to delete this comment")
+        
+        transaction.delete(comment_ref)
+        if post_doc.exists:
+            transaction.update(post_ref, {'comments_count': firestore.Increment(-1)})
+        return comment_data
+    
+    comment_data = _delete(db.transaction())
+    if comment_data is None:
         return False
     
-    # Delete the comment
-    doc_ref.delete()
+    invalidate_counts('comments', comment_data)
     return True
 
 
-def get_post_comments(db: firestore.Client, post_id: str, skip: int = 0, limit: int = 50) -> List[Comment]:
+def get_post_comments(db: firestore.Client, post_id: str, skip: int = 0, limit: int = 50,
+                      cursor: Optional[str] = None) -> List[Comment]:
     """Get all comments for a post."""
     comments_ref = db.collection('comments')
     query = comments_ref.where('post_id', '==', post_id).order_by('created_at', direction=firestore.Query.DESCENDING)
     
     # Apply pagination
-    if skip > 0:
-        query = query.offset(skip)
-    if limit > 0:
-        query = query.limit(limit)
+    query = paginate_query(query, skip, limit, cursor)
     
     docs = query.get()
-    return [Comment.from_dict(doc.to_dict()) for doc in docs]
+    return [Comment.from_dict(doc.to_dict(), doc.id) for doc in docs]
 
 
 def count_post_comments(db: firestore.Client, post_id: str) -> int:
     """Count the total number of comments for a post."""
-    comments_ref = db.collection('comments')
-    query = comments_ref.where('post_id', '==', post_id)
-    return query.count()
+    return count_documents(db, 'comments', {'post_id': post_id})
 
 
 # Like functions
 def like_post(db: firestore.Client, user_id: str, post_id: str) -> Optional[Like]:
-    """Like a post."""
-    # Check if post exists
-    post = get_post(db, post_id)
-    if not post:
-        return None
-    
-    # Check if already liked
+    """Like a post and bump its like counter."""
+    post_ref = db.collection('posts').document(post_id)
     likes_ref = db.collection('likes')
-    query = likes_ref.where('user_id', '==', user_id).where('post_id', '==', post_id)
-    docs = query.get()
+    like_ref = likes_ref.document()
+    like = Like(user_id=user_id, post_id=post_id)
     
-    if docs:
-        return Like.from_dict(docs[0].to_dict())
+    @firestore.transactional
+    def _like(transaction):
+        post_doc = post_ref.get(transaction=transaction)
+        if not post_doc.exists:
+            return None, None
+        
+        # Check if already liked
+        query = likes_ref.where('user_id', '==', user_id).where('post_id', '==', post_id).limit(1)
+        existing = list(transaction.get(query))
+        if existing:
+            return Like.from_dict(existing[0].to_dict(), existing[0].id), None
+        
+        transaction.set(like_ref, like.to_dict())
+        transaction.update(post_ref, {'likes_count': firestore.Increment(1)})
+        return Like.from_dict(like.to_dict(), like_ref.id), post_doc.to_dict()
     
-    # Create new like
-    like = Like(user_id=user_id, post_id=post_id)
-    doc_ref = likes_ref.add(like.to_dict())[1]
+    db_like, post_data = _like(db.transaction())
     
-    # Get the created document
-    doc = doc_ref.get()
-    # Handle image upload
-    image_url = None
-    if image:
-        image_url = save_image_with_resize(
-            image,
-            folder="post_images",
-            max_width=1200,
-            max_height=1200
-        )
-
-    # Create post
-    db_post = Post(
-        author_id=author_id,
-        content=post_data.content,
-        image_url=image_url
-    )
+    # Only notify for a new like
+    if post_data is not None:
+        invalidate_counts('likes', like.to_dict())
+        _notify_post_author(db, post_data['author_id'], user_id, "post_like",
+                            "liked your post", post_id)
+    return db_like
 
-    db.add(db_post)
-    db.commit()
-    db.refresh(db_post)
 
-    # Create notifications for connections
-    create_post_notifications(db, db_post)
+def unlike_post(db: firestore.Client, user_id: str, post_id: str) -> bool:
+    """Remove a like from a post and decrement its like counter."""
+    post_ref = db.collection('posts').document(post_id)
+    likes_ref = db.collection('likes')
+    
+    @firestore.transactional
+    def _unlike(transaction) -> bool:
+        query = likes_ref.where('user_id', '==', user_id).where('post_id', '==', post_id).limit(1)
+        existing = list(transaction.get(query))
+        if not existing:
+            return False
+        
+        post_doc = post_ref.get(transaction=transaction)
+        transaction.delete(existing[0].reference)
+        if post_doc.exists:
+            transaction.update(post_ref, {'likes_count': firestore.Increment(-1)})
+        return True
+    
+    if not _unlike(db.transaction()):
+        raise HTTPException(status_code=404, detail="Post not liked")
+    
+    invalidate_counts('likes', {'user_id': user_id, 'post_id': post_id})
+    return True
 
-    return db_post
 
+def reconcile_engagement_counts(db: firestore.Client) -> Dict[str, int]:
+    """Repair counter drift by recounting the likes and comments collections."""
+    likes = defaultdict(int)
+    for doc in db.collection('likes').select(['post_id']).stream():
+        likes[doc.get('post_id')] += 1
+    
+    comments = defaultdict(int)
+    for doc in db.collection('comments').select(['post_id']).stream():
+        comments[doc.get('post_id')] += 1
+    
+    writes = BatchedWrites(db)
+    checked = 0
+    for doc in db.collection('posts').select(['likes_count', 'comments_count']).stream():
+        checked += 1
+        data = doc.to_dict()
+        expected = {"likes_count": likes.get(doc.id, 0), "comments_count": comments.get(doc.id, 0)}
+        if data.get('likes_count') != expected['likes_count'] or \
+                data.get('comments_count') != expected['comments_count']:
+            writes.update(doc.reference, expected)
+    writes.flush()
+    
+    return {"posts": checked, "repaired": writes.committed}
 
-def create_post_notifications(db: Session, post: Post) -> None:
-    """Create notifications for a new post."""
-    # Get all connections of the post author
-    connections = db.query(Connection).filter(
-        ((Connection.sender_id == post.author_id) | (Connection.receiver_id == post.author_id)) &
-        (Connection.status == "accepted")
-    ).all()
 
-    # Get post author
-    author = db.query(User).filter(User.id == post.author_id).first()
+def _notify_post_author(db: firestore.Client, post_author_id: str, actor_id: str, notification_type: str,
+                        action: str, post_id: str) -> None:
+    """Notify a post's author about an interaction by another user, coalesced per post."""
+    if post_author_id == actor_id:
+        return
+    
+    coalesce_notification(db, post_author_id, actor_id, notification_type, action, post_id, "post")
 
-    # Create notifications for each connection
-    for connection in connections:
-        # Determine the connection's user ID
-        connection_user_id = connection.receiver_id if connection.sender_id == post.author_id else connection.sender_id
 
+def fan_out_post_notifications(db: firestore.Client, post_id: str, author_id: str) -> int:
+    """Notify every accepted connection of a post's author about the new post.
+    
+    Notification IDs are derived from the post and the recipient, so a retried
+    run skips what an earlier attempt wrote instead of duplicating it or
+    counting it twice. Returns the number of notifications written.
+    """
+    author_doc = db.collection('users').document(author_id).get()
+    author = author_doc.to_dict() if author_doc.exists else {}
+    author_name = f"{author.get('first_name', '')} {author.get('last_name', '')}".strip() or "Someone"
+    
+    notifications_ref = db.collection('notifications')
+    notification_ids = {
+        f"new_post_{post_id}_{connection_id}": connection_id
+        for connection_id in get_accepted_connection_ids(db, author_id)
+    }
+    _, missing_ids = get_many(db, 'notifications', list(notification_ids), field_paths=['user_id'])
+    
+    # Each notification and its counter bump are two writes, so with an even
+    # batch size they always land in the same batch
+    writes = BatchedWrites(db)
+    written = []
+    for notification_id in missing_ids:
         notification = Notification(
-            user_id=connection_user_id,
+            user_id=notification_ids[notification_id],
             type="new_post",
-            message=f"{author.first_name} {author.last_name} created a new post",
-            source_id=post.id,
+            message=f"{author_name} created a new post",
+            source_id=post_id,
             source_type="post",
-            created_by=post.author_id
-        )
-
-        db.add(notification)
-
-    db.commit()
-
-
-def update_post(db: Session, post_id: int, user_id: int, post_data: PostUpdate) -> Post:
-    """Update a post."""
-    db_post = get_post(db, post_id)
-
-    # Check if user is the author
-    if db_post.author_id != user_id:
-        raise HTTPException(status_code=403, detail="Not authorized to update this post")
-
-    # Update post fields
-    for field, value in post_data.dict(exclude_unset=True).items():
-        setattr(db_post, field, value)
-
-    db.commit()
-    db.refresh(db_post)
-    return db_post
-
-
-def delete_post(db: Session, post_id: int, user_id: int) -> bool:
-    """Delete a post."""
-    db_post = get_post(db, post_id)
-
-    # Check if user is the author
-    if db_post.author_id != user_id:
-        raise HTTPException(status_code=403, detail="Not authorized to delete this post")
-
-    db.delete(db_post)
-    db.commit()
-
-    return True
-
-
-def get_feed_posts(db: Session, user_id: int, skip: int = 0, limit: int = 20) -> List[Post]:
-    """Get posts for a user's feed (posts from connections and followed users)."""
-    # Get IDs of users connected to the current user
-    connected_users_query = db.query(
-        func.if_(Connection.sender_id == user_id, Connection.receiver_id, Connection.sender_id).label('user_id')
-    ).filter(
-        ((Connection.sender_id == user_id) | (Connection.receiver_id == user_id)) &
-        (Connection.status == "accepted")
-    ).subquery()
-
-    # Get posts from connected users and the user's own posts
-    return db.query(Post).filter(
-        (Post.author_id.in_(db.query(connected_users_query.c.user_id))) |
-        (Post.author_id == user_id)
-    ).order_by(desc(Post.created_at)).offset(skip).limit(limit).all()
-
-
-def count_feed_posts(db: Session, user_id: int) -> int:
-    """Count the total number of posts in a user's feed."""
-    # Get IDs of users connected to the current user
-    connected_users_query = db.query(
-        func.if_(Connection.sender_id == user_id, Connection.receiver_id, Connection.sender_id).label('user_id')
-    ).filter(
-        ((Connection.sender_id == user_id) | (Connection.receiver_id == user_id)) &
-        (Connection.status == "accepted")
-    ).subquery()
-
-    # Count posts from connected users and the user's own posts
-    return db.query(Post).filter(
-        (Post.author_id.in_(db.query(connected_users_query.c.user_id))) |
-        (Post.author_id == user_id)
-    ).count()
-
-
-def get_user_posts(db: Session, user_id: int, skip: int = 0, limit: int = 20) -> List[Post]:
-    """Get all posts by a specific user."""
-    return db.query(Post).filter(Post.author_id == user_id).order_by(desc(Post.created_at)).offset(skip).limit(
-        limit).all()
-
-
-def count_user_posts(db: Session, user_id: int) -> int:
-    """Count the total number of posts by a specific user."""
-    return db.query(Post).filter(Post.author_id == user_id).count()
-
-
-# Comment functions
-def get_comment(db: Session, comment_id: int) -> Comment:
-    """Get a comment by ID."""
-    comment = db.query(Comment).filter(Comment.id == comment_id).first()
-    if not comment:
-        raise HTTPException(status_code=404, detail="Comment not found")
-    return comment
-
-
-def create_comment(db: Session, author_id: int, comment_data: CommentCreate) -> Comment:
-    """Create a new comment on a post."""
-    # Check if post exists
-    post = db.query(Post).filter(Post.id == comment_data.post_id).first()
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
-
-    # Create comment
-    db_comment = Comment(
-        post_id=comment_data.post_id,
-        author_id=author_id,
-        content=comment_data.content
-    )
-
-    db.add(db_comment)
-    db.commit()
-    db.refresh(db_comment)
-
-    # Create notification for post author if different from comment author
-    if post.author_id != author_id:
-        commenter = db.query(User).filter(User.id == author_id).first()
-
-        notification = Notification(
-            user_id=post.author_id,
-            type="comment",
-            message=f"{commenter.first_name} {commenter.last_name} commented on your post",
-            source_id=db_comment.id,
-            source_type="comment",
-            created_by=author_id
+            created_by=author_id,
+            notification_id=notification_id
         )
-
-        db.add(notification)
-        db.commit()
-
-    return db_comment
-
-
-def update_comment(db: Session, comment_id: int, user_id: int, comment_data: CommentUpdate) -> Comment:
-    """Update a comment."""
-    db_comment = get_comment(db, comment_id)
-
-    # Check if user is the author
-    if db_comment.author_id != user_id:
-        raise HTTPException(status_code=403, detail="Not authorized to update this comment")
-
-    # Update comment fields
-    for field, value in comment_data.dict(exclude_unset=True).items():
-        setattr(db_comment, field, value)
-
-    db.commit()
-    db.refresh(db_comment)
-    return db_comment
-
-
-def delete_comment(db: Session, comment_id: int, user_id: int) -> bool:
-    """Delete a comment."""
-    db_comment = get_comment(db, comment_id)
-
-    # Check if user is the author or post owner
-    post = db.query(Post).filter(Post.id == db_comment.post_id).first()
-    if db_comment.author_id != user_id and post.author_id != user_id:
-        raise HTTPException(status_code=403, detail="Not authorized to delete this comment")
-
-    db.delete(db_comment)
-    db.commit()
-
-    return True
-
-
-def get_post_comments(db: Session, post_id: int, skip: int = 0, limit: int = 50) -> List[Comment]:
-    """Get all comments for a post."""
-    return db.query(Comment).filter(Comment.post_id == post_id).order_by(Comment.created_at).offset(skip).limit(
-        limit).all()
+        writes.set(notifications_ref.document(notification_id), notification.to_dict())
+        writes.set(unread_counter_ref(db, notification.user_id), unread_counter_update(1), merge=True)
+        written.append(notification)
+    writes.flush()
+    
+    if written:
+        invalidate_counts('notifications', *[notification.to_dict() for notification in written])
+    for notification in written:
+        publish_notification(notification, 1)
+    return len(written)
+
+
+@task_queue.task("post.fan_out")
+def _fan_out_task(post_id: str, author_id: str) -> None:
+    db = get_db()
+    post_doc = db.collection('posts').document(post_id).get()
+    if not post_doc.exists:
+        # Deleted before the fan-out ran; nothing to push
+        return
+    
+    count = fan_out_post(db, post_id, author_id, post_doc.get('created_at'), get_accepted_connection_ids(db, author_id))
+    logger.info(f"Fanned out post {post_id} to {count} timelines")
 
 
-def count_post_comments(db: Session, post_id: int) -> int:
-    """Count the total number of comments for a post."""
-    return db.query(Comment).filter(Comment.post_id == post_id).count()
+@task_queue.task("post.notify_connections")
+def _notify_connections_task(post_id: str, author_id: str) -> None:
+    count = fan_out_post_notifications(get_db(), post_id, author_id)
+    logger.info(f"Sent {count} new post notifications for post {post_id}")
 
 
 # Like functions
-def like_post(db: Session, user_id: int, like_data: LikeCreate) -> Like:
-    """Like a post."""
-    # Check if post exists
-    post = db.query(Post).filter(Post.id == like_data.post_id).first()
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
-
-    # Check if already liked
-    existing_like = db.query(Like).filter(
-        (Like.post_id == like_data.post_id) &
-        (Like.user_id == user_id)
-    ).first()
-
-    if existing_like:
-        raise HTTPException(status_code=400, detail="Post already liked")
-
-    # Create like
-    db_like = Like(
-        post_id=like_data.post_id,
-        user_id=user_id
-    )
-
-    db.add(db_like)
-    db.commit()
-    db.refresh(db_like)
-
-    # Create notification for post author if different from like author
-    if post.author_id != user_id:
-        liker = db.query(User).filter(User.id == user_id).first()
-
-        notification = Notification(
-            user_id=post.author_id,
-            type="post_like",
-            message=f"{liker.first_name} {liker.last_name} liked your post",
-            source_id=db_like.id,
-            source_type="like",
-            created_by=user_id
-        )
-
-        db.add(notification)
-        db.commit()
-
-    return db_like
-
-
-def unlike_post(db: Session, user_id: int, post_id: int) -> bool:
-    """Remove a like from a post."""
-    # Check if liked
-    db_like = db.query(Like).filter(
-        (Like.post_id == post_id) &
-        (Like.user_id == user_id)
-    ).first()
-
-    if not db_like:
-        raise HTTPException(status_code=404, detail="Post not liked")
-
-    db.delete(db_like)
-    db.commit()
-
-    return True
-
-
 def like_comment(db: Session, user_id: int, like_data: CommentLikeCreate) -> CommentLike:
     """Like a comment."""
     # Check if comment exists
@@ -556,14 +530,22 @@ def unlike_comment(db: Session, user_id: int, comment_id: int) -> bool:
     return True
 
 
-def get_post_likes(db: Session, post_id: int, skip: int = 0, limit: int = 50) -> List[Like]:
+def get_post_likes(db: firestore.Client, post_id: str, skip: int = 0, limit: int = 50,
+                   cursor: Optional[str] = None) -> List[Like]:
     """Get all likes for a post."""
-    return db.query(Like).filter(Like.post_id == post_id).offset(skip).limit(limit).all()
+    likes_ref = db.collection('likes')
+    query = likes_ref.where('post_id', '==', post_id).order_by('created_at', direction=firestore.Query.DESCENDING)
+    
+    # Apply pagination
+    query = paginate_query(query, skip, limit, cursor)
+    
+    docs = query.get()
+    return [Like.from_dict(doc.to_dict(), doc.id) for doc in docs]
 
 
-def count_post_likes(db: Session, post_id: int) -> int:
+def count_post_likes(db: firestore.Client, post_id: str) -> int:
     """Count the total number of likes for a post."""
-    return db.query(Like).filter(Like.post_id == post_id).count()
+    return count_documents(db, 'likes', {'post_id': post_id})
 
 
 def get_comment_likes(db: Session, comment_id: int, skip: int = 0, limit: int = 50) -> List[CommentLike]:
@@ -571,9 +553,9 @@ def get_comment_likes(db: Session, comment_id: int, skip: int = 0, limit: int =
     return db.query(CommentLike).filter(CommentLike.comment_id == comment_id).offset(skip).limit(limit).all()
 
 
-def count_comment_likes(db: Session, comment_id: int) -> int:
+def count_comment_likes(db: firestore.Client, comment_id: str) -> int:
     """Count the total number of likes for a comment."""
-    return db.query(CommentLike).filter(CommentLike.comment_id == comment_id).count()
+    return count_documents(db, 'comment_likes', {'comment_id': comment_id})
 
 
 def is_post_liked(db: Session, post_id: int, user_id: int) -> bool:
@@ -592,54 +574,85 @@ def is_comment_liked(db: Session, comment_id: int, user_id: int) -> bool:
     ).first() is not None
 
 
-def search_posts(db: Session, query: str, user_id: Optional[int] = None, skip: int = 0, limit: int = 20) -> List[Post]:
-    """Search for posts by content."""
-    search_query = f"%{query}%"
+# Search functions
+def _post_search_document(post: Post) -> Tuple[str, Dict[str, Optional[str]], Dict[str, Any]]:
+    meta = {
+        "author_id": post.author_id,
+        "created_at": timestamp(post.created_at),
+        "modified_at": timestamp(post.updated_at or post.created_at)
+    }
+    return post.post_id, {"content": post.content}, meta
 
-    # Base query
-    posts_query = db.query(Post).filter(Post.content.ilike(search_query))
 
-    # If user_id is provided, restrict to their feed
-    if user_id:
-        # Get IDs of users connected to the current user
-        connected_users_query = db.query(
-            func.if_(Connection.sender_id == user_id, Connection.receiver_id, Connection.sender_id).label('user_id')
-        ).filter(
-            ((Connection.sender_id == user_id) | (Connection.receiver_id == user_id)) &
-            (Connection.status == "accepted")
-        ).subquery()
-
-        # Filter to posts from connected users and the user's own posts
-        posts_query = posts_query.filter(
-            (Post.author_id.in_(db.query(connected_users_query.c.user_id))) |
-            (Post.author_id == user_id)
-        )
+def _iter_post_search_documents(db: firestore.Client, since: Optional[float] = None):
+    if since is None:
+        docs = db.collection('posts').stream()
+    else:
+        docs = iter_modified_documents(db.collection('posts'), datetime.fromtimestamp(since, tz=timezone.utc))
+    for doc in docs:
+        yield _post_search_document(Post.from_dict(doc.to_dict(), doc.id))
 
-    # Order by created_at and apply pagination
-    return posts_query.order_by(desc(Post.created_at)).offset(skip).limit(limit).all()
 
+def _new_post_index(db: firestore.Client) -> InvertedIndex:
+    return InvertedIndex(POST_INDEX_PATH, field_weights={"content": 1.0},
+                         flush_threshold=settings.SEARCH_INDEX_FLUSH_THRESHOLD,
+                         source=lambda since: _iter_post_search_documents(db, since),
+                         flush_interval=settings.SEARCH_INDEX_FLUSH_INTERVAL_SECONDS)
 
-def count_search_posts(db: Session, query: str, user_id: Optional[int] = None) -> int:
-    """Count the number of posts matching a search query."""
-    search_query = f"%{query}%"
 
-    # Base query
-    posts_query = db.query(Post).filter(Post.content.ilike(search_query))
+def get_post_index(db: firestore.Client) -> InvertedIndex:
+    """Get the process-wide post search index, loading or building it on first use."""
+    global _post_index
+    
+    with _post_index_lock:
+        if _post_index is None:
+            index = _new_post_index(db)
+            if not index.load():
+                count = index.rebuild()
+                logger.info(f"Built post search index with {count} posts")
+            _post_index = index
+    
+    return _post_index
+
+
+def index_post(db: firestore.Client, post: Post) -> None:
+    """Add or replace a post in the search index."""
+    doc_id, fields, meta = _post_search_document(post)
+    get_post_index(db).add(doc_id, fields, meta)
+
+
+def rebuild_post_index(db: firestore.Client) -> int:
+    """Rebuild the post search index from the posts collection."""
+    global _post_index
+    
+    with _post_index_lock:
+        if _post_index is None:
+            _post_index = _new_post_index(db)
+        return _post_index.rebuild()
+
 
-    # If user_id is provided, restrict to their feed
+def search_posts(db: firestore.Client, query: str, user_id: Optional[str] = None, skip: int = 0,
+                 limit: int = 20) -> Tuple[List[Post], int]:
+    """Search for posts by content, returning a page of hits and the total match count."""
+    author_filter = None
+    
+    # If user_id is provided, restrict to their own and their connections' posts
     if user_id:
-        # Get IDs of users connected to the current user
-        connected_users_query = db.query(
-            func.if_(Connection.sender_id == user_id, Connection.receiver_id, Connection.sender_id).label('user_id')
-        ).filter(
-            ((Connection.sender_id == user_id) | (Connection.receiver_id == user_id)) &
-            (Connection.status == "accepted")
-        ).subquery()
-
-        # Filter to posts from connected users and the user's own posts
-        posts_query = posts_query.filter(
-            (Post.author_id.in_(db.query(connected_users_query.c.user_id))) |
-            (Post.author_id == user_id)
-        )
+        author_ids = set(get_accepted_connection_ids(db, user_id))
+        author_ids.add(user_id)
+        author_filter = lambda meta: meta.get('author_id') in author_ids
+    
+    index = get_post_index(db)
+    results = index.search(query, filter=author_filter, skip=skip, limit=limit)
+    docs, missing_ids = get_many(db, 'posts', [post_id for post_id, _ in results.hits])
+    
+    # Drop hits for posts deleted through another process
+    for post_id in missing_ids:
+        index.remove(post_id)
+    
+    return [Post.from_dict(doc.to_dict(), doc.id) for doc in docs], results.total
+
 
-    return posts_query.count()
\ No newline at end of file
+def count_search_posts(db: firestore.Client, query: str, user_id: Optional[str] = None) -> int:
+    """Count the number of posts matching a search query."""
+    return search_posts(db, query, user_id, limit=0)[1]
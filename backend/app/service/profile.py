@@ -1,10 +1,13 @@
+from datetime import datetime
 from typing import List, Optional
 from fastapi import HTTPException, UploadFile
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func, desc
-from firebase_admin import firestore
+from firebase_admin import firestore, firestore_async
+from google.api_core.exceptions import NotFound
 
-from app.model.profile import Profile, Experience, Education, Skill, Endorsement
+from app.database import add_document, count_documents, invalidate_counts, update_document
+from app.model.profile import Profile, ProfileSummary, Experience, Education, Skill, Endorsement
 from app.model.user import User
 from app.schema.profile import (
     ProfileCreate, ProfileUpdate,
@@ -12,7 +15,8 @@ from app.schema.profile import (
     EducationCreate, EducationUpdate,
     SkillCreate
 )
-from app.utils.helpers import save_image_with_resize, delete_file
+from app.service.media import schedule_image_variants, delete_image
+from app.utils.helpers import save_image_upload
 
 
 def get_profile(db: firestore.Client, user_id: str) -> Optional[Profile]:
@@ -27,6 +31,17 @@ def get_profile(db: firestore.Client, user_id: str) -> Optional[Profile]:
     return Profile.from_dict(docs[0].to_dict())
 
 
+async def get_profile_async(db: firestore_async.AsyncClient, user_id: str) -> Optional[Profile]:
+    """Get a user's profile from the async client."""
+    query = db.collection('profiles').where('user_id', '==', user_id).limit(1)
+    docs = [doc async for doc in query.stream()]
+    
+    if not docs:
+        return None
+    
+    return Profile.from_dict(docs[0].to_dict(), docs[0].id)
+
+
 def get_profile_by_user_id(db: Session, user_id: int) -> Optional[Profile]:
     """Get a profile by user ID."""
     return db.query(Profile).filter(Profile.user_id == user_id).first()
@@ -34,12 +49,9 @@ def get_profile_by_user_id(db: Session, user_id: int) -> Optional[Profile]:
 
 def create_profile(db: firestore.Client, profile: Profile) -> Profile:
     """Create a new profile."""
-    profiles_ref = db.collection('profiles')
-    doc_ref = profiles_ref.add(profile.to_dict())[1]
-    
-    # Get the created document
-    doc = doc_ref.get()
-    return Profile.from_dict(doc.to_dict())
+    profile_id, data = add_document(db.collection('profiles'), profile.to_dict())
+    invalidate_counts('profiles', data)
+    return Profile.from_dict(data, profile_id)
 
 
 def update_profile(db: firestore.Client, user_id: str, profile_data: dict) -> Optional[Profile]:
@@ -52,12 +64,11 @@ def update_profile(db: firestore.Client, user_id: str, profile_data: dict) -> Op
         return None
     
     # Update the profile
-    doc_ref = docs[0].reference
-    doc_ref.update(profile_data)
-    
-    # Get the updated document
-    doc = doc_ref.get()
-    return Profile.from_dict(doc.to_dict())
+    data = update_document(db, docs[0].reference, profile_data, snapshot=docs[0])
+    if data is None:
+        return None
+    invalidate_counts('profiles', docs[0].to_dict(), data)
+    return Profile.from_dict(data, docs[0].id)
 
 
 def delete_profile(db: firestore.Client, user_id: str) -> bool:
@@ -71,67 +82,51 @@ def delete_profile(db: firestore.Client, user_id: str) -> bool:
     
     # Delete the profile
     docs[0].reference.delete()
+    invalidate_counts('profiles', docs[0].to_dict())
     return True
 
 
-def upload_profile_image(db: Session, user_id: int, file: UploadFile) -> Profile:
-    """Upload and update a user's profile image."""
-    db_profile = get_profile_by_user_id(db, user_id)
-    if not db_profile:
-        # Create profile if it doesn't exist
-        db_profile = Profile(user_id=user_id)
-        db.add(db_profile)
-        db.commit()
-        db.refresh(db_profile)
-
-    # Delete old image if exists
-    if db_profile.profile_image:
-        delete_file(db_profile.profile_image)
-
-    # Save new image
-    image_path = save_image_with_resize(
-        file,
-        folder="profile_images",
-        max_width=400,
-        max_height=400
-    )
+def _get_or_create_profile_doc(db: firestore.Client, user_id: str):
+    """Get a reference to a user's profile document and its data, creating it if missing."""
+    docs = db.collection('profiles').where('user_id', '==', user_id).limit(1).get()
+    if docs:
+        return docs[0].reference, docs[0].to_dict()
 
-    # Update profile
-    db_profile.profile_image = image_path
-    db.commit()
-    db.refresh(db_profile)
+    profile = Profile(user_id=user_id)
+    doc_ref = db.collection('profiles').document()
+    doc_ref.set(profile.to_dict())
+    invalidate_counts('profiles', profile.to_dict())
+    return doc_ref, profile.to_dict()
 
-    return db_profile
 
+def _replace_profile_image(db: firestore.Client, user_id: str, file: UploadFile, field: str) -> Profile:
+    """Store a new profile or cover image and schedule its variants."""
+    doc_ref, profile_data = _get_or_create_profile_doc(db, user_id)
+    variants_field = f"{field}_variants"
 
-def upload_cover_image(db: Session, user_id: int, file: UploadFile) -> Profile:
-    """Upload and update a user's cover image."""
-    db_profile = get_profile_by_user_id(db, user_id)
-    if not db_profile:
-        # Create profile if it doesn't exist
-        db_profile = Profile(user_id=user_id)
-        db.add(db_profile)
-        db.commit()
-        db.refresh(db_profile)
-
-    # Delete old image if exists
-    if db_profile.cover_image:
-        delete_file(db_profile.cover_image)
-
-    # Save new image
-    image_path = save_image_with_resize(
-        file,
-        folder="cover_images",
-        max_width=1200,
-        max_height=300
-    )
+    # Save the upload as received; variants are generated in the background
+    image_path = save_image_upload(file)
 
-    # Update profile
-    db_profile.cover_image = image_path
-    db.commit()
-    db.refresh(db_profile)
+    # Release the old image and its variants if they exist
+    if profile_data.get(field):
+        delete_image(profile_data[field], profile_data.get(variants_field))
+
+    update_data = {field: image_path, variants_field: None, 'updated_at': datetime.utcnow()}
+    doc_ref.update(update_data)
+    schedule_image_variants(image_path, 'profiles', doc_ref.id, field, variants_field)
 
-    return db_profile
+    profile_data.update(update_data)
+    return Profile.from_dict(profile_data, doc_ref.id)
+
+
+def upload_profile_image(db: firestore.Client, user_id: str, file: UploadFile) -> Profile:
+    """Upload and update a user's profile image."""
+    return _replace_profile_image(db, user_id, file, 'profile_image')
+
+
+def upload_cover_image(db: firestore.Client, user_id: str, file: UploadFile) -> Profile:
+    """Upload and update a user's cover image."""
+    return _replace_profile_image(db, user_id, file, 'cover_image')
 
 
 # Experience functions
@@ -202,42 +197,28 @@ def get_educations(db: firestore.Client, user_id: str) -> List[Education]:
 
 def create_education(db: firestore.Client, education: Education) -> Education:
     """Create a new education entry."""
-    education_ref = db.collection('education')
-    doc_ref = education_ref.add(education.to_dict())[1]
-    
-    # Get the created document
-    doc = doc_ref.get()
-    return Education.from_dict(doc.to_dict())
+    education_id, data = add_document(db.collection('education'), education.to_dict())
+    return Education.from_dict(data, education_id)
 
 
 def update_education(db: firestore.Client, education_id: str, education_data: dict) -> Optional[Education]:
     """Update an education entry."""
-    education_ref = db.collection('education')
-    doc_ref = education_ref.document(education_id)
-    doc = doc_ref.get()
-    
-    if not doc.exists:
+    doc_ref = db.collection('education').document(education_id)
+    data = update_document(db, doc_ref, education_data)
+    if data is None:
         return None
-    
-    # Update the education entry
-    doc_ref.update(education_data)
-    
-    # Get the updated document
-    doc = doc_ref.get()
-    return Education.from_dict(doc.to_dict())
+    return Education.from_dict(data, education_id)
 
 
 def delete_education(db: firestore.Client, education_id: str) -> bool:
     """Delete an education entry."""
-    education_ref = db.collection('education')
-    doc_ref = education_ref.document(education_id)
-    doc = doc_ref.get()
+    doc_ref = db.collection('education').document(education_id)
     
-    if not doc.exists:
+    # The delete only applies to an existing education entry, so no read is needed first
+    try:
+        doc_ref.delete(option=db.write_option(exists=True))
+    except NotFound:
         return False
-    
-    # Delete the education entry
-    doc_ref.delete()
     return True
 
 
@@ -263,42 +244,28 @@ def get_skills(db: firestore.Client, user_id: str) -> List[Skill]:
 
 def create_skill(db: firestore.Client, skill: Skill) -> Skill:
     """Create a new skill."""
-    skills_ref = db.collection('skills')
-    doc_ref = skills_ref.add(skill.to_dict())[1]
-    
-    # Get the created document
-    doc = doc_ref.get()
-    return Skill.from_dict(doc.to_dict())
+    skill_id, data = add_document(db.collection('skills'), skill.to_dict())
+    return Skill.from_dict(data, skill_id)
 
 
 def update_skill(db: firestore.Client, skill_id: str, skill_data: dict) -> Optional[Skill]:
     """Update a skill."""
-    skills_ref = db.collection('skills')
-    doc_ref = skills_ref.document(skill_id)
-    doc = doc_ref.get()
-    
-    if not doc.exists:
+    doc_ref = db.collection('skills').document(skill_id)
+    data = update_document(db, doc_ref, skill_data)
+    if data is None:
         return None
-    
-    # Update the skill
-    doc_ref.update(skill_data)
-    
-    # Get the updated document
-    doc = doc_ref.get()
-    return Skill.from_dict(doc.to_dict())
+    return Skill.from_dict(data, skill_id)
 
 
 def delete_skill(db: firestore.Client, skill_id: str) -> bool:
     """Delete a skill."""
-    skills_ref = db.collection('skills')
-    doc_ref = skills_ref.document(skill_id)
-    doc = doc_ref.get()
+    doc_ref = db.collection('skills').document(skill_id)
     
-    if not doc.exists:
+    # The delete only applies to an existing skill, so no read is needed first
+    try:
+        doc_ref.delete(option=db.write_option(exists=True))
+    except NotFound:
         return False
-    
-    # Delete the skill
-    doc_ref.delete()
     return True
 
 
@@ -391,51 +358,78 @@ def get_profile_strength(db: Session, profile_id: int) -> int:
     return min(strength_percentage, 100)  # Cap at 100%
 
 
-def search_profiles(
+def _skilled_profile_ids(db: firestore.Client, profile_ids: List[str], skills: List[str]) -> set:
+    """IDs among profile_ids of the profiles listing any of the given skills, ignoring case."""
+    wanted = {skill.strip().lower() for skill in skills}
+    matched = set()
+    
+    # Firestore caps "in" filters at 30 values
+    for start in range(0, len(profile_ids), 30):
+        query = db.collection('skills').where('profile_id', 'in', profile_ids[start:start + 30])
+        for doc in query.select(['profile_id', 'name']).get():
+            data = doc.to_dict()
+            if (data.get('name') or '').strip().lower() in wanted:
+                matched.add(data.get('profile_id'))
+    
+    return matched
+
+
+def _matching_profiles(
     db: firestore.Client,
-    query: Optional[str] = None,
+    search_query: Optional[str] = None,
     skills: Optional[List[str]] = None,
-    location: Optional[str] = None,
-    skip: int = 0,
-    limit: int = 100
-) -> List[Profile]:
-    """Search for profiles with various filters."""
-    profiles_ref = db.collection('profiles')
-    query = profiles_ref
-    
-    # Apply filters
+    location: Optional[str] = None
+) -> List[ProfileSummary]:
+    """Every profile matching the search, applying the text and skills filters Firestore cannot express."""
+    profiles_query = db.collection('profiles')
     if location:
-        query = query.where('location', '==', location)
+        profiles_query = profiles_query.where('location', '==', location)
     
-    # Apply pagination
-    if skip > 0:
-        query = query.offset(skip)
-    if limit > 0:
-        query = query.limit(limit)
+    docs = profiles_query.select(ProfileSummary.FIELDS).stream()
+    profiles = [ProfileSummary.from_dict(doc.to_dict(), doc.id) for doc in docs]
     
-    docs = query.get()
-    profiles = [Profile.from_dict(doc.to_dict()) for doc in docs]
-    
-    # Apply search filter if provided
-    if query:
-        search_query = query.lower()
+    if search_query:
+        search_query = search_query.lower()
         profiles = [
             profile for profile in profiles
-            if search_query in profile.headline.lower() or
-               search_query in profile.summary.lower() or
-               search_query in profile.current_position.lower()
+            if search_query in (profile.headline or '').lower() or
+               search_query in (profile.location or '').lower()
         ]
     
-    # Apply skills filter if provided
-    if skills:
-        profiles = [
-            profile for profile in profiles
-            if any(skill.lower() in [s.name.lower() for s in profile.skills] for skill in skills)
-        ]
+    if skills and profiles:
+        profile_ids = _skilled_profile_ids(db, [profile.profile_id for profile in profiles], skills)
+        profiles = [profile for profile in profiles if profile.profile_id in profile_ids]
     
     return profiles
 
 
+def search_profiles(
+    db: firestore.Client,
+    query: Optional[str] = None,
+    skills: Optional[List[str]] = None,
+    location: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100
+) -> List[ProfileSummary]:
+    """Search for profiles with various filters, fetching only the summary fields."""
+    if not query and not skills:
+        # Nothing to filter in Python, so Firestore can paginate
+        profiles_query = db.collection('profiles')
+        if location:
+            profiles_query = profiles_query.where('location', '==', location)
+        if skip > 0:
+            profiles_query = profiles_query.offset(skip)
+        if limit > 0:
+            profiles_query = profiles_query.limit(limit)
+        
+        docs = profiles_query.select(ProfileSummary.FIELDS).get()
+        return [ProfileSummary.from_dict(doc.to_dict(), doc.id) for doc in docs]
+    
+    # Filter first so that pages are full and agree with count_search_profiles
+    profiles = _matching_profiles(db, query, skills, location)
+    return profiles[skip:skip + limit] if limit > 0 else profiles[skip:]
+
+
 def count_search_profiles(
     db: firestore.Client,
     query: Optional[str] = None,
@@ -443,31 +437,7 @@ def count_search_profiles(
     location: Optional[str] = None
 ) -> int:
     """Count the number of profiles matching the search criteria."""
-    profiles_ref = db.collection('profiles')
-    query = profiles_ref
-    
-    # Apply filters
-    if location:
-        query = query.where('location', '==', location)
-    
-    docs = query.get()
-    profiles = [Profile.from_dict(doc.to_dict()) for doc in docs]
-    
-    # Apply search filter if provided
-    if query:
-        search_query = query.lower()
-        profiles = [
-            profile for profile in profiles
-            if search_query in profile.headline.lower() or
-               search_query in profile.summary.lower() or
-               search_query in profile.current_position.lower()
-        ]
-    
-    # Apply skills filter if provided
-    if skills:
-        profiles = [
-            profile for profile in profiles
-            if any(skill.lower() in [s.name.lower() for s in profile.skills] for skill in skills)
-        ]
+    if not query and not skills:
+        return count_documents(db, 'profiles', {'location': location} if location else None)
     
-    return len(profiles)
\ No newline at end of file
+    return len(_matching_profiles(db, query, skills, location))
@@ -1,19 +1,29 @@
+import asyncio
+from datetime import datetime
 from typing import List, Optional
 from fastapi import HTTPException
 from sqlalchemy.orm import Session
-from firebase_admin import firestore
+from firebase_admin import firestore, firestore_async
 
 from app.model.user import User
 from app.schema.user import UserUpdate
-from app.utils.security import get_password_hash
+from app.utils.security import get_password_hash_async, invalidate_principal, verify_password_async
 
 
-def get_user(db: Session, user_id: int) -> User:
+def get_user(db: firestore.Client, user_id: str) -> User:
     """Get a user by ID."""
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
+    user_doc = db.collection('users').document(user_id).get()
+    if not user_doc.exists:
         raise HTTPException(status_code=404, detail="User not found")
-    return user
+    return User.from_dict(user_doc.to_dict(), user_doc.id)
+
+
+async def get_user_async(db: firestore_async.AsyncClient, user_id: str) -> User:
+    """Get a user by ID."""
+    user_doc = await db.collection('users').document(user_id).get()
+    if not user_doc.exists:
+        raise HTTPException(status_code=404, detail="User not found")
+    return User.from_dict(user_doc.to_dict(), user_doc.id)
 
 
 def get_user_by_email(db: firestore.Client, email: str) -> Optional[User]:
@@ -34,85 +44,109 @@ def get_users(db: Session, skip: int = 0, limit: int = 100) -> List[User]:
     return db.query(User).offset(skip).limit(limit).all()
 
 
-def update_user(db: Session, user_id: int, user_data: UserUpdate) -> User:
+def update_user(db: firestore.Client, user_id: str, user_data: UserUpdate) -> User:
     """Update a user's information."""
     db_user = get_user(db, user_id)
 
     # Update user fields
-    for field, value in user_data.dict(exclude_unset=True).items():
+    update_data = user_data.dict(exclude_unset=True)
+    for field, value in update_data.items():
         setattr(db_user, field, value)
+    db_user.updated_at = datetime.utcnow()
+    update_data['updated_at'] = db_user.updated_at
 
-    db.commit()
-    db.refresh(db_user)
+    db.collection('users').document(user_id).update(update_data)
+    invalidate_principal(user_id)
     return db_user
 
 
-def update_password(db: Session, user_id: int, current_password: str, new_password: str) -> bool:
-    """Update a user's password."""
-    from app.utils.security import verify_password
+def _revocation(changes: dict) -> dict:
+    return {**changes, 'token_version': firestore.Increment(1), 'updated_at': datetime.utcnow()}
+
+
+def revoke_tokens(db: firestore.Client, user_id: str, changes: dict) -> None:
+    """Apply changes and bump the token version so issued tokens stop working."""
+    db.collection('users').document(user_id).update(_revocation(changes))
+    invalidate_principal(user_id)
 
-    db_user = get_user(db, user_id)
+
+async def revoke_tokens_async(db: firestore_async.AsyncClient, user_id: str, changes: dict) -> None:
+    """Apply changes and bump the token version so issued tokens stop working."""
+    await db.collection('users').document(user_id).update(_revocation(changes))
+    invalidate_principal(user_id)
+
+
+async def update_password_async(db: firestore_async.AsyncClient, user_id: str, current_password: str,
+                                new_password: str) -> bool:
+    """Update a user's password."""
+    user_doc = await db.collection('users').document(user_id).get()
+    if not user_doc.exists:
+        raise HTTPException(status_code=404, detail="User not found")
 
     # Verify current password
-    if not verify_password(current_password, db_user.hashed_password):
+    hashed_password = user_doc.to_dict().get('hashed_password')
+    if not hashed_password or not await verify_password_async(current_password, hashed_password):
         raise HTTPException(status_code=400, detail="Current password is incorrect")
 
     # Update password
-    db_user.hashed_password = get_password_hash(new_password)
-    db.commit()
+    await revoke_tokens_async(db, user_id, {'hashed_password': await get_password_hash_async(new_password)})
 
     return True
 
 
-def deactivate_user(db: Session, user_id: int) -> bool:
+def deactivate_user(db: firestore.Client, user_id: str) -> bool:
     """Deactivate a user account."""
-    db_user = get_user(db, user_id)
+    get_user(db, user_id)
 
     # Set user as inactive
-    db_user.is_active = False
-    db.commit()
+    revoke_tokens(db, user_id, {'is_active': False})
 
     return True
 
 
-def search_users(db: firestore.Client, query: str, skip: int = 0, limit: int = 20) -> List[User]:
-    """Search for users by name or email."""
-    users_ref = db.collection('users')
-    
-    # Firestore doesn't support OR queries directly, so we'll do multiple queries
-    first_name_query = users_ref.where('first_name', '>=', query).where('first_name', '<=', query + '\uf8ff')
-    last_name_query = users_ref.where('last_name', '>=', query).where('last_name', '<=', query + '\uf8ff')
-    email_query = users_ref.where('email', '>=', query).where('email', '<=', query + '\uf8ff')
-    
-    # Get results from all queries
-    results = set()
-    for doc in first_name_query.get():
-        results.add((doc.id, doc.to_dict()))
-    for doc in last_name_query.get():
-        results.add((doc.id, doc.to_dict()))
-    for doc in email_query.get():
-        results.add((doc.id, doc.to_dict()))
+def _search_queries(users_ref, query: str) -> list:
+    """Prefix queries on first name, last name and email.
+
+    Firestore doesn't support OR queries directly, so we'll do multiple queries.
+    """
+    return [
+        users_ref.where(field, '>=', query).where(field, '<=', query + '\uf8ff')
+        for field in ('first_name', 'last_name', 'email')
+    ]
+
+
+def _merge_search_results(result_sets: list, skip: int, limit: int) -> List[User]:
+    # A user can match more than one query; keep the first occurrence
+    results = {}
+    for docs in result_sets:
+        for doc in docs:
+            results.setdefault(doc.id, doc.to_dict())
     
     # Convert to User objects and apply pagination
-    users = [User.from_dict(data, doc_id) for doc_id, data in results]
+    users = [User.from_dict(data, doc_id) for doc_id, data in results.items()]
     return users[skip:skip + limit]
 
 
+def search_users(db: firestore.Client, query: str, skip: int = 0, limit: int = 20) -> List[User]:
+    """Search for users by name or email."""
+    result_sets = [search_query.get() for search_query in _search_queries(db.collection('users'), query)]
+    return _merge_search_results(result_sets, skip, limit)
+
+
+async def search_users_async(db: firestore_async.AsyncClient, query: str, skip: int = 0,
+                             limit: int = 20) -> List[User]:
+    """Search for users by name or email, running the three queries concurrently."""
+    result_sets = await asyncio.gather(
+        *(search_query.get() for search_query in _search_queries(db.collection('users'), query))
+    )
+    return _merge_search_results(result_sets, skip, limit)
+
+
 def count_search_users(db: firestore.Client, query: str) -> int:
     """Count the number of users matching a search query."""
-    users_ref = db.collection('users')
-    
-    # Similar to search_users but just count
-    first_name_query = users_ref.where('first_name', '>=', query).where('first_name', '<=', query + '\uf8ff')
-    last_name_query = users_ref.where('last_name', '>=', query).where('last_name', '<=', query + '\uf8ff')
-    email_query = users_ref.where('email', '>=', query).where('email', '<=', query + '\uf8ff')
-    
     results = set()
-    for doc in first_name_query.get():
-        results.add(doc.id)
-    for doc in last_name_query.get():
-        results.add(doc.id)
-    for doc in email_query.get():
-        results.add(doc.id)
+    for search_query in _search_queries(db.collection('users'), query):
+        for doc in search_query.get():
+            results.add(doc.id)
     
     return len(results)
\ No newline at end of file
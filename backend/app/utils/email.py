@@ -1,9 +1,25 @@
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from string import Template
 from typing import List, Optional
+from urllib.parse import quote
 
 from app.config import settings
+from app.core.mail_queue import MailQueue
+
+
+mail_queue = MailQueue(
+    settings.MAIL_SERVER,
+    settings.MAIL_PORT,
+    settings.MAIL_USERNAME,
+    settings.MAIL_PASSWORD,
+    use_tls=settings.MAIL_USE_TLS,
+    workers=settings.MAIL_WORKERS,
+    batch_size=settings.MAIL_BATCH_SIZE,
+    max_retries=settings.MAIL_MAX_RETRIES,
+    retry_backoff=settings.MAIL_RETRY_BACKOFF_SECONDS,
+    idle_timeout=settings.MAIL_IDLE_TIMEOUT_SECONDS
+)
 
 
 def send_email(
@@ -13,7 +29,7 @@ def send_email(
         cc: Optional[List[str]] = None,
         bcc: Optional[List[str]] = None
 ) -> bool:
-    """Send an email using SMTP server defined in settings."""
+    """Queue an email for delivery over the SMTP server defined in settings."""
 
     if not settings.MAIL_USERNAME or not settings.MAIL_PASSWORD:
         # In development, just print the email content
@@ -29,59 +45,54 @@ def send_email(
 
     if cc:
         message["Cc"] = ", ".join(cc)
-    if bcc:
-        message["Bcc"] = ", ".join(bcc)
 
     # Add HTML content
     html_part = MIMEText(html_content, "html")
     message.attach(html_part)
 
-    try:
-        server = smtplib.SMTP(settings.MAIL_SERVER, settings.MAIL_PORT)
-        server.starttls()
-        server.login(settings.MAIL_USERNAME, settings.MAIL_PASSWORD)
-
-        recipients = to_email.copy()
-        if cc:
-            recipients.extend(cc)
-        if bcc:
-            recipients.extend(bcc)
+    recipients = to_email.copy()
+    if cc:
+        recipients.extend(cc)
+    if bcc:
+        recipients.extend(bcc)
 
-        server.sendmail(settings.MAIL_FROM, recipients, message.as_string())
-        server.quit()
-        return True
-    except Exception as e:
-        print(f"Failed to send email: {str(e)}")
-        return False
+    mail_queue.enqueue(settings.MAIL_FROM, recipients, message.as_string())
+    return True
 
 
-def send_verification_email(to_email: str, verification_code: str) -> bool:
-    """Send a verification email to the user."""
-    subject = "Verify your LinkedOut account"
-    html_content = f"""
+# Parsed once at import; rendering only substitutes the per-message values
+VERIFICATION_SUBJECT = "Verify your LinkedOut account"
+VERIFICATION_TEMPLATE = Template("""
     <html>
         <body>
             <h1>Welcome to LinkedOut!</h1>
             <p>Please verify your email address by clicking the link below:</p>
-            <p><a href="http://localhost:3000/verify-email?token={verification_code}">Verify Email</a></p>
+            <p><a href="http://localhost:3000/verify-email?token=$token">Verify Email</a></p>
             <p>If you didn't sign up for LinkedOut, please ignore this email.</p>
         </body>
     </html>
-    """
-    return send_email([to_email], subject, html_content)
-
+    """)
 
-def send_password_reset_email(to_email: str, reset_token: str) -> bool:
-    """Send a password reset email to the user."""
-    subject = "Reset your LinkedOut password"
-    html_content = f"""
+PASSWORD_RESET_SUBJECT = "Reset your LinkedOut password"
+PASSWORD_RESET_TEMPLATE = Template("""
     <html>
         <body>
             <h1>Reset your password</h1>
             <p>Click the link below to reset your password:</p>
-            <p><a href="http://localhost:3000/reset-password?token={reset_token}">Reset Password</a></p>
+            <p><a href="http://localhost:3000/reset-password?token=$token">Reset Password</a></p>
             <p>If you didn't request a password reset, please ignore this email.</p>
         </body>
     </html>
-    """
-    return send_email([to_email], subject, html_content)
\ No newline at end of file
+    """)
+
+
+def send_verification_email(to_email: str, verification_code: str) -> bool:
+    """Send a verification email to the user."""
+    html_content = VERIFICATION_TEMPLATE.substitute(token=quote(verification_code))
+    return send_email([to_email], VERIFICATION_SUBJECT, html_content)
+
+
+def send_password_reset_email(to_email: str, reset_token: str) -> bool:
+    """Send a password reset email to the user."""
+    html_content = PASSWORD_RESET_TEMPLATE.substitute(token=quote(reset_token))
+    return send_email([to_email], PASSWORD_RESET_SUBJECT, html_content)
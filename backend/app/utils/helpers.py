@@ -1,13 +1,17 @@
 import os
-import uuid
+import json
+import base64
+import hashlib
+import tempfile
 from datetime import datetime
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 import re
 from fastapi import UploadFile, HTTPException
-from PIL import Image
-import io
+from firebase_admin import firestore
 
 from app.config import settings
+from app.core.media_store import media_store
+from app.database import get_db
 
 
 def slugify(text: str) -> str:
@@ -18,106 +22,129 @@ def slugify(text: str) -> str:
     return text
 
 
-def save_upload_file(file: UploadFile, folder: str) -> str:
-    """Save an uploaded file and return the file path."""
+# Magic numbers checked against the first bytes of an upload
+FILE_SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"%PDF-", "application/pdf"),
+]
+CONTENT_TYPE_EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/gif": ".gif",
+    "image/webp": ".webp",
+    "application/pdf": ".pdf",
+}
+IMAGE_CONTENT_TYPES = {"image/jpeg", "image/png", "image/gif", "image/webp"}
+
+
+def sniff_content_type(head: bytes) -> Optional[str]:
+    """Detect a file's type from its first bytes, or None if unrecognised."""
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, content_type in FILE_SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    return None
+
+
+def _stream_to_temp_file(file: UploadFile, max_bytes: int) -> Tuple[str, str, int, Optional[str]]:
+    """Copy an upload into a temporary file in fixed-size chunks.
+
+    Returns the temporary path, the SHA-256 of the contents, the size and the
+    sniffed content type. Raises 413 as soon as more than max_bytes have
+    been read.
+    """
+    too_large = HTTPException(status_code=413, detail=f"File exceeds the {max_bytes} byte upload limit")
+
+    # Multipart parsing already knows the size; reject before copying anything
+    if file.size is not None and file.size > max_bytes:
+        raise too_large
+
+    # Stage on the same filesystem as the store so the final move is a rename
+    incoming_dir = os.path.join(settings.UPLOADS_DIR, ".incoming")
+    os.makedirs(incoming_dir, exist_ok=True)
+
+    fd, temp_path = tempfile.mkstemp(dir=incoming_dir)
+    digest = hashlib.sha256()
+    size = 0
+    content_type = None
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                chunk = file.file.read(settings.UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                if size == 0:
+                    content_type = sniff_content_type(chunk)
+                size += len(chunk)
+                if size > max_bytes:
+                    raise too_large
+                digest.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+    return temp_path, digest.hexdigest(), size, content_type
+
+
+def save_upload_file(
+        file: UploadFile,
+        allowed_types: Optional[set] = None,
+        max_bytes: Optional[int] = None
+) -> str:
+    """Save an uploaded file to the media store and return the file path.
+
+    The file is streamed to disk and its type is taken from its contents,
+    not from the client-supplied content type. Identical content is stored
+    once and shared.
+    """
     if not file:
         return None
 
-    # Create the folder if it doesn't exist
-    upload_dir = os.path.join(settings.UPLOADS_DIR, folder)
-    os.makedirs(upload_dir, exist_ok=True)
-
-    # Generate a unique filename
-    filename = f"{uuid.uuid4()}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    temp_path, digest, size, content_type = _stream_to_temp_file(file, max_bytes or settings.MAX_UPLOAD_BYTES)
 
-    # Get the file extension
-    content_type = file.content_type
-    if content_type == "image/jpeg":
-        ext = ".jpg"
-    elif content_type == "image/png":
-        ext = ".png"
-    elif content_type == "image/gif":
-        ext = ".gif"
-    else:
-        ext = os.path.splitext(file.filename)[1]
+    if allowed_types is not None and content_type not in allowed_types:
+        os.remove(temp_path)
+        raise HTTPException(status_code=400, detail="Unsupported file type")
 
-    # Create the full file path
-    file_path = os.path.join(upload_dir, f"{filename}{ext}")
-
-    # Save the file
-    with open(file_path, "wb") as f:
-        f.write(file.file.read())
+    # Get the file extension from the sniffed type, falling back to the client's name
+    ext = CONTENT_TYPE_EXTENSIONS.get(content_type)
+    if ext is None:
+        ext = os.path.splitext(file.filename or "")[1]
+        if not re.fullmatch(r"\.[A-Za-z0-9]{1,10}", ext):
+            ext = ""
 
     # Return the path relative to the UPLOADS_DIR
-    return f"{folder}/{filename}{ext}"
+    return media_store.add(get_db(), temp_path, digest, ext, metadata={
+        "content_type": content_type,
+        "size": size,
+        "created_at": datetime.utcnow()
+    })
 
 
-def save_image_with_resize(
-        file: UploadFile,
-        folder: str,
-        max_width: Optional[int] = 1200,
-        max_height: Optional[int] = 1200,
-        quality: int = 85
-) -> str:
-    """Save an image file with resizing and return the file path."""
+def save_image_upload(file: UploadFile) -> str:
+    """Save an uploaded image as received and return the file path.
+
+    Resized variants are generated later by the media service.
+    """
     if not file:
         return None
 
-    if not file.content_type.startswith("image/"):
-        raise HTTPException(status_code=400, detail="File is not an image")
+    return save_upload_file(file, allowed_types=IMAGE_CONTENT_TYPES, max_bytes=settings.MAX_IMAGE_UPLOAD_BYTES)
 
-    # Read the image
-    contents = file.file.read()
-    file.file.seek(0)  # Reset file pointer
 
-    try:
-        img = Image.open(io.BytesIO(contents))
-    except Exception:
-        raise HTTPException(status_code=400, detail="Invalid image file")
-
-    # Resize the image if needed
-    width, height = img.size
-    if max_width and max_height and (width > max_width or height > max_height):
-        # Calculate new dimensions while preserving aspect ratio
-        ratio = min(max_width / width, max_height / height)
-        new_width = int(width * ratio)
-        new_height = int(height * ratio)
-        img = img.resize((new_width, new_height), Image.LANCZOS)
-
-    # Create the folder if it doesn't exist
-    upload_dir = os.path.join(settings.UPLOADS_DIR, folder)
-    os.makedirs(upload_dir, exist_ok=True)
-
-    # Generate a unique filename
-    filename = f"{uuid.uuid4()}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-
-    # Get the file extension
-    content_type = file.content_type
-    if content_type == "image/jpeg":
-        ext = ".jpg"
-        save_format = "JPEG"
-    elif content_type == "image/png":
-        ext = ".png"
-        save_format = "PNG"
-    elif content_type == "image/gif":
-        ext = ".gif"
-        save_format = "GIF"
-    else:
-        ext = ".jpg"
-        save_format = "JPEG"
-
-    # Create the full file path
-    file_path = os.path.join(upload_dir, f"{filename}{ext}")
-
-    # Save the image
-    img.save(file_path, format=save_format, quality=quality)
-
-    # Return the path relative to the UPLOADS_DIR
-    return f"{folder}/{filename}{ext}"
+def delete_file(file_path: str) -> bool:
+    """Delete a file from the uploads directory.
 
+    Files in the media store are only removed once nothing references them.
+    """
+    if media_store.is_managed(file_path):
+        return media_store.release(get_db(), file_path)
 
-def delete_file(file_path: str) -> bool:
-    """Delete a file from the uploads directory."""
     full_path = os.path.join(settings.UPLOADS_DIR, file_path)
     if os.path.exists(full_path):
         os.remove(full_path)
@@ -132,15 +159,104 @@ def get_file_url(file_path: str) -> str:
     return f"{settings.MEDIA_URL}{file_path}"
 
 
+def encode_cursor(created_at: datetime, doc_id: str) -> str:
+    """Create an opaque pagination cursor from a document's sort key."""
+    payload = json.dumps({"t": created_at.isoformat(), "id": doc_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Decode a cursor created by encode_cursor."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(payload["t"]), payload["id"]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+
+def paginate_query(query, skip: int = 0, limit: int = 20, cursor: Optional[str] = None):
+    """Apply keyset pagination to a Firestore query ordered by created_at descending.
+
+    The cursor resumes after the last document of the previous page, so deep
+    pages cost the same as the first one. Offsets are only used as a
+    compatibility path when no cursor is given.
+    """
+    query = query.order_by('__name__', direction=firestore.Query.DESCENDING)
+
+    if cursor:
+        created_at, doc_id = decode_cursor(cursor)
+        query = query.start_after({"created_at": created_at, "__name__": doc_id})
+    elif skip > 0:
+        query = query.offset(skip)
+
+    if limit > 0:
+        query = query.limit(limit)
+
+    return query
+
+
+def parse_fields(fields: Optional[str], allowed: List[str]) -> Optional[List[str]]:
+    """Split a comma-separated fields= parameter, rejecting names the documents do not have."""
+    if not fields:
+        return None
+
+    names = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+
+    # Cursors are built from created_at, so list pages always carry it
+    if "created_at" not in names:
+        names.append("created_at")
+    return names
+
+
+def project_document(doc, id_field: str, fields: List[str]) -> Dict[str, Any]:
+    """A document reduced to the selected fields, plus its ID under id_field."""
+    data = doc.to_dict() or {}
+    return {id_field: doc.id, **{field: data.get(field) for field in fields}}
+
+
+def list_items(docs, summary_model, id_field: str, fields: Optional[List[str]] = None) -> list:
+    """Build list-page items from projected documents: summary models, or dicts of the requested fields."""
+    if fields:
+        return [project_document(doc, id_field, fields) for doc in docs]
+    return [summary_model.from_dict(doc.to_dict(), doc.id) for doc in docs]
+
+
 def paginate_response(
         items: List[Any],
         page: int,
         limit: int,
         total: int,
-        additional_data: Optional[Dict[str, Any]] = None
+        additional_data: Optional[Dict[str, Any]] = None,
+        cursor_field: Optional[str] = None,
+        cursor_time_field: str = "created_at",
+        next_cursor: Optional[str] = None
 ) -> Dict[str, Any]:
-    """Create a paginated response."""
+    """Create a paginated response.
+
+    When cursor_field names the ID attribute of the items, a full page also
+    returns a next_cursor that the client can send back instead of a page.
+    Lists that drop entries while hydrating pass the cursor of the last
+    scanned entry as next_cursor instead, since their pages can come up short.
+    No cursor is returned from the last page, so clients paging by cursor
+    should keep sending the page number along with it.
+    """
     total_pages = (total + limit - 1) // limit
+    has_next = page < total_pages
+
+    if not has_next:
+        next_cursor = None
+    elif next_cursor is None and cursor_field and items and len(items) >= limit:
+        # Items are models, or plain dicts when the client picked the fields
+        last_item = items[-1]
+        if isinstance(last_item, dict):
+            last_time, last_id = last_item.get(cursor_time_field), last_item.get(cursor_field)
+        else:
+            last_time, last_id = getattr(last_item, cursor_time_field), getattr(last_item, cursor_field)
+        next_cursor = encode_cursor(last_time, last_id)
 
     response = {
         "items": items,
@@ -148,11 +264,12 @@ def paginate_response(
         "limit": limit,
         "total": total,
         "total_pages": total_pages,
-        "has_next": page < total_pages,
-        "has_prev": page > 1
+        "has_next": has_next,
+        "has_prev": page > 1,
+        "next_cursor": next_cursor
     }
 
     if additional_data:
         response.update(additional_data)
 
-    return response
\ No newline at end of file
+    return response
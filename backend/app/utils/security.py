@@ -1,5 +1,5 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 import secrets
@@ -7,26 +7,72 @@ import string
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from firebase_admin import firestore, firestore_async
 
 from app.config import settings
-from app.database import get_db
+from app.core.cache import TTLCache
+from app.core.hashing import HashingOverloadedError, HashingPool
+from app.database import get_async_db, get_db
 from app.model.user import User
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
+hashing_pool = HashingPool(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_QUEUE)
+
+# Authenticated users keyed by ID. Entries are checked against the token
+# version claim, so a bumped version sends the next request to storage.
+principal_cache = TTLCache(settings.PRINCIPAL_CACHE_TTL_SECONDS)
+
+
+def _overloaded() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many authentication requests, please retry shortly",
+        headers={"Retry-After": "1"},
+    )
 
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    try:
+        return hashing_pool.run(pwd_context.hash, password)
+    except HashingOverloadedError:
+        raise _overloaded()
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    try:
+        return hashing_pool.run(pwd_context.verify, plain_password, hashed_password)
+    except HashingOverloadedError:
+        raise _overloaded()
+
+
+async def get_password_hash_async(password: str) -> str:
+    try:
+        return await hashing_pool.run_async(pwd_context.hash, password)
+    except HashingOverloadedError:
+        raise _overloaded()
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    try:
+        return await hashing_pool.run_async(pwd_context.verify, plain_password, hashed_password)
+    except HashingOverloadedError:
+        raise _overloaded()
+
+
+def principal_claims(user: User) -> dict:
+    """Claims get_current_user checks a cached principal against.
 
+    Role and active state are not carried: they come from the principal, and
+    deactivating a user bumps the token version anyway.
+    """
+    return {"ver": user.token_version}
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
+
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None, user: Optional[User] = None) -> str:
     to_encode = data.copy()
+    if user is not None:
+        to_encode.update(principal_claims(user))
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
@@ -41,27 +87,108 @@ def generate_verification_code(length: int = 32) -> str:
     return ''.join(secrets.choice(alphabet) for _ in range(length))
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
-    credentials_exception = HTTPException(
+def invalidate_principal(user_id: str) -> None:
+    """Drop a user from this process's principal cache."""
+    principal_cache.delete(user_id)
+
+
+def _cache_principal(user_id: str, user_doc) -> Optional[User]:
+    if not user_doc.exists:
+        principal_cache.delete(user_id)
+        return None
+
+    user = User.from_dict(user_doc.to_dict(), user_doc.id)
+    principal_cache.set(user_id, user)
+    return user
+
+
+def _load_principal(db: firestore.Client, user_id: str) -> Optional[User]:
+    return _cache_principal(user_id, db.collection('users').document(user_id).get())
+
+
+async def _load_principal_async(db: firestore_async.AsyncClient, user_id: str) -> Optional[User]:
+    return _cache_principal(user_id, await db.collection('users').document(user_id).get())
+
+
+def _token_claims(token: str) -> Optional[Tuple[str, int]]:
+    """The user ID and token version an access token carries, or None if it is invalid."""
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        return None
+    user_id: Optional[str] = payload.get("sub")
+    if user_id is None:
+        return None
+
+    # Tokens issued before version claims existed carry version 0
+    return user_id, payload.get("ver", 0)
+
+
+def _fresh_cached_principal(user_id: str, token_version: int) -> Optional[User]:
+    # A newer token than the cached user means the version was bumped elsewhere
+    user = principal_cache.get(user_id)
+    if user is None or user.token_version < token_version:
+        return None
+    return user
+
+
+def resolve_principal(db: firestore.Client, token: str) -> Optional[User]:
+    """Return the user an access token belongs to, or None if it is invalid or revoked."""
+    claims = _token_claims(token)
+    if claims is None:
+        return None
+    user_id, token_version = claims
+
+    user = _fresh_cached_principal(user_id, token_version) or _load_principal(db, user_id)
+    if user is None or user.token_version != token_version:
+        return None
+    return user
+
+
+async def resolve_principal_async(db: firestore_async.AsyncClient, token: str) -> Optional[User]:
+    """resolve_principal for the async client; a cache hit never leaves the event loop."""
+    claims = _token_claims(token)
+    if claims is None:
+        return None
+    user_id, token_version = claims
+
+    user = _fresh_cached_principal(user_id, token_version) or await _load_principal_async(db, user_id)
+    if user is None or user.token_version != token_version:
+        return None
+    return user
+
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        user_id: Optional[int] = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
 
-    user = db.query(User).filter(User.id == user_id).first()
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: firestore.Client = Depends(get_db)) -> User:
+    user = resolve_principal(db, token)
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
     return user
 
 
 def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
-    return current_user
\ No newline at end of file
+    return current_user
+
+
+async def get_current_user_async(token: str = Depends(oauth2_scheme),
+                                 db: firestore_async.AsyncClient = Depends(get_async_db)) -> User:
+    """get_current_user for async endpoints, so authentication does not take a worker thread."""
+    user = await resolve_principal_async(db, token)
+    if user is None:
+        raise _credentials_exception()
+    return user
+
+
+async def get_current_active_user_async(current_user: User = Depends(get_current_user_async)) -> User:
+    if not current_user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return current_user
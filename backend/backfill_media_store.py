@@ -0,0 +1,24 @@
+"""
+Move uploaded images from the old flat folders into the content-addressed media store.
+Run with: python -m backfill_media_store
+"""
+
+import logging
+import sys
+
+# Initialize the Firebase app before the Firestore client is created
+import app.core.firebase_config  # noqa: F401
+from app.database import get_db
+from app.service.media import backfill_media_store
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    stream=sys.stdout
+)
+logger = logging.getLogger(__name__)
+
+
+if __name__ == "__main__":
+    stats = backfill_media_store(get_db())
+    logger.info(f"Migrated {stats['migrated']} of {stats['scanned']} legacy images ({stats['missing']} missing on disk)")
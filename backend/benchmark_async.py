@@ -0,0 +1,105 @@
+"""
+Compare the async Firestore endpoints against their threadpool equivalents under concurrency.
+Run with: python -m benchmark_async --user-id USER_ID [--requests N] [--concurrency C] [--threads T]
+
+Both apps serve the same reads from the live Firestore project: a user
+lookup and a user search. The sync app runs the blocking services on the
+anyio threadpool like the endpoints did before; the async app is the real
+user router. The threadpool is capped at --threads for both, so with more
+concurrent requests than threads the sync app queues for a slot while the
+async app keeps its requests on the event loop.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List
+
+import anyio
+import httpx
+from fastapi import Depends, FastAPI, Query
+
+import app.core.firebase_config  # noqa: F401
+from app.controller.user import router as user_router
+from app.database import get_db
+from app.model.user import User
+from app.service import user as user_service
+from app.utils.security import create_access_token, get_current_active_user
+
+
+def _build_apps():
+    sync_app = FastAPI()
+
+    @sync_app.get("/users/{user_id}")
+    def get_user(user_id: str, current_user: User = Depends(get_current_active_user), db=Depends(get_db)):
+        return user_service.get_user(db, user_id).to_dict()
+
+    @sync_app.get("/users/")
+    def search_users(query: str = Query(...), current_user: User = Depends(get_current_active_user),
+                     db=Depends(get_db)):
+        return [user.to_dict() for user in user_service.search_users(db, query)]
+
+    async_app = FastAPI()
+    async_app.include_router(user_router, prefix="/users")
+    return {"threadpool": sync_app, "async": async_app}
+
+
+async def _run(bench_app, path: str, headers: dict, requests: int, concurrency: int) -> dict:
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    latencies: List[float] = []
+    peak_threads = 0
+
+    transport = httpx.ASGITransport(app=bench_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        remaining = iter(range(requests))
+
+        async def worker():
+            nonlocal peak_threads
+            for _ in remaining:
+                start = time.perf_counter()
+                response = await client.get(path, headers=headers)
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+                peak_threads = max(peak_threads, limiter.borrowed_tokens)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "rate": requests / elapsed,
+        "p50": statistics.median(latencies) * 1000,
+        "p95": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "threads": peak_threads,
+    }
+
+
+async def main(user_id: str, requests: int, concurrency: int, threads: int) -> None:
+    anyio.to_thread.current_default_thread_limiter().total_tokens = threads
+
+    user = user_service.get_user(get_db(), user_id)
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': user_id}, user=user)}"}
+    scenarios = {
+        "get user": f"/users/{user_id}",
+        "search users": f"/users/?query={user.first_name[:2]}",
+    }
+
+    print(f"{requests} requests, concurrency {concurrency}, {threads} threadpool slots")
+    for name, bench_app in _build_apps().items():
+        for scenario, path in scenarios.items():
+            result = await _run(bench_app, path, headers, requests, concurrency)
+            print(f"  {name:<10} {scenario:<12} {result['rate']:8.0f} req/s  "
+                  f"p50 {result['p50']:6.1f} ms  p95 {result['p95']:6.1f} ms  "
+                  f"threads in use {result['threads']}/{threads}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--user-id", required=True, help="ID of an existing user to authenticate and look up")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+    asyncio.run(main(args.user_id, args.requests, args.concurrency, args.threads))
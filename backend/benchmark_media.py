@@ -0,0 +1,83 @@
+"""
+Compare media serving throughput of the media router against a plain StaticFiles mount.
+Run with: python -m benchmark_media [--requests N] [--concurrency C] [--size BYTES]
+
+Both apps are driven in-process over ASGI, so the numbers compare the
+request handling of the two implementations (validators, 304s, ranges)
+rather than network or sendfile throughput.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+
+import httpx
+from fastapi import FastAPI
+from fastapi.staticfiles import StaticFiles
+
+from app.config import settings
+from app.controller.media import router as media_router
+from app.core.media_store import media_store
+
+
+def _build_apps(uploads_dir: str):
+    static_app = FastAPI()
+    static_app.mount("/media", StaticFiles(directory=uploads_dir), name="media")
+
+    media_app = FastAPI()
+    media_app.include_router(media_router, prefix="/media")
+    return {"StaticFiles": static_app, "media router": media_app}
+
+
+async def _run(app, path: str, headers: dict, requests: int, concurrency: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        remaining = iter(range(requests))
+
+        async def worker():
+            for _ in remaining:
+                response = await client.get(path, headers=headers)
+                await response.aread()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return requests / (time.perf_counter() - start)
+
+
+async def main(requests: int, concurrency: int, size: int) -> None:
+    with tempfile.TemporaryDirectory() as uploads_dir:
+        settings.UPLOADS_DIR = uploads_dir
+        media_store.root = uploads_dir
+
+        content = os.urandom(size)
+        path = media_store.object_path(hashlib.sha256(content).hexdigest(), ".jpg")
+        os.makedirs(os.path.join(uploads_dir, os.path.dirname(path)))
+        with open(os.path.join(uploads_dir, path), "wb") as f:
+            f.write(content)
+
+        print(f"{requests} requests, concurrency {concurrency}, {size} byte file")
+        for name, app in _build_apps(uploads_dir).items():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                etag = (await client.get(f"/media/{path}")).headers["etag"]
+
+            scenarios = {
+                "full download": {},
+                "revalidation": {"If-None-Match": etag},
+                "range": {"Range": "bytes=0-1023"},
+            }
+            for scenario, headers in scenarios.items():
+                rate = await _run(app, f"/media/{path}", headers, requests, concurrency)
+                print(f"  {name:<13} {scenario:<14} {rate:10.0f} req/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--size", type=int, default=200 * 1024)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency, args.size))
@@ -0,0 +1,26 @@
+"""
+Rebuild the full-text search segments from Firestore.
+Run with: python -m rebuild_search_index
+"""
+
+import logging
+import sys
+
+# Initialize the Firebase app before the Firestore client is created
+import app.core.firebase_config  # noqa: F401
+from app.database import get_db
+from app.service.job import rebuild_job_index
+from app.service.post import rebuild_post_index
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    stream=sys.stdout
+)
+logger = logging.getLogger(__name__)
+
+
+if __name__ == "__main__":
+    db = get_db()
+    logger.info(f"Indexed {rebuild_post_index(db)} posts")
+    logger.info(f"Indexed {rebuild_job_index(db)} jobs")
@@ -0,0 +1,36 @@
+"""
+Rebuild every user's feed timeline from the posts and connections collections.
+Run with: python -m rebuild_timelines [--keep-existing]
+"""
+
+import argparse
+import logging
+import sys
+
+# Initialize the Firebase app before the Firestore client is created
+import app.core.firebase_config  # noqa: F401
+from app.database import get_db
+from app.service.feed import rebuild_timelines
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    stream=sys.stdout
+)
+logger = logging.getLogger(__name__)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill feed timelines.")
+    parser.add_argument(
+        "--keep-existing",
+        action="store_true",
+        help="Write over existing timeline entries instead of clearing them first"
+    )
+    args = parser.parse_args()
+
+    stats = rebuild_timelines(get_db(), clear=not args.keep_existing)
+    logger.info(
+        f"Rebuilt {stats['timelines']} timelines from {stats['posts']} posts "
+        f"({stats['celebrities']} celebrity authors, {stats['writes']} writes)"
+    )
@@ -0,0 +1,24 @@
+"""
+Repair drift in the denormalized likes_count/comments_count post counters.
+Run with: python -m reconcile_engagement
+"""
+
+import logging
+import sys
+
+# Initialize the Firebase app before the Firestore client is created
+import app.core.firebase_config  # noqa: F401
+from app.database import get_db
+from app.service.post import reconcile_engagement_counts
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    stream=sys.stdout
+)
+logger = logging.getLogger(__name__)
+
+
+if __name__ == "__main__":
+    stats = reconcile_engagement_counts(get_db())
+    logger.info(f"Checked {stats['posts']} posts, repaired {stats['repaired']} counters")
@@ -0,0 +1,34 @@
+"""
+Repair drift in the per-user unread notification counters.
+Run with: python -m reconcile_notification_counters [--every SECONDS]
+"""
+
+import argparse
+import logging
+import sys
+import time
+
+# Initialize the Firebase app before the Firestore client is created
+import app.core.firebase_config  # noqa: F401
+from app.database import get_db
+from app.service.notification import reconcile_unread_counters
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    stream=sys.stdout
+)
+logger = logging.getLogger(__name__)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Repair drift in unread notification counters")
+    parser.add_argument("--every", type=float, default=0, help="Keep running, reconciling every SECONDS")
+    args = parser.parse_args()
+
+    while True:
+        stats = reconcile_unread_counters(get_db())
+        logger.info(f"Checked {stats['counters']} counters, repaired {stats['repaired']}")
+        if args.every <= 0:
+            break
+        time.sleep(args.every)
@@ -0,0 +1,148 @@
+import socket
+
+import pytest
+from aiosmtpd.controller import Controller
+
+from app.core.mail_queue import MailQueue
+
+SENDER = "info@linkedout.com"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _message(subject: str) -> str:
+    return f"Subject: {subject}\r\n\r\nHello\r\n"
+
+
+class SinkHandler:
+    """Record delivered mail, refusing bounce@ recipients and spam, and failing flaky messages once."""
+
+    def __init__(self):
+        self.messages = []
+        self.sessions = set()
+        self.flaky_failures = 0
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith("bounce@"):
+            return "550 5.1.1 No such user"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.sessions.add(id(session))
+        content = envelope.content.decode()
+        if "Subject: flaky" in content and not self.flaky_failures:
+            self.flaky_failures += 1
+            return "451 4.3.0 Try again later"
+        if "Subject: spam" in content:
+            return "554 5.7.1 Message rejected as spam"
+        self.messages.append((envelope.rcpt_tos, content))
+        return "250 Message accepted"
+
+
+@pytest.fixture
+def port():
+    return _free_port()
+
+
+@pytest.fixture
+def handler():
+    return SinkHandler()
+
+
+@pytest.fixture
+def sink(handler, port):
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    yield controller
+    controller.stop()
+
+
+@pytest.fixture
+def mail_queue(port):
+    return MailQueue("127.0.0.1", port, use_tls=False, batch_size=10, max_retries=3,
+                     retry_backoff=0.01, idle_timeout=30.0, timeout=5.0)
+
+
+def test_batch_is_sent_over_one_session(sink, handler, mail_queue):
+    for index in range(5):
+        mail_queue.enqueue(SENDER, [f"user{index}@example.com"], _message(f"message {index}"))
+
+    assert mail_queue.join(timeout=10)
+    assert len(handler.messages) == 5
+    assert len(handler.sessions) == 1
+    assert mail_queue.metrics()["connections"] == 1
+    assert mail_queue.metrics()["sent"] == 5
+
+
+def test_reconnects_after_server_drops_session(handler, port, mail_queue):
+    server = Controller(handler, hostname="127.0.0.1", port=port)
+    server.start()
+    try:
+        mail_queue.enqueue(SENDER, ["first@example.com"], _message("first"))
+        assert mail_queue.join(timeout=10)
+    finally:
+        server.stop()
+
+    # The restarted server has dropped the session the worker is holding open
+    server = Controller(handler, hostname="127.0.0.1", port=port)
+    server.start()
+    try:
+        mail_queue.enqueue(SENDER, ["second@example.com"], _message("second"))
+        assert mail_queue.join(timeout=10)
+    finally:
+        server.stop()
+
+    metrics = mail_queue.metrics()
+    assert [recipients for recipients, _ in handler.messages] == [["first@example.com"], ["second@example.com"]]
+    assert metrics["connections"] == 2
+    assert metrics["sent"] == 2
+    assert metrics["failed"] == 0
+
+
+def test_transient_failure_is_retried(sink, handler, mail_queue):
+    mail_queue.enqueue(SENDER, ["user@example.com"], _message("flaky"))
+
+    assert mail_queue.join(timeout=10)
+    metrics = mail_queue.metrics()
+    assert handler.flaky_failures == 1
+    assert len(handler.messages) == 1
+    assert metrics["retried"] == 1
+    assert metrics["sent"] == 1
+
+
+def test_permanent_failure_is_not_retried(sink, handler, mail_queue):
+    mail_queue.enqueue(SENDER, ["bounce@example.com"], _message("refused"))
+    mail_queue.enqueue(SENDER, ["user@example.com"], _message("after"))
+
+    assert mail_queue.join(timeout=10)
+    metrics = mail_queue.metrics()
+    assert metrics["failed"] == 1
+    assert metrics["retried"] == 0
+    assert metrics["sent"] == 1
+    # The refusal does not cost the session
+    assert metrics["connections"] == 1
+
+
+def test_permanent_data_rejection_is_not_retried(sink, handler, mail_queue):
+    mail_queue.enqueue(SENDER, ["user@example.com"], _message("spam"))
+
+    assert mail_queue.join(timeout=10)
+    metrics = mail_queue.metrics()
+    assert handler.messages == []
+    assert metrics["failed"] == 1
+    assert metrics["retried"] == 0
+
+
+def test_partially_refused_recipients_are_counted(sink, handler, mail_queue):
+    mail_queue.enqueue(SENDER, ["user@example.com", "bounce@example.com"], _message("partial"))
+
+    assert mail_queue.join(timeout=10)
+    metrics = mail_queue.metrics()
+    assert handler.messages[0][0] == ["user@example.com"]
+    assert metrics["sent"] == 1
+    assert metrics["refused_recipients"] == 1
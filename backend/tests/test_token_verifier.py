@@ -0,0 +1,181 @@
+import base64
+import datetime
+import json
+
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from cryptography.x509.oid import NameOID
+
+from app.core.token_verifier import (
+    FirebaseTokenVerifier, TokenVerificationError, ISSUER_PREFIX, MIN_REFRESH_INTERVAL
+)
+
+PROJECT_ID = "linkedout-test"
+NOW = 1_700_000_000.0
+
+
+def _make_key():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "securetoken")])
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(datetime.datetime(2020, 1, 1))
+        .not_valid_after(datetime.datetime(2040, 1, 1))
+        .sign(key, hashes.SHA256())
+    )
+    return key, certificate.public_bytes(serialization.Encoding.PEM).decode()
+
+
+SIGNING_KEY, SIGNING_CERT = _make_key()
+OTHER_KEY, OTHER_CERT = _make_key()
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def make_token(key=SIGNING_KEY, kid="key-1", **overrides) -> str:
+    claims = {
+        "aud": PROJECT_ID,
+        "iss": ISSUER_PREFIX + PROJECT_ID,
+        "sub": "user-1",
+        "iat": NOW - 60,
+        "exp": NOW + 3600,
+    }
+    claims.update(overrides)
+    header = {"alg": "RS256", "kid": kid, "typ": "JWT"}
+    signing_input = f"{_b64encode(json.dumps(header).encode())}.{_b64encode(json.dumps(claims).encode())}"
+    signature = key.sign(signing_input.encode(), padding.PKCS1v15(), hashes.SHA256())
+    return f"{signing_input}.{_b64encode(signature)}"
+
+
+class FakeClock:
+    def __init__(self, now: float = NOW):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeKeySource:
+    """Serve a fixed set of certificates and count how often they are fetched."""
+
+    def __init__(self, certificates, max_age: float = 3600.0):
+        self.certificates = dict(certificates)
+        self.max_age = max_age
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return dict(self.certificates), self.max_age
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def key_source():
+    return FakeKeySource({"key-1": SIGNING_CERT})
+
+
+@pytest.fixture
+def verifier(key_source, clock):
+    return FirebaseTokenVerifier(PROJECT_ID, key_source=key_source, clock=clock)
+
+
+def test_valid_token_returns_claims_with_uid(verifier):
+    claims = verifier.verify(make_token())
+
+    assert claims["uid"] == "user-1"
+    assert claims["aud"] == PROJECT_ID
+
+
+def test_signature_from_another_key_is_rejected(verifier):
+    with pytest.raises(TokenVerificationError, match="signature"):
+        verifier.verify(make_token(key=OTHER_KEY))
+
+
+def test_tampered_payload_is_rejected(verifier):
+    header, _, signature = make_token().split(".")
+    payload = _b64encode(json.dumps({"sub": "someone-else"}).encode())
+
+    with pytest.raises(TokenVerificationError, match="signature"):
+        verifier.verify(f"{header}.{payload}.{signature}")
+
+
+@pytest.mark.parametrize("claims, message", [
+    ({"aud": "another-project"}, "audience"),
+    ({"iss": ISSUER_PREFIX + "another-project"}, "issuer"),
+])
+def test_wrong_audience_or_issuer_is_rejected(verifier, claims, message):
+    with pytest.raises(TokenVerificationError, match=message):
+        verifier.verify(make_token(**claims))
+
+
+def test_expired_token_is_rejected(verifier):
+    with pytest.raises(TokenVerificationError, match="expired"):
+        verifier.verify(make_token(exp=NOW - verifier.clock_skew - 1))
+
+
+def test_expiry_within_clock_skew_is_accepted(verifier):
+    assert verifier.verify(make_token(exp=NOW - 1))["uid"] == "user-1"
+
+
+def test_unknown_kid_refreshes_keys_at_most_once_per_interval(verifier, key_source, clock):
+    verifier.verify(make_token())
+    assert key_source.calls == 1
+
+    clock.now += MIN_REFRESH_INTERVAL
+    for _ in range(3):
+        with pytest.raises(TokenVerificationError, match="unknown key"):
+            verifier.verify(make_token(kid="key-2"))
+    assert key_source.calls == 2
+
+    # Google rotated the key in; it is picked up once the interval has passed
+    key_source.certificates["key-2"] = OTHER_CERT
+    with pytest.raises(TokenVerificationError, match="unknown key"):
+        verifier.verify(make_token(key=OTHER_KEY, kid="key-2"))
+    assert key_source.calls == 2
+
+    clock.now += MIN_REFRESH_INTERVAL
+    assert verifier.verify(make_token(key=OTHER_KEY, kid="key-2"))["uid"] == "user-1"
+    assert key_source.calls == 3
+
+
+def test_keys_are_refetched_after_max_age(verifier, key_source, clock):
+    verifier.verify(make_token())
+    clock.now += key_source.max_age
+
+    verifier.verify(make_token(sub="user-2"))
+    assert key_source.calls == 2
+
+
+def test_verified_token_is_cached_until_exp(verifier, key_source, clock):
+    token = make_token(exp=NOW + 600)
+    verifier.verify(token)
+
+    # A cache hit skips the signature check, so dropping the key must not matter
+    verifier._keys.clear()
+    clock.now += 599
+    assert verifier.verify(token)["uid"] == "user-1"
+    assert key_source.calls == 1
+
+    # Past exp the token is verified again and, beyond the clock skew, rejected
+    clock.now = NOW + 600 + verifier.clock_skew
+    with pytest.raises(TokenVerificationError):
+        verifier.verify(token)
+
+
+def test_cached_claims_are_not_shared_with_callers(verifier):
+    token = make_token()
+    verifier.verify(token)["uid"] = "tampered"
+
+    assert verifier.verify(token)["uid"] == "user-1"
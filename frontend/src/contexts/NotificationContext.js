@@ -1,6 +1,16 @@
 import React, { createContext, useContext, useState, useEffect } from 'react';
 import { useAuth } from './AuthContext';
-import { getUnreadCount, getNotifications, markAsRead, markAllAsRead, deleteNotification } from '../services/notification';
+import {
+  getUnreadCount,
+  getNotifications,
+  markAsRead,
+  markAllAsRead,
+  deleteNotification,
+  subscribeToNotifications
+} from '../services/notification';
+
+// Safety net in case a pushed event is missed; the socket does the real work
+const FALLBACK_POLL_INTERVAL = 5 * 60 * 1000;
 
 // Create Notification Context
 const NotificationContext = createContext();
@@ -18,12 +28,30 @@ export const NotificationProvider = ({ children }) => {
       fetchNotifications();
       fetchUnreadCount();
 
-      // Set up interval to check for new notifications
+      // New notifications and badge changes are pushed over the socket.
+      // A coalesced notification is pushed again on every update and moves to the top.
+      const unsubscribe = subscribeToNotifications({
+        onNotification: (notification) => {
+          setNotifications(prevNotifications => [
+            notification,
+            ...prevNotifications.filter(n => n.id !== notification.id)
+          ]);
+        },
+        onUnreadDelta: (delta) => {
+          setUnreadCount(prevCount => Math.max(0, prevCount + delta));
+        },
+        // Resync after a reconnect; events sent while disconnected are lost
+        onConnect: () => fetchUnreadCount()
+      });
+
       const interval = setInterval(() => {
         fetchUnreadCount();
-      }, 30000); // Check every 30 seconds
+      }, FALLBACK_POLL_INTERVAL);
 
-      return () => clearInterval(interval);
+      return () => {
+        unsubscribe();
+        clearInterval(interval);
+      };
     }
   }, [user]);
 
@@ -68,8 +96,7 @@ export const NotificationProvider = ({ children }) => {
         )
       );
 
-      // Update unread count
-      setUnreadCount(prevCount => Math.max(0, prevCount - 1));
+      // The unread count change arrives over the socket
     } catch (error) {
       console.error('Failed to mark notification as read:', error);
     }
@@ -103,11 +130,7 @@ export const NotificationProvider = ({ children }) => {
       );
       setNotifications(updatedNotifications);
 
-      // Update unread count if needed
-      const deletedNotification = notifications.find(n => n.id === notificationId);
-      if (deletedNotification && !deletedNotification.isRead) {
-        setUnreadCount(prevCount => Math.max(0, prevCount - 1));
-      }
+      // The unread count change arrives over the socket
     } catch (error) {
       console.error('Failed to delete notification:', error);
     }
@@ -1,6 +1,6 @@
 import axios from 'axios';
 
-const API_URL = process.env.REACT_APP_API_URL || 'http://localhost:8001/api';
+export const API_URL = process.env.REACT_APP_API_URL || 'http://localhost:8001/api';
 console.log(`API URL set to: ${API_URL}`);
 
 // Create axios instance with extended timeout
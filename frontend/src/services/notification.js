@@ -1,6 +1,10 @@
 import { db } from '../firebase';
 import { collection, query, where, orderBy, getDocs, updateDoc, doc, serverTimestamp } from 'firebase/firestore';
-import api from './api';
+import { io } from 'socket.io-client';
+import api, { API_URL } from './api';
+
+// The socket.io server is mounted next to the API, at /ws
+const SOCKET_URL = API_URL.replace(/\/api\/?$/, '');
 
 // Get all notifications
 export const getNotifications = async (userId) => {
@@ -63,4 +67,34 @@ export const deleteNotification = async (notificationId) => {
 export const deleteAllNotifications = async () => {
   const response = await api.delete('/notifications');
   return response.data;
-};
\ No newline at end of file
+};
+// Map a pushed notification to the shape the rest of the app uses
+const fromPushed = (notification) => ({
+  id: notification.notification_id,
+  userId: notification.user_id,
+  type: notification.type,
+  message: notification.message,
+  isRead: notification.is_read,
+  sourceId: notification.source_id,
+  sourceType: notification.source_type,
+  createdBy: notification.created_by,
+  createdAt: notification.created_at,
+  actors: notification.actors,
+  actorCount: notification.actor_count
+});
+
+// Subscribe to real-time notification events; returns an unsubscribe function
+export const subscribeToNotifications = ({ onNotification, onUnreadDelta, onConnect, onDisconnect }) => {
+  const socket = io(SOCKET_URL, {
+    path: '/ws/socket.io',
+    // Read the token on every (re)connect so a refreshed login is picked up
+    auth: (cb) => cb({ token: localStorage.getItem('access_token') })
+  });
+
+  socket.on('connect', () => onConnect && onConnect());
+  socket.on('disconnect', () => onDisconnect && onDisconnect());
+  socket.on('notification', (notification) => onNotification && onNotification(fromPushed(notification)));
+  socket.on('unread_count_changed', ({ delta }) => onUnreadDelta && onUnreadDelta(delta));
+
+  return () => socket.disconnect();
+};